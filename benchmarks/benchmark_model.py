@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import time
+import io
+import argparse
+import contextlib
+import importlib.util
+
+generators_dir = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+def create_generators_module():
+    generators_spec = importlib.util.spec_from_file_location('generators', os.path.join(generators_dir, '__init__.py'))
+    generators_module = importlib.util.module_from_spec(generators_spec)
+
+    generators_spec.loader.exec_module(generators_module)
+
+    sys.modules['generators'] = generators_module
+
+if 'generators' not in sys.modules:
+    create_generators_module()
+
+from generators import common
+
+def get_model_generator_class():
+    # the Python bindings generator without any output, to only build the model
+    from generators.python.generate_python_bindings import PythonBindingsGenerator
+
+    class ModelGenerator(PythonBindingsGenerator):
+        def prepare(self):
+            pass
+
+        def generate(self, device):
+            pass
+
+        def finish(self):
+            pass
+
+    return ModelGenerator
+
+def get_config_unit_names():
+    unit_names = []
+
+    for config, com in common.get_device_configs(os.path.join(generators_dir, 'configs'), ''):
+        for packet in com['packets']:
+            for element in packet['elements']:
+                if len(element) < 5:
+                    continue
+
+                extras = element[4] if isinstance(element[4], list) else [element[4]]
+
+                for extra in extras:
+                    unit_name = extra.get('unit')
+
+                    if unit_name not in [None, 'dynamic', 'unknown']:
+                        unit_names.append(unit_name)
+
+    return unit_names
+
+def resolve_unit_legacy(unit_name):
+    # linear scan over all units and prefixes, as Element.__init__ did before
+    for candidate in common.units:
+        if unit_name == candidate.get_name():
+            return candidate
+
+        candidate_allowed_prefixes = candidate.get_allowed_prefixes()
+        candidate_allowed_inverse_prefixes = candidate.get_allowed_inverse_prefixes()
+
+        for unit_prefix in common.unit_prefixes:
+            if unit_prefix.symbol not in candidate_allowed_prefixes:
+                continue
+
+            if unit_name == candidate.get_name(prefix=unit_prefix):
+                return candidate.clone(prefix=unit_prefix)
+
+            for unit_inverse_prefix in common.unit_prefixes:
+                if unit_inverse_prefix.symbol not in candidate_allowed_inverse_prefixes:
+                    continue
+
+                if unit_name == candidate.get_name(prefix=unit_prefix, inverse_prefix=unit_inverse_prefix):
+                    return candidate.clone(prefix=unit_prefix, inverse_prefix=unit_inverse_prefix)
+
+        for unit_inverse_prefix in common.unit_prefixes:
+            if unit_inverse_prefix.symbol not in candidate_allowed_inverse_prefixes:
+                continue
+
+            if unit_name == candidate.get_name(inverse_prefix=unit_inverse_prefix):
+                return candidate.clone(inverse_prefix=unit_inverse_prefix)
+
+    return None
+
+def best_of(repeat, function):
+    best = None
+
+    for _ in range(repeat):
+        start = time.time()
+
+        function()
+
+        elapsed = time.time() - start
+
+        if best == None or elapsed < best:
+            best = elapsed
+
+    return best
+
+def build_model(generator_class):
+    with contextlib.redirect_stdout(io.StringIO()):
+        common.subgenerate(os.path.join(generators_dir, 'python'), 'en', generator_class, 'tinkerforge')
+
+def benchmark_units(args):
+    unit_names = get_config_unit_names()
+
+    for unit_name in sorted(set(unit_names)):
+        assert resolve_unit_legacy(unit_name) == common.resolve_unit(unit_name), unit_name
+
+    print('resolving {0} unit names ({1} distinct) used by all configs'.format(len(unit_names), len(set(unit_names))))
+
+    resolvers = [
+        ('before', resolve_unit_legacy),
+        ('after', common.resolve_unit)
+    ]
+
+    for name, resolver in resolvers:
+        best = best_of(args.repeat, lambda: [resolver(unit_name) for unit_name in unit_names])
+
+        print('{0:>6}: {1:.1f} ms, {2:.2f} us/unit'.format(name, best * 1000, best / len(unit_names) * 1000000))
+
+    generator_class = get_model_generator_class()
+
+    build_model(generator_class) # warm up the config cache
+
+    print('model construction for all configs: {0:.0f} ms'.format(best_of(args.repeat, lambda: build_model(generator_class)) * 1000))
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='benchmark')
+
+    units = subparsers.add_parser('units', help='resolve the unit names used by all configs')
+    units.add_argument('--repeat', type=int, default=5, help='number of runs, the best one is reported')
+    units.set_defaults(function=benchmark_units)
+
+    args = parser.parse_args()
+
+    if args.benchmark == None:
+        parser.print_help()
+        return 1
+
+    args.function(args)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Times the stages of the generator pipeline separately for a fixed set of
+representative configs and compares the results against a stored baseline.
+
+All generators run in a temporary sandbox that mirrors the generators
+directory with symlinks, so the checkout is not modified. No Docker and no
+sibling git repositories are needed.
+"""
+
+import sys
+import os
+import io
+import re
+import math
+import json
+import time
+import shutil
+import pickle
+import argparse
+import tempfile
+import contextlib
+import statistics
+import importlib
+import importlib.util
+
+generators_dir = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+def create_generators_module():
+    generators_spec = importlib.util.spec_from_file_location('generators', os.path.join(generators_dir, '__init__.py'))
+    generators_module = importlib.util.module_from_spec(generators_spec)
+
+    generators_spec.loader.exec_module(generators_module)
+
+    sys.modules['generators'] = generators_module
+
+if 'generators' not in sys.modules:
+    create_generators_module()
+
+from generators import common
+from generators.configs import device_commonconfig
+
+# small and large devices, with and without high-level and streaming packets
+representative_configs = [
+    'brick_master_config.py',
+    'bricklet_temperature_v2_config.py',
+    'bricklet_rs485_config.py',
+    'bricklet_lcd_128x64_config.py',
+    'bricklet_thermal_imaging_config.py'
+]
+
+all_stages = ['config_import', 'model', 'generate', 'doc_rst', 'zip']
+
+default_baseline_path = os.path.join(generators_dir, 'benchmarks', 'baseline.json')
+
+def get_all_bindings():
+    bindings = []
+
+    for binding in sorted(os.listdir(generators_dir)):
+        if os.path.exists(os.path.join(generators_dir, binding, 'skip_generate_all')):
+            continue
+
+        if os.path.exists(os.path.join(generators_dir, binding, 'generate_{0}_bindings.py'.format(binding))):
+            bindings.append(binding)
+
+    return bindings
+
+def create_sandbox(bindings):
+    # the binding directories are real directories, so the generators can
+    # create their output directories in it. everything else is symlinked
+    sandbox_dir = tempfile.mkdtemp(prefix='benchmark_pipeline_')
+    re_output_name = re.compile(r'^(bindings|doc|zip)(_.*)?$|\.zip$')
+
+    for name in os.listdir(generators_dir):
+        path = os.path.join(generators_dir, name)
+
+        if name in bindings:
+            os.mkdir(os.path.join(sandbox_dir, name))
+
+            for child in os.listdir(path):
+                if re_output_name.search(child) == None:
+                    os.symlink(os.path.join(path, child), os.path.join(sandbox_dir, name, child))
+        else:
+            os.symlink(path, os.path.join(sandbox_dir, name))
+
+    return sandbox_dir
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def load_com(config):
+    # import the config module from source on every call, bypassing sys.modules
+    spec = importlib.util.spec_from_file_location('benchmark_' + config[:-3], os.path.join(generators_dir, 'configs', config))
+    module = importlib.util.module_from_spec(spec)
+
+    spec.loader.exec_module(module)
+
+    com = module.com
+    com['constant_groups'].extend(common.prepare_common_constant_groups(com, pickle.loads(pickle.dumps(device_commonconfig.common_constant_groups))))
+    com['packets'].extend(common.prepare_common_packets(com, pickle.loads(pickle.dumps(device_commonconfig.common_packets))))
+    com['common_included'] = True
+
+    # as subgenerate does for all generators except the openHAB doc generator
+    com['packets'] = [x for x in com['packets'] if 'openhab_doc' not in x or not x['openhab_doc']]
+
+    return com
+
+class Stage(object):
+    def __init__(self, name, setup, run):
+        self.name = name
+        self.setup = setup # called before each run, untimed, returns the argument for run
+        self.run = run
+
+def make_config_import_stage(configs):
+    return Stage('config_import', lambda: None, lambda _: [load_com(config) for config in configs])
+
+def make_model_stage(sandbox_dir, coms):
+    # the model classes of the Python bindings, Device modifies its com, so
+    # every run gets fresh copies
+    from generators.python.generate_python_bindings import PythonBindingsGenerator
+
+    generator = PythonBindingsGenerator(os.path.join(sandbox_dir, 'python'), 'tinkerforge', 'en')
+    pickled = [pickle.dumps(com, protocol=pickle.HIGHEST_PROTOCOL) for com in coms]
+
+    return Stage('model',
+                 lambda: [pickle.loads(data) for data in pickled],
+                 lambda fresh_coms: [generator.get_device_class()(com, generator) for com in fresh_coms])
+
+def make_devices(coms, generator):
+    return [generator.get_device_class()(pickle.loads(pickle.dumps(com)), generator) for com in coms]
+
+def make_generate_stage(binding, sandbox_dir, coms):
+    module = importlib.import_module('generators.{0}.generate_{0}_bindings'.format(binding))
+    generator_class = None
+
+    for value in vars(module).values():
+        if isinstance(value, type) and issubclass(value, common.BindingsGenerator) and value.__module__ == module.__name__:
+            generator_class = value
+
+    if generator_class == None:
+        raise common.GeneratorError('no bindings generator found for {0}'.format(binding))
+
+    common.lang = 'en'
+    generator = generator_class(os.path.join(sandbox_dir, binding), 'tinkerforge', 'en')
+
+    with quiet():
+        generator.prepare()
+
+    devices = make_devices(coms, generator)
+
+    def run(_):
+        with quiet():
+            for device in devices:
+                generator.generate(device)
+
+    return Stage('generate/' + binding, lambda: None, run)
+
+def make_doc_rst_stage(sandbox_dir, coms):
+    # only the API part of the Python doc, the examples section needs the
+    # sibling git repositories
+    from generators.python.generate_python_doc import PythonDocGenerator
+
+    generator = PythonDocGenerator(os.path.join(sandbox_dir, 'python'), 'tinkerforge', 'en')
+    devices = make_devices(coms, generator)
+
+    return Stage('doc_rst', lambda: None, lambda _: [device.get_python_api() for device in devices])
+
+def make_zip_stage(sandbox_dir):
+    # zips the Python bindings that the generate stage created
+    from generators.python.generate_python_zip import PythonZipGenerator
+
+    source_path = os.path.join(sandbox_dir, 'python', 'bindings')
+
+    if not os.path.isdir(source_path):
+        with quiet():
+            common.subgenerate(os.path.join(sandbox_dir, 'python'), 'en',
+                               importlib.import_module('generators.python.generate_python_bindings').PythonBindingsGenerator,
+                               'tinkerforge')
+
+    generator = PythonZipGenerator(os.path.join(sandbox_dir, 'python'), 'tinkerforge', 'en')
+    generator.manifests_dir = os.path.join(sandbox_dir, 'zip_manifests')
+
+    def setup():
+        # remove the previous ZIP file, otherwise it is reused as up to date
+        for name in os.listdir(os.path.join(sandbox_dir, 'python')):
+            if name.endswith('.zip'):
+                os.remove(os.path.join(sandbox_dir, 'python', name))
+
+    return Stage('zip', setup, lambda _: generator.create_zip_file(source_path))
+
+def measure(stage, runs):
+    samples = []
+
+    for _ in range(runs):
+        argument = stage.setup()
+        start = time.perf_counter()
+
+        stage.run(argument)
+
+        samples.append(time.perf_counter() - start)
+
+    samples.sort()
+
+    # nearest-rank percentile
+    return {'median': statistics.median(samples),
+            'p95': samples[max(0, int(math.ceil(0.95 * len(samples))) - 1)],
+            'runs': runs}
+
+def print_results(results, baseline, threshold):
+    regressions = []
+
+    print('{0:<24} {1:>12} {2:>12} {3:>14} {4:>8}'.format('stage', 'median [ms]', 'p95 [ms]', 'baseline [ms]', 'change'))
+
+    for name, result in results.items():
+        line = '{0:<24} {1:12.2f} {2:12.2f}'.format(name, result['median'] * 1000, result['p95'] * 1000)
+
+        if name in baseline:
+            baseline_median = baseline[name]['median']
+            change = result['median'] / baseline_median - 1
+            line += ' {0:14.2f} {1:+7.1f}%'.format(baseline_median * 1000, change * 100)
+
+            if change > threshold:
+                line += '  \033[01;31mREGRESSION\033[0m'
+                regressions.append(name)
+
+        print(line)
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark the stages of the generator pipeline')
+
+    parser.add_argument('--runs', type=int, default=10, help='number of runs per stage [default: 10]')
+    parser.add_argument('--stages', default=','.join(all_stages), help='comma separated list of stages [default: {0}]'.format(','.join(all_stages)))
+    parser.add_argument('--bindings', help='comma separated list of bindings for the generate stage [default: all]')
+    parser.add_argument('--baseline', default=default_baseline_path, help='baseline JSON file to compare against [default: benchmarks/baseline.json]')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as new baseline instead of comparing against it')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative median increase that counts as regression [default: 0.2]')
+
+    args = parser.parse_args()
+    stages = args.stages.split(',')
+
+    for stage in stages:
+        if stage not in all_stages:
+            parser.error('unknown stage: {0}'.format(stage))
+
+    if args.bindings != None:
+        bindings = args.bindings.split(',')
+    else:
+        bindings = get_all_bindings()
+
+    sandbox_bindings = set(bindings)
+
+    if 'doc_rst' in stages or 'zip' in stages:
+        sandbox_bindings.add('python')
+
+    sandbox_dir = create_sandbox(sandbox_bindings)
+    results = {}
+
+    try:
+        coms = [load_com(config) for config in representative_configs]
+
+        stage_factories = []
+
+        if 'config_import' in stages:
+            stage_factories.append(lambda: make_config_import_stage(representative_configs))
+
+        if 'model' in stages:
+            stage_factories.append(lambda: make_model_stage(sandbox_dir, coms))
+
+        if 'generate' in stages:
+            for binding in bindings:
+                stage_factories.append(lambda binding=binding: make_generate_stage(binding, sandbox_dir, coms))
+
+        if 'doc_rst' in stages:
+            stage_factories.append(lambda: make_doc_rst_stage(sandbox_dir, coms))
+
+        if 'zip' in stages:
+            stage_factories.append(lambda: make_zip_stage(sandbox_dir))
+
+        for stage_factory in stage_factories:
+            stage = stage_factory()
+            results[stage.name] = measure(stage, args.runs)
+    finally:
+        shutil.rmtree(sandbox_dir)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+        print_results(results, {}, args.threshold)
+        print('baseline written to {0}'.format(args.baseline))
+
+        return 0
+
+    try:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+
+    regressions = print_results(results, baseline, args.threshold)
+
+    if len(regressions) > 0:
+        print('{0} stage(s) regressed by more than {1:.0f}%: {2}'.format(len(regressions), args.threshold * 100, ', '.join(regressions)))
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Persistent build worker for the generator and test scripts.
+
+The worker imports all generator modules and prepares all device configs
+once, then accepts jobs on a Unix socket. Every job runs in a child process
+forked from the warm worker, so it starts without any import or config
+parsing cost and cannot leave state behind for the next job.
+
+Start it with "build_worker.py serve" (common.dockerize starts it in a
+docker container for "--docker --worker"). Then run any script with
+"--worker" to send it to the worker instead of running it in a new process.
+"""
+
+import sys
+
+if sys.hexversion < 0x3040000:
+    print('Python >= 3.4 required')
+    sys.exit(1)
+
+import os
+import io
+import json
+import time
+import struct
+import socket
+import runpy
+import atexit
+import argparse
+import selectors
+import traceback
+import subprocess
+import importlib.util
+import importlib.machinery
+
+generators_dir = os.path.dirname(os.path.realpath(__file__))
+
+def create_generators_module():
+    if sys.hexversion < 0x3050000:
+        generators_module = importlib.machinery.SourceFileLoader('generators', os.path.join(generators_dir, '__init__.py')).load_module()
+    else:
+        generators_spec = importlib.util.spec_from_file_location('generators', os.path.join(generators_dir, '__init__.py'))
+        generators_module = importlib.util.module_from_spec(generators_spec)
+
+        generators_spec.loader.exec_module(generators_module)
+
+    sys.modules['generators'] = generators_module
+
+if 'generators' not in sys.modules:
+    create_generators_module()
+
+from generators import common
+
+def preload():
+    start = time.time()
+
+    for binding in sorted(os.listdir(generators_dir)):
+        binding_dir = os.path.join(generators_dir, binding)
+
+        if not os.path.isdir(binding_dir) or binding in ['.cache', '.git', '.m2', '.vscode', '__pycache__', 'configs', 'docker']:
+            continue
+
+        for filename in sorted(os.listdir(binding_dir)):
+            if not filename.endswith('.py') or not (filename.startswith('generate_') or filename == 'test_{0}_bindings.py'.format(binding) or filename.endswith('_common.py')):
+                continue
+
+            try:
+                importlib.import_module('generators.{0}.{1}'.format(binding, filename[:-3]))
+            except Exception as e:
+                print('could not preload {0}/{1}: {2}'.format(binding, filename, e))
+
+    config_base_path = os.path.join(generators_dir, 'configs')
+
+    common.get_device_configs(config_base_path, '')
+
+    for config_name in sorted(os.listdir(config_base_path)):
+        if config_name != '__pycache__' and os.path.isdir(os.path.join(config_base_path, config_name)):
+            common.get_device_configs(os.path.join(config_base_path, config_name), '.' + config_name)
+
+    print('preloaded {0} modules in {1:.1f} seconds'.format(len(get_module_mtimes()), time.time() - start))
+
+def get_module_mtimes():
+    mtimes = {}
+
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, '__file__', None)
+
+        if (name == 'generators' or name.startswith('generators.')) and path != None:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+
+    return mtimes
+
+def send_frame(conn, frame_type, payload):
+    conn.sendall(struct.pack('<BI', frame_type, len(payload)) + payload)
+
+def is_job_request(request):
+    return isinstance(request.get('script'), str) and \
+           isinstance(request.get('argv'), list) and all(isinstance(arg, str) for arg in request['argv']) and \
+           isinstance(request.get('cwd'), str) and os.path.isdir(request['cwd'])
+
+def reject_request(conn, message):
+    # answer like a failed job, a malformed request must not end the server loop
+    try:
+        send_frame(conn, common.WORKER_FRAME_OUTPUT, 'error: {0}\n'.format(message).encode('utf-8'))
+        send_frame(conn, common.WORKER_FRAME_EXIT, struct.pack('<i', 1))
+    except OSError: # client went away
+        pass
+
+    conn.close()
+
+def run_job(job):
+    # runs in the forked child, the script sees the same environment as if
+    # it was started as "python3 -u script argv..." in the job's directory
+    exit_code = 0
+
+    os.chdir(job['cwd'])
+
+    sys.argv = [job['script']] + job['argv']
+    sys.path[0] = os.path.dirname(job['script'])
+
+    try:
+        runpy.run_path(job['script'], run_name='__main__')
+    except SystemExit as e:
+        if e.code == None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            print(e.code)
+            exit_code = 1
+    except:
+        traceback.print_exc()
+        exit_code = 1
+
+    try:
+        atexit._run_exitfuncs() # os._exit skips them, but e.g. the --profile report is written by one
+    except:
+        traceback.print_exc()
+        exit_code = 1
+
+    return exit_code
+
+def fork_job(job):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+
+    if pid == 0:
+        exit_code = 1
+
+        try:
+            os.close(read_fd)
+            os.dup2(write_fd, 1)
+            os.dup2(write_fd, 2)
+            os.close(write_fd)
+
+            devnull_fd = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull_fd, 0)
+            os.close(devnull_fd)
+
+            sys.stdout = io.TextIOWrapper(io.FileIO(1, 'w', closefd=False), encoding='utf-8', line_buffering=True, write_through=True)
+            sys.stderr = io.TextIOWrapper(io.FileIO(2, 'w', closefd=False), encoding='utf-8', line_buffering=True, write_through=True)
+
+            exit_code = run_job(job)
+        finally:
+            # never return into the server loop of the parent
+            os._exit(exit_code)
+
+    os.close(write_fd)
+
+    def wait():
+        _, status = os.waitpid(pid, 0)
+
+        if os.WIFEXITED(status):
+            return os.WEXITSTATUS(status)
+
+        return 128 + os.WTERMSIG(status)
+
+    def kill():
+        try:
+            os.kill(pid, 15)
+        except OSError:
+            pass
+
+    return read_fd, wait, kill
+
+def spawn_job(job):
+    # a cold process, for when the preloaded modules are outdated
+    process = subprocess.Popen([sys.executable, '-u', job['script']] + job['argv'], cwd=job['cwd'],
+                               stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+    return process.stdout.fileno(), process.wait, process.terminate, process
+
+class Job(object):
+    def __init__(self, conn, read_fd, wait, kill, keep_alive=None):
+        self.conn = conn
+        self.read_fd = read_fd
+        self.wait = wait
+        self.kill = kill
+        self.keep_alive = keep_alive # the Popen object owning read_fd, if any
+
+def serve(args):
+    os.makedirs(os.path.dirname(args.socket), exist_ok=True)
+
+    try:
+        os.unlink(args.socket)
+    except FileNotFoundError:
+        pass
+
+    preload()
+
+    module_mtimes = get_module_mtimes()
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    listener.bind(args.socket)
+
+    # jobs run arbitrary scripts, only the user running the worker may send
+    # them. nobody can connect before listen is called
+    os.chmod(args.socket, 0o600)
+
+    listener.listen(16)
+
+    print('listening on {0}'.format(args.socket))
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+
+    clients = {} # conn -> bytearray with the partial request line
+    jobs = {} # read_fd -> Job
+    stopping = False
+    reexec = False
+
+    try:
+        while not stopping or len(jobs) > 0:
+            for key, _ in selector.select():
+                if key.fileobj is listener:
+                    conn, _ = listener.accept()
+
+                    # read the request line piece by piece, a client that
+                    # connects but sends nothing must not block the worker
+                    conn.setblocking(False)
+                    clients[conn] = bytearray()
+                    selector.register(conn, selectors.EVENT_READ)
+                elif key.fileobj in clients:
+                    conn = key.fileobj
+
+                    try:
+                        data = conn.recv(65536)
+                    except BlockingIOError:
+                        continue
+                    except OSError:
+                        data = b''
+
+                    line = clients[conn]
+                    line += data
+
+                    if len(data) > 0 and b'\n' not in line:
+                        continue
+
+                    selector.unregister(conn)
+                    del clients[conn]
+
+                    try:
+                        request = json.loads(line.split(b'\n', 1)[0].decode('utf-8'))
+                    except ValueError:
+                        request = None
+
+                    conn.setblocking(True)
+
+                    if not isinstance(request, dict):
+                        reject_request(conn, 'malformed request')
+                        continue
+
+                    if request.get('command') == 'stop':
+                        send_frame(conn, common.WORKER_FRAME_EXIT, struct.pack('<i', 0))
+                        conn.close()
+                        selector.unregister(listener)
+                        stopping = True
+                        continue
+
+                    if not is_job_request(request):
+                        reject_request(conn, 'malformed job request')
+                        continue
+
+                    print('{0}: {1} {2}'.format(time.strftime('%H:%M:%S'), request['script'], ' '.join(request['argv'])))
+
+                    if get_module_mtimes() != module_mtimes:
+                        print('modules changed, running job in a new process and restarting afterwards')
+
+                        read_fd, wait, kill, process = spawn_job(request)
+                        job = Job(conn, read_fd, wait, kill, keep_alive=process)
+                        reexec = True
+                    else:
+                        read_fd, wait, kill = fork_job(request)
+                        job = Job(conn, read_fd, wait, kill)
+
+                    jobs[read_fd] = job
+                    selector.register(read_fd, selectors.EVENT_READ)
+                else:
+                    job = jobs[key.fileobj]
+                    data = os.read(job.read_fd, 65536)
+
+                    try:
+                        if len(data) > 0:
+                            send_frame(job.conn, common.WORKER_FRAME_OUTPUT, data)
+                            continue
+
+                        exit_code = job.wait()
+
+                        send_frame(job.conn, common.WORKER_FRAME_EXIT, struct.pack('<i', exit_code))
+                    except OSError: # client went away
+                        job.kill()
+                        job.wait()
+
+                    selector.unregister(job.read_fd)
+                    del jobs[job.read_fd]
+
+                    if job.keep_alive == None:
+                        os.close(job.read_fd)
+                    else:
+                        job.keep_alive.stdout.close()
+
+                    job.conn.close()
+
+            if reexec and len(jobs) == 0:
+                break
+    finally:
+        for conn in clients:
+            conn.close()
+
+        listener.close()
+
+        try:
+            os.unlink(args.socket)
+        except FileNotFoundError:
+            pass
+
+    if reexec:
+        os.execv(sys.executable, [sys.executable, '-u', os.path.realpath(__file__)] + sys.argv[1:])
+
+    return 0
+
+def stop(args):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.connect(args.socket)
+    except OSError:
+        print('no build worker is running')
+        return 1
+
+    with sock:
+        sock.sendall(json.dumps({'command': 'stop'}).encode('utf-8') + b'\n')
+        sock.recv(16)
+
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description='persistent build worker for the generator and test scripts')
+    subparsers = parser.add_subparsers(dest='command')
+
+    serve_parser = subparsers.add_parser('serve', help='preload everything and accept jobs')
+    serve_parser.add_argument('--socket', default=common.worker_socket_path, help='Unix socket to listen on [default: .cache/worker.sock]')
+    serve_parser.set_defaults(function=serve)
+
+    stop_parser = subparsers.add_parser('stop', help='stop the worker after the running jobs finished')
+    stop_parser.add_argument('--socket', default=common.worker_socket_path, help='Unix socket of the worker [default: .cache/worker.sock]')
+    stop_parser.set_defaults(function=stop)
+
+    args = parser.parse_args()
+
+    if args.command == None:
+        parser.print_help()
+        return 1
+
+    return args.function(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -38,6 +38,17 @@ from collections import namedtuple
 import importlib
 import argparse
 import shlex
+import socket
+import pickle
+import hashlib
+import json
+import time
+import struct
+import zipfile
+import atexit
+import tempfile
+import cProfile
+import contextlib
 
 from generators.configs import device_commonconfig
 
@@ -153,6 +164,8 @@ Funktionen direkt zu verwenden.
 
 lang = 'en'
 enable_verbose = False
+enable_incremental = False
+profiler = None # set by the --profile option of dockerize
 
 def print_verbose(*args, **kwargs):
     if enable_verbose:
@@ -1457,16 +1470,186 @@ def wrap_non_empty(prefix, middle, suffix):
 
     return prefix + middle + suffix
 
+class Profiler(object):
+    def __init__(self, report_dir, with_pstats):
+        self.report_dir = report_dir
+        self.with_pstats = with_pstats
+        self.records = []
+        self.labels = {'binding': None, 'generator': None, 'language': None, 'config': None}
+
+    @contextlib.contextmanager
+    def measure(self, stage, device=None, detail=None):
+        # the CPU time of child processes is only known after they exited,
+        # which is the case for everything started through execute
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        start_times = os.times()
+
+        try:
+            yield
+        finally:
+            end_times = os.times()
+            record = dict(self.labels)
+
+            record['stage'] = stage
+            record['device'] = device
+            record['detail'] = detail
+            record['wall'] = time.perf_counter() - start_wall
+            record['cpu'] = time.process_time() - start_cpu
+            record['children_cpu'] = (end_times[2] - start_times[2]) + (end_times[3] - start_times[3])
+
+            self.records.append(record)
+
+    def take_records(self):
+        records = self.records
+        self.records = []
+
+        return records
+
+    def add_records(self, records):
+        self.records += records
+
+    def get_pstats_path(self):
+        name = '{binding}_{generator}_{language}_{config}.pstats'.format(**self.labels)
+
+        return os.path.join(self.report_dir, 'pstats', name)
+
+    def format_summary(self):
+        lines = []
+
+        def add_section(title, stage, key_func, name_func, limit=None):
+            totals = {}
+
+            for record in self.records:
+                if record['stage'] != stage:
+                    continue
+
+                key = key_func(record)
+                total = totals.setdefault(key, [0.0, 0.0, 0])
+                total[0] += record['wall']
+                total[1] += record['cpu'] + record['children_cpu']
+                total[2] += 1
+
+            if len(totals) == 0:
+                return
+
+            lines.append('{0}:'.format(title))
+            lines.append('  {0:>9} {1:>9} {2:>6}  name'.format('wall [s]', 'cpu [s]', 'count'))
+
+            for key, total in sorted(totals.items(), key=lambda item: -item[1][0])[:limit]:
+                lines.append('  {0:9.3f} {1:9.3f} {2:6}  {3}'.format(total[0], total[1], total[2], name_func(key)))
+
+            lines.append('')
+
+        def get_unit_key(record):
+            return (record['binding'], record['generator'], record['language'])
+
+        def get_unit_name(key):
+            return '{0}/{1}/{2}'.format(*key)
+
+        add_section('units', 'subgenerate', get_unit_key, get_unit_name)
+        add_section('configs', 'subgenerate', lambda record: get_unit_key(record) + (record['config'],), lambda key: '{0}/{1}/{2} {3}'.format(*key))
+        add_section('prepare', 'prepare', get_unit_key, get_unit_name)
+        add_section('finish', 'finish', get_unit_key, get_unit_name)
+        add_section('slowest devices', 'generate', lambda record: get_unit_key(record) + (record['config'], record['device']), lambda key: '{0}/{1}/{2} {3} {4}'.format(*key), limit=25)
+        add_section('zip creation', 'zip', lambda record: get_unit_key(record) + (record['detail'],), lambda key: '{0}/{1}/{2} {3}'.format(*key))
+        add_section('external commands', 'execute', lambda record: get_unit_key(record) + (record['detail'],), lambda key: '{0}/{1}/{2} {3}'.format(*key), limit=25)
+
+        return '\n'.join(lines)
+
+    def write_report(self):
+        os.makedirs(self.report_dir, exist_ok=True)
+
+        with open(os.path.join(self.report_dir, 'profile.json'), 'w') as f:
+            json.dump({'argv': sys.argv, 'records': self.records}, f, indent=1)
+
+        with open(os.path.join(self.report_dir, 'profile.txt'), 'w') as f:
+            f.write(self.format_summary())
+
+        print('\033[01;35m>>> profile report written to {0}\033[0m'.format(self.report_dir))
+
+def profile_stage(stage, device=None, detail=None):
+    if profiler == None:
+        return contextlib.suppress()
+
+    return profiler.measure(stage, device=device, detail=detail)
+
+def enable_profile(report_dir, with_pstats):
+    global profiler
+
+    profiler = Profiler(report_dir, with_pstats)
+
+    return profiler
+
 def execute(args, **kwargs):
-    error = 'command failed: {0}'.format(' '.join(args) if isinstance(args, list) else args)
+    command = ' '.join(args) if isinstance(args, list) else args
+    error = 'command failed: {0}'.format(command)
 
     try:
-        if subprocess.call(args, **kwargs) != 0:
+        with profile_stage('execute', detail=command):
+            exit_code = subprocess.call(args, **kwargs)
+
+        if exit_code != 0:
             sys.exit(1)
     except Exception as e:
         print(error + '\n' + str(e))
         sys.exit(1)
 
+def run_captured(function, *args):
+    result = None
+    exc = None
+
+    # redirect the file descriptors instead of sys.stdout, to also capture
+    # the output of subprocesses started by the function
+    with tempfile.TemporaryFile(mode='w+') as log:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        saved_stdout = os.dup(1)
+        saved_stderr = os.dup(2)
+
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+
+        try:
+            result = function(*args)
+        except BaseException as e: # also SystemExit, execute exits on failing commands
+            exc = e
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+            os.dup2(saved_stdout, 1)
+            os.dup2(saved_stderr, 2)
+            os.close(saved_stdout)
+            os.close(saved_stderr)
+
+        log.seek(0)
+        output = log.read()
+
+    return output, result, exc
+
+def get_worker_options():
+    if profiler != None:
+        profile_options = (profiler.report_dir, profiler.with_pstats)
+    else:
+        profile_options = None
+
+    return enable_verbose, enable_incremental, profile_options, tester_processes, enable_tester_cache
+
+def init_worker(worker_options):
+    global enable_verbose
+    global enable_incremental
+    global tester_processes
+    global enable_tester_cache
+
+    # the worker processes of generate_all.py and test_all.py might not inherit
+    # the options set by dockerize and their main functions
+    enable_verbose, enable_incremental, profile_options, tester_processes, enable_tester_cache = worker_options
+
+    if profile_options != None:
+        enable_profile(*profile_options)
+
 def generate(root_dir, language, generator_class):
     print('=== language: {0}'.format(language))
 
@@ -1490,7 +1673,284 @@ def generate(root_dir, language, generator_class):
 
         subgenerate(root_dir, language, generator_class, config_name)
 
+def prepare_common_constant_groups(com, common_constant_groups):
+    features = com['features']
+
+    for common_constant_group in common_constant_groups:
+        if common_constant_group['feature'] not in features:
+            common_constant_group['to_be_removed'] = True
+
+    return filter(lambda x: 'to_be_removed' not in x, common_constant_groups)
+
+def prepare_common_packets(com, common_packets):
+    features = com['features']
+
+    for common_packet in common_packets:
+        if not common_packet.get('is_virtual', False):
+            if com['name'] in common_packet['since_firmware']:
+                common_packet['since_firmware'] = common_packet['since_firmware'][com['name']]
+            else:
+                common_packet['since_firmware'] = common_packet['since_firmware']['*']
+
+            if common_packet['since_firmware'] == None:
+                common_packet['to_be_removed'] = True
+
+        if common_packet['feature'] not in features:
+            common_packet['to_be_removed'] = True
+
+    return filter(lambda x: 'to_be_removed' not in x, common_packets)
+
+device_configs_cache_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '.cache')
+device_configs = {} # config_path -> (hash, [(config, pickled com), ...])
+
+def get_device_configs_hash(config_path):
+    # the prepared configs depend on all config files, on the common configs
+    # and on this file, that does the preparation
+    paths = [os.path.realpath(__file__)]
+    configs_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'configs')
+
+    for path in sorted(set([configs_path, os.path.realpath(config_path)])):
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.py'):
+                paths.append(os.path.join(path, name))
+
+    h = hashlib.sha256()
+
+    for path in paths:
+        h.update(path.encode('utf-8') + b'\0')
+
+        with open(path, 'rb') as f:
+            h.update(f.read())
+
+    return h.hexdigest()
+
+def load_device_configs(config_path, config_subdir):
+    prepared = []
+
+    for config in sorted(os.listdir(config_path)):
+        if not config.endswith('_config.py'):
+            continue
+
+        com = copy.deepcopy(importlib.import_module('generators.configs{0}.{1}'.format(config_subdir, config[:-3])).com)
+
+        if 'common_included' not in com:
+            com['constant_groups'].extend(prepare_common_constant_groups(com, copy.deepcopy(device_commonconfig.common_constant_groups)))
+            com['packets'].extend(prepare_common_packets(com, copy.deepcopy(device_commonconfig.common_packets)))
+            com['common_included'] = True
+
+        prepared.append((config, pickle.dumps(com, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    return prepared
+
+def get_device_configs(config_path, config_subdir):
+    """
+    Returns a list of (config filename, com) tuples with the common constant
+    groups and packets already included. The configs are prepared once and
+    cached in memory and on disk, keyed by the content of the config files.
+    Each call returns fresh copies that the caller is free to modify.
+    """
+    configs_hash = get_device_configs_hash(config_path)
+    cached = device_configs.get(config_path)
+
+    if cached == None or cached[0] != configs_hash:
+        cache_prefix = 'device_configs_{0}_'.format(os.path.basename(os.path.realpath(config_path)))
+        cache_path = os.path.join(device_configs_cache_dir, cache_prefix + configs_hash + '.pickle')
+        prepared = None
+
+        try:
+            with open(cache_path, 'rb') as f:
+                prepared = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+
+        if prepared == None:
+            prepared = load_device_configs(config_path, config_subdir)
+
+            # generate_all.py might run several generators in parallel, write to
+            # a temporary file first to never leave a partially written file behind
+            try:
+                os.makedirs(device_configs_cache_dir, exist_ok=True)
+
+                cache_tmp_path = cache_path + '.{0}.tmp'.format(os.getpid())
+
+                with open(cache_tmp_path, 'wb') as f:
+                    pickle.dump(prepared, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+                os.replace(cache_tmp_path, cache_path)
+
+                for name in os.listdir(device_configs_cache_dir):
+                    if name.startswith(cache_prefix) and name.endswith('.pickle') and name != os.path.basename(cache_path):
+                        os.remove(os.path.join(device_configs_cache_dir, name))
+            except OSError as e:
+                print_verbose('  \033[01;31m! could not write device configs cache: {0}\033[0m'.format(e))
+
+        cached = (configs_hash, prepared)
+        device_configs[config_path] = cached
+
+    return [(config, pickle.loads(com)) for config, com in cached[1]]
+
+re_generated_on_date = re.compile(rb'(automatically generated on )[0-9]{4}-[0-9]{2}-[0-9]{2}')
+
+def hash_output_file(path):
+    # the date line changes on every run, ignore it
+    with open(path, 'rb') as f:
+        return hashlib.sha256(re_generated_on_date.sub(rb'\1', f.read())).hexdigest()
+
+def files_equal(path_a, path_b):
+    if not os.path.exists(path_a) or not os.path.exists(path_b):
+        return False
+
+    return hash_output_file(path_a) == hash_output_file(path_b)
+
+def list_files(path):
+    paths = []
+
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+
+        for filename in sorted(filenames):
+            paths.append(os.path.join(dirpath, filename))
+
+    return paths
+
+def write_zip_file(zip_path, entries):
+    """
+    Writes a reproducible ZIP file. The entries are (arcname, data, executable)
+    tuples, directories have an arcname ending in '/' and None as data. The
+    entries are written sorted by arcname and with fixed timestamps and modes,
+    so the archive only depends on the content.
+    """
+    zip_tmp_path = zip_path + '.{0}.tmp'.format(os.getpid())
+
+    with zipfile.ZipFile(zip_tmp_path, 'w', zipfile.ZIP_DEFLATED) as f:
+        for arcname, data, executable in sorted(entries, key=lambda entry: entry[0]):
+            info = zipfile.ZipInfo(arcname, date_time=(1980, 1, 1, 0, 0, 0)) # the earliest date a ZIP file can store
+            info.create_system = 3 # Unix, otherwise the modes are ignored on extraction
+
+            if data == None:
+                data = b''
+                info.external_attr = (0o40755 << 16) | 0x10 # directory
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+
+                if executable:
+                    info.external_attr = 0o100755 << 16
+                else:
+                    info.external_attr = 0o100644 << 16
+
+            f.writestr(info, data)
+
+    os.replace(zip_tmp_path, zip_path)
+
+class IncrementalManifest(object):
+    """
+    Records the hash of the inputs and the outputs of a generator run. If
+    neither changed since the last run, then the generator run can be skipped.
+    """
+    manifests_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '.cache', 'incremental')
+
+    def __init__(self, generator, configs_hash):
+        self.generator = generator
+        self.inputs_hash = self.get_inputs_hash(configs_hash)
+
+        name = '{0}_{1}_{2}_{3}.json'.format(os.path.basename(os.path.realpath(generator.get_root_dir())),
+                                             generator.__class__.__name__,
+                                             generator.get_config_name().under,
+                                             generator.get_language())
+
+        self.path = os.path.join(self.manifests_dir, name)
+
+    def get_inputs_hash(self, configs_hash):
+        h = hashlib.sha256()
+
+        h.update(configs_hash.encode('utf-8'))
+        h.update(b'\0' + repr(self.generator.get_input_options()).encode('utf-8'))
+
+        for path in [os.path.realpath(__file__), sys.modules[self.generator.__class__.__module__].__file__] + self.generator.get_input_paths():
+            h.update(b'\0' + os.path.relpath(path, self.generator.get_root_dir()).encode('utf-8') + b'\0')
+
+            with open(path, 'rb') as f:
+                h.update(f.read())
+
+        return h.hexdigest()
+
+    def get_outputs(self):
+        root_dir = self.generator.get_root_dir()
+
+        return dict([(os.path.relpath(path, root_dir), hash_output_file(path))
+                     for path in self.generator.get_output_paths() if os.path.exists(path)])
+
+    def is_up_to_date(self):
+        if self.generator.get_output_paths() == None:
+            return False
+
+        try:
+            with open(self.path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        return manifest['inputs'] == self.inputs_hash and \
+               len(manifest['outputs']) > 0 and \
+               manifest['outputs'] == self.get_outputs()
+
+    def update(self):
+        if self.generator.get_output_paths() == None:
+            return
+
+        os.makedirs(self.manifests_dir, exist_ok=True)
+
+        tmp_path = self.path + '.{0}.tmp'.format(os.getpid())
+
+        with open(tmp_path, 'w') as f:
+            json.dump({'inputs': self.inputs_hash, 'outputs': self.get_outputs()}, f, indent=1, sort_keys=True)
+
+        os.replace(tmp_path, self.path)
+
+def get_generator_kind(generator_class, bindings_name):
+    # generate_<bindings>_<kind>.py, e.g. generate_python_bindings.py
+    module_path = getattr(sys.modules.get(generator_class.__module__), '__file__', '')
+    module_name = os.path.splitext(os.path.basename(module_path))[0]
+    prefix = 'generate_{0}_'.format(bindings_name)
+
+    if module_name.startswith(prefix):
+        return module_name[len(prefix):]
+
+    return generator_class.__name__
+
 def subgenerate(root_dir, language, generator_class, config_name):
+    if profiler == None:
+        subgenerate_config(root_dir, language, generator_class, config_name)
+        return
+
+    bindings_name = os.path.basename(os.path.realpath(root_dir))
+
+    profiler.labels = {'binding': bindings_name,
+                       'generator': get_generator_kind(generator_class, bindings_name),
+                       'language': language,
+                       'config': config_name}
+
+    if profiler.with_pstats:
+        pstats_profile = cProfile.Profile()
+    else:
+        pstats_profile = None
+
+    with profiler.measure('subgenerate'):
+        if pstats_profile != None:
+            pstats_profile.enable()
+
+        try:
+            subgenerate_config(root_dir, language, generator_class, config_name)
+        finally:
+            if pstats_profile != None:
+                pstats_profile.disable()
+
+                pstats_path = profiler.get_pstats_path()
+
+                os.makedirs(os.path.dirname(pstats_path), exist_ok=True)
+                pstats_profile.dump_stats(pstats_path)
+
+def subgenerate_config(root_dir, language, generator_class, config_name):
     global lang
     lang = language
 
@@ -1506,50 +1966,26 @@ def subgenerate(root_dir, language, generator_class, config_name):
 
     config_path = os.path.join(*config_path_parts)
 
-    common_constant_groups = copy.deepcopy(device_commonconfig.common_constant_groups)
-    common_packets = copy.deepcopy(device_commonconfig.common_packets)
-
     brick_infos = []
     bricklet_infos = []
     tng_infos = []
     device_identifiers = set()
 
     generator = generator_class(root_dir, config_name, language)
-    generator.prepare()
-
-    def prepare_common_constant_groups(com, common_constant_groups):
-        features = com['features']
-
-        for common_constant_group in common_constant_groups:
-            if common_constant_group['feature'] not in features:
-                common_constant_group['to_be_removed'] = True
 
-        return filter(lambda x: 'to_be_removed' not in x, common_constant_groups)
+    if enable_incremental:
+        manifest = IncrementalManifest(generator, get_device_configs_hash(config_path))
 
-    def prepare_common_packets(com, common_packets):
-        features = com['features']
-
-        for common_packet in common_packets:
-            if not common_packet.get('is_virtual', False):
-                if com['name'] in common_packet['since_firmware']:
-                    common_packet['since_firmware'] = common_packet['since_firmware'][com['name']]
-                else:
-                    common_packet['since_firmware'] = common_packet['since_firmware']['*']
-
-                if common_packet['since_firmware'] == None:
-                    common_packet['to_be_removed'] = True
-
-            if common_packet['feature'] not in features:
-                common_packet['to_be_removed'] = True
-
-        return filter(lambda x: 'to_be_removed' not in x, common_packets)
-
-    for config in sorted(os.listdir(config_path)):
-        if not config.endswith('_config.py'):
-            continue
+        if manifest.is_up_to_date():
+            print('    \033[01;36m(up to date)\033[0m')
+            return
+    else:
+        manifest = None
 
-        com = copy.deepcopy(importlib.import_module('generators.configs{0}.{1}'.format(config_subdir, config[:-3])).com)
+    with profile_stage('prepare'):
+        generator.prepare()
 
+    for config, com in get_device_configs(config_path, config_subdir):
         if com['documented'] and not com['released']:
             raise GeneratorError('{0} is marked as documented, but as not released'.format(config[:-10]))
 
@@ -1562,25 +1998,21 @@ def subgenerate(root_dir, language, generator_class, config_name):
         else:
             print_verbose('  * {0}'.format(config[:-10]))
 
-        if 'common_included' not in com:
-            com['constant_groups'].extend(prepare_common_constant_groups(com, copy.deepcopy(common_constant_groups)))
-            com['packets'].extend(prepare_common_packets(com, copy.deepcopy(common_packets)))
-            com['common_included'] = True
-
         if generator.is_openhab_doc_generator:
             com['packets'] = [x for x in com['packets'] if 'openhab_doc' not in x or x['openhab_doc']]
         else:
             com['packets'] = [x for x in com['packets'] if 'openhab_doc' not in x or not x['openhab_doc']]
 
-        device = generator.get_device_class()(com, generator)
-        device_identifier = device.get_device_identifier()
+        with profile_stage('generate', device=config[:-10]):
+            device = generator.get_device_class()(com, generator)
+            device_identifier = device.get_device_identifier()
 
-        if device_identifier in device_identifiers:
-            raise GeneratorError('Device identifier {0} is not unique'.format(device_identifier))
+            if device_identifier in device_identifiers:
+                raise GeneratorError('Device identifier {0} is not unique'.format(device_identifier))
 
-        device_identifiers.add(device_identifier)
+            device_identifiers.add(device_identifier)
 
-        generator.generate(device)
+            generator.generate(device)
 
         # only collect device_infos for default config
         if config_name != 'tinkerforge':
@@ -1662,7 +2094,13 @@ def subgenerate(root_dir, language, generator_class, config_name):
         else:
             assert False
 
-    generator.finish()
+    with profile_stage('finish'):
+        generator.finish()
+
+    generator.restore_unchanged_output_files()
+
+    if manifest != None:
+        manifest.update()
 
     # only update device_infos.py for default config
     if config_name == 'tinkerforge':
@@ -1674,7 +2112,12 @@ def subgenerate(root_dir, language, generator_class, config_name):
                                {'en': 'Makes all Bricklet signals available',
                                 'de': 'Macht alle Bricklet Signale zugänglich'}))
 
-        with open(os.path.join(root_dir, '..', 'device_infos.py'), 'w') as f:
+        device_infos_path = os.path.join(root_dir, '..', 'device_infos.py')
+        device_infos_tmp_path = device_infos_path + '.{0}.tmp'.format(os.getpid())
+
+        # generate_all.py might run several generators in parallel, write to
+        # a temporary file first to never leave a partially written file behind
+        with open(device_infos_tmp_path, 'w') as f:
             f.write('# -*- coding: utf-8 -*-\n')
             f.write('from collections import namedtuple\n')
             f.write('\n')
@@ -1696,16 +2139,18 @@ def subgenerate(root_dir, language, generator_class, config_name):
 
             f.write(']\n')
 
+        if files_equal(device_infos_tmp_path, device_infos_path):
+            os.remove(device_infos_tmp_path)
+        else:
+            os.replace(device_infos_tmp_path, device_infos_path)
+
 check_name_valid_word_head = re.compile('^[A-Z]+[A-Z0-9]*[a-z0-9]*$')
 check_name_valid_word_tail = re.compile('^[A-Z0-9]+[a-z0-9]*$')
 check_name_valid_word_constant = re.compile('^[A-Z0-9]+[a-z0-9]*$') # constants are allowed to start with numbers
 check_name_exceptions_whole_name = ['Industrial Dual 0 20mA', 'Industrial Dual 0 20mA V2']
 check_name_exceptions_word_in_constant = ['20mA', '24mA', 'EtOH']
 
-def check_name(name, display_name=None, is_constant=False):
-    if isinstance(name, tuple):
-        raise GeneratorError('Name {0} uses old tuple format, update it to new split-camel-case format'.format(name))
-
+def check_name_uncached(name, display_name, is_constant):
     if len(name) == 0:
         raise GeneratorError('Name is empty')
 
@@ -1742,6 +2187,28 @@ def check_name(name, display_name=None, is_constant=False):
             raise GeneratorError("Name '{0}' and display name '{1}' ({2}) mismatch" \
                                  .format(name, display_name, display_name_to_check))
 
+check_name_results = {} # (name, display_name, is_constant) -> None or error message
+
+def check_name(name, display_name=None, is_constant=False):
+    if isinstance(name, tuple):
+        raise GeneratorError('Name {0} uses old tuple format, update it to new split-camel-case format'.format(name))
+
+    key = (name, display_name, is_constant)
+
+    try:
+        error = check_name_results[key]
+    except KeyError:
+        try:
+            check_name_uncached(name, display_name, is_constant)
+            error = None
+        except GeneratorError as e:
+            error = str(e)
+
+        check_name_results[key] = error
+
+    if error != None:
+        raise GeneratorError(error)
+
 def break_string(string, indent_marker, space=' ', continuation='', indent_head='',
                  indent_tail='', indent_suffix='', max_length=90, break_point='<BP>'):
     result = string.replace(break_point, space)
@@ -1793,20 +2260,33 @@ class GeneratorError(Exception):
 NameFlavors = namedtuple('NameFlavors', 'space lower camel headless under upper dash camel_abbrv lower_no_space camel_constant_safe')
 
 class FlavoredName(object):
-    def __init__(self, name):
-        self.words = name.split(' ')
-        self.cache = {}
+    # FlavoredName is immutable, there is exactly one instance per distinct name
+    # string that is shared across the whole model and caches all its flavors
+    interned = {}
+
+    def __new__(cls, name):
+        try:
+            return FlavoredName.interned[name]
+        except KeyError:
+            flavored_name = object.__new__(cls)
+            flavored_name.words = tuple(name.split(' '))
+            flavored_name.cache = {}
+
+            return FlavoredName.interned.setdefault(name, flavored_name)
+
+    def __getnewargs__(self):
+        return (' '.join(self.words),)
 
     def get(self, skip=0, suffix=''):
-        key = str(skip) + ',' + suffix
+        key = (skip, suffix)
 
         try:
             return self.cache[key]
         except KeyError:
             if skip < 0:
-                words = self.words[:skip]
+                words = list(self.words[:skip])
             else:
-                words = self.words[skip:]
+                words = list(self.words[skip:])
 
             words[-1] += suffix
 
@@ -2294,6 +2774,65 @@ unit_prefixes = [
     UnitPrefix('h',  {'en': 'Hecto', 'de': 'Hekto'}, 0, 100)
 ]
 
+unit_lookup = None # unit name -> (unit, prefix, inverse_prefix)
+unit_lookup_clones = {} # unit name -> unit with prefix/inverse_prefix applied
+
+def build_unit_lookup():
+    lookup = {}
+
+    # same order as a linear scan over all units and prefixes would check the
+    # names in, so that the first match wins in case of ambiguous names
+    for unit in units:
+        allowed_prefixes = unit.get_allowed_prefixes()
+        allowed_inverse_prefixes = unit.get_allowed_inverse_prefixes()
+
+        lookup.setdefault(unit.get_name(), (unit, None, None))
+
+        for unit_prefix in unit_prefixes:
+            if unit_prefix.symbol not in allowed_prefixes:
+                continue
+
+            lookup.setdefault(unit.get_name(prefix=unit_prefix), (unit, unit_prefix, None))
+
+            for unit_inverse_prefix in unit_prefixes:
+                if unit_inverse_prefix.symbol not in allowed_inverse_prefixes:
+                    continue
+
+                lookup.setdefault(unit.get_name(prefix=unit_prefix, inverse_prefix=unit_inverse_prefix), (unit, unit_prefix, unit_inverse_prefix))
+
+        for unit_inverse_prefix in unit_prefixes:
+            if unit_inverse_prefix.symbol not in allowed_inverse_prefixes:
+                continue
+
+            lookup.setdefault(unit.get_name(inverse_prefix=unit_inverse_prefix), (unit, None, unit_inverse_prefix))
+
+    return lookup
+
+def resolve_unit(unit_name):
+    global unit_lookup
+
+    unit = unit_lookup_clones.get(unit_name)
+
+    if unit != None:
+        return unit
+
+    if unit_lookup == None:
+        unit_lookup = build_unit_lookup()
+
+    entry = unit_lookup.get(unit_name)
+
+    if entry == None:
+        return None
+
+    unit, unit_prefix, unit_inverse_prefix = entry
+
+    if unit_prefix != None or unit_inverse_prefix != None:
+        unit = unit.clone(prefix=unit_prefix, inverse_prefix=unit_inverse_prefix)
+
+    unit_lookup_clones[unit_name] = unit
+
+    return unit
+
 class Constant(object):
     def __init__(self, raw_data, constant_group):
         self.raw_data = raw_data
@@ -2449,48 +2988,7 @@ class Element(object):
             else:
                 assert self.get_type() not in ['float', 'bool', 'char', 'string'], raw_data
 
-                unit = None
-
-                for candidate in units:
-                    if unit_name == candidate.get_name():
-                        unit = candidate
-                        break
-
-                    candidate_allowed_prefixes = candidate.get_allowed_prefixes()
-                    candidate_allowed_inverse_prefixes = candidate.get_allowed_inverse_prefixes()
-
-                    for unit_prefix in unit_prefixes:
-                        if unit_prefix.symbol not in candidate_allowed_prefixes:
-                            continue
-
-                        if unit_name == candidate.get_name(prefix=unit_prefix):
-                            unit = candidate.clone(prefix=unit_prefix)
-                            break
-
-                        for unit_inverse_prefix in unit_prefixes:
-                            if unit_inverse_prefix.symbol not in candidate_allowed_inverse_prefixes:
-                                continue
-
-                            if unit_name == candidate.get_name(prefix=unit_prefix, inverse_prefix=unit_inverse_prefix):
-                                unit = candidate.clone(prefix=unit_prefix, inverse_prefix=unit_inverse_prefix)
-                                break
-
-                        if unit != None:
-                            break
-
-                    if unit != None:
-                        break
-
-                    for unit_inverse_prefix in unit_prefixes:
-                        if unit_inverse_prefix.symbol not in candidate_allowed_inverse_prefixes:
-                            continue
-
-                        if unit_name == candidate.get_name(inverse_prefix=unit_inverse_prefix):
-                            unit = candidate.clone(inverse_prefix=unit_inverse_prefix)
-                            break
-
-                    if unit != None:
-                        break
+                unit = resolve_unit(unit_name)
 
                 assert unit != None, unit_name
 
@@ -4422,6 +4920,7 @@ class Generator:
     check_root_dir_name = True
     is_doc_generator = False
     is_openhab_doc_generator = False
+    incremental_extra_inputs = [] # files or directories (not recursive) outside the bindings directory, relative to it
 
     def __init__(self, root_dir, config_name, language):
         self.root_dir = root_dir
@@ -4446,6 +4945,8 @@ class Generator:
             self.doc_dir_name = 'doc_' + config_name
             self.zip_dir_name = 'zip_' + config_name
 
+        self.previous_output_dirs = [] # [(path, previous path), ...]
+
     def get_bindings_name(self):
         raise GeneratorError("get_bindings_name() not implemented")
 
@@ -4602,6 +5103,67 @@ class Generator:
                                     version[2],
                                     ' '*delta)
 
+    def get_input_paths(self):
+        # all source files of the bindings, but not the generated files
+        paths = []
+        root_dir = self.get_root_dir()
+
+        for dirpath, dirnames, filenames in os.walk(root_dir):
+            if dirpath == root_dir:
+                dirnames[:] = [name for name in dirnames
+                               if not name.startswith(('bindings', 'doc', 'zip', 'tmp')) and name not in ['debian', 'stubs']]
+
+            dirnames[:] = sorted(name for name in dirnames if not name.startswith('.') and name != '__pycache__')
+
+            for filename in sorted(filenames):
+                if not filename.endswith(('.zip', '.pyc', '.tmp')):
+                    paths.append(os.path.join(dirpath, filename))
+
+        for path in self.incremental_extra_inputs:
+            path = os.path.join(root_dir, path)
+
+            if os.path.isdir(path):
+                paths += [os.path.join(path, name) for name in sorted(os.listdir(path))
+                          if os.path.isfile(os.path.join(path, name)) and not name.endswith(('.zip', '.pyc', '.tmp'))]
+            else:
+                paths.append(path)
+
+        return paths
+
+    def get_input_options(self):
+        # options besides the input files that change the outputs
+        return []
+
+    def get_output_paths(self):
+        # None means that the outputs are not known and the generator always has to run
+        return None
+
+    def prepare_output_dir(self, path):
+        # in incremental mode the previous output is kept aside, to restore the
+        # files that did not change, apart from their date line
+        if enable_incremental and os.path.exists(path):
+            previous_path = path + '.previous'
+
+            if os.path.exists(previous_path):
+                shutil.rmtree(previous_path)
+
+            os.rename(path, previous_path)
+            self.previous_output_dirs.append((path, previous_path))
+
+        recreate_dir(path)
+
+    def restore_unchanged_output_files(self):
+        for path, previous_path in self.previous_output_dirs:
+            for previous_file_path in list_files(previous_path):
+                file_path = os.path.join(path, os.path.relpath(previous_file_path, previous_path))
+
+                if files_equal(previous_file_path, file_path):
+                    os.replace(previous_file_path, file_path)
+
+            shutil.rmtree(previous_path)
+
+        self.previous_output_dirs = []
+
     def prepare(self):
         pass
 
@@ -4627,7 +5189,7 @@ class DocGenerator(Generator):
         raise GeneratorError("get_doc_example_regex() not implemented")
 
     def prepare(self):
-        recreate_dir(os.path.join(self.get_doc_dir(), self.get_language()))
+        self.prepare_output_dir(os.path.join(self.get_doc_dir(), self.get_language()))
 
     def finish(self):
         # Copy IPConnection examples
@@ -4653,9 +5215,15 @@ class BindingsGenerator(Generator):
 
         self.released_files = []
 
+    def get_output_paths(self):
+        if not self.recreate_bindings_dir:
+            return None
+
+        return list_files(self.get_bindings_dir())
+
     def prepare(self):
         if self.recreate_bindings_dir:
-            recreate_dir(self.get_bindings_dir())
+            self.prepare_output_dir(self.get_bindings_dir())
 
     def finish(self):
         with open(os.path.join(self.get_bindings_dir(), '__released_files__'), 'w') as f:
@@ -4664,11 +5232,41 @@ class BindingsGenerator(Generator):
 
 class ZipGenerator(Generator):
     recreate_zip_dir = True
+    manifests_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '.cache', 'zip')
+
+    def __init__(self, *args, **kwargs):
+        Generator.__init__(self, *args, **kwargs)
+
+        self.zip_files = [] # [(source path, arcname), ...], added to the ZIP file without copying them to the zip dir first
+
+    def get_input_paths(self):
+        paths = Generator.get_input_paths(self) + list_files(self.get_bindings_dir())
+
+        # the examples are included from the Brick and Bricklet gits
+        global_root_dir = os.path.normpath(os.path.join(self.get_root_dir(), '..', '..'))
+
+        for git_name in sorted(os.listdir(global_root_dir)):
+            paths += list_files(os.path.join(global_root_dir, git_name, 'software', 'examples', self.get_bindings_name()))
+
+        return paths
+
+    def get_output_paths(self):
+        if self.get_config_name().space == 'Tinkerforge':
+            version = get_changelog_version(self.get_root_dir())
+        else:
+            version = get_changelog_version(self.get_config_dir())
+
+        zipname = '{0}_{1}_bindings_{2}_{3}_{4}.zip'.format(self.get_config_name().under, self.get_bindings_name(), *version)
+
+        return [os.path.join(self.get_root_dir(), zipname)]
 
     def prepare(self):
         if self.recreate_zip_dir:
             recreate_dir(self.get_zip_dir())
 
+    def add_zip_file(self, source_path, arcname):
+        self.zip_files.append((source_path, arcname))
+
     def get_released_files(self):
         released_files = []
 
@@ -4685,10 +5283,73 @@ class ZipGenerator(Generator):
             version = get_changelog_version(self.get_config_dir())
 
         zipname = '{0}_{1}_bindings_{2}_{3}_{4}.zip'.format(self.get_config_name().under, self.get_bindings_name(), *version)
+        zip_path = os.path.join(self.get_root_dir(), zipname)
+
+        with profile_stage('zip', detail=zipname):
+            files = {} # arcname -> source path
+
+            for path in list_files(source_path):
+                files[os.path.relpath(path, source_path).replace(os.sep, '/')] = path
+
+            for path, arcname in self.zip_files:
+                files[arcname] = path
+
+            directories = set()
+
+            for arcname in files:
+                parts = arcname.split('/')[:-1]
+
+                for i in range(len(parts)):
+                    directories.add('/'.join(parts[:i + 1]) + '/')
+
+            for dirpath, dirnames, _ in os.walk(source_path): # include empty directories
+                for dirname in dirnames:
+                    directories.add(os.path.relpath(os.path.join(dirpath, dirname), source_path).replace(os.sep, '/') + '/')
+
+            entries = [(directory, None, True) for directory in directories]
+
+            for arcname, path in files.items():
+                with open(path, 'rb') as f:
+                    entries.append((arcname, f.read(), os.access(path, os.X_OK)))
+
+            entries.sort(key=lambda entry: entry[0])
+
+            # the archive is reproducible, if the content did not change then the
+            # existing ZIP file is already up to date
+            h = hashlib.sha256()
+
+            for arcname, data, executable in entries:
+                h.update(arcname.encode('utf-8') + (b'\0x' if executable else b'\0-'))
+                h.update(hashlib.sha256(data if data != None else b'').digest())
+
+            content_hash = h.hexdigest()
+            manifest_path = os.path.join(self.manifests_dir, '{0}_{1}.json'.format(self.get_bindings_name(), zipname))
+
+            try:
+                with open(manifest_path, 'r') as f:
+                    manifest = json.load(f)
+
+                with open(zip_path, 'rb') as f:
+                    zip_hash = hashlib.sha256(f.read()).hexdigest()
+
+                if manifest['content'] == content_hash and manifest['zip'] == zip_hash:
+                    print('    \033[01;36m(zip file up to date)\033[0m')
+                    return
+            except (OSError, ValueError, KeyError):
+                pass
+
+            write_zip_file(zip_path, entries)
 
-        with ChangedDirectory(source_path):
-            execute(['zip', '-q', '-r', zipname, '.'])
-            os.replace(zipname, os.path.join(self.get_root_dir(), zipname))
+            try:
+                with open(zip_path, 'rb') as f:
+                    zip_hash = hashlib.sha256(f.read()).hexdigest()
+
+                os.makedirs(self.manifests_dir, exist_ok=True)
+
+                with open(manifest_path, 'w') as f:
+                    json.dump({'content': content_hash, 'zip': zip_hash}, f)
+            except OSError as e:
+                print_verbose('  \033[01;31m! could not write zip manifest: {0}\033[0m'.format(e))
 
 class ExamplesGenerator(Generator):
     skip_existing_incomplete_example = True
@@ -4707,6 +5368,32 @@ class ExamplesGenerator(Generator):
             git_dir = os.path.join(override_git_dir, device.get_git_name())
         return os.path.join(git_dir, 'software', 'examples', self.get_bindings_name())
 
+tester_processes = None # None means one per CPU, set by the --processes option of test_all.py
+enable_tester_cache = True
+tester_cache_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '.cache', 'tester')
+tester_tool_fingerprints = {}
+
+def get_tool_fingerprint(tool):
+    # path, size and modification time of the executable change if the tool
+    # gets updated, this avoids calling every tool with its own version option
+    try:
+        return tester_tool_fingerprints[tool]
+    except KeyError:
+        pass
+
+    path = shutil.which(tool)
+
+    if path == None:
+        fingerprint = tool
+    else:
+        path = os.path.realpath(path)
+        stat = os.stat(path)
+        fingerprint = '{0}:{1}:{2}'.format(path, stat.st_size, stat.st_mtime_ns)
+
+    tester_tool_fingerprints[tool] = fingerprint
+
+    return fingerprint
+
 def tester_worker(cookie, args, env):
     try:
         exit_code, output = check_output_and_error(args, env=env)
@@ -4716,7 +5403,7 @@ def tester_worker(cookie, args, env):
     return cookie, exit_code, output
 
 class Tester(object):
-    PROCESSES = 8
+    PROCESSES = None # overrides tester_processes, if the tool cannot run in parallel
 
     def __init__(self, name, extension, root_dir, subdirs=None, comment=None, extra_paths=None):
         version = get_changelog_version(root_dir)
@@ -4731,11 +5418,90 @@ class Tester(object):
         self.test_count = 0
         self.success_count = 0
         self.failure_count = 0
-        self.pool = multiprocessing.dummy.Pool(processes=self.PROCESSES)
+        self.cached_count = 0
+        self.bindings_hash = None
+        self.cached_results = {} # cache key -> output of a successful test
+        self.results = {}
+
+        if self.PROCESSES != None:
+            processes = self.PROCESSES
+        elif tester_processes != None:
+            processes = tester_processes
+        else:
+            processes = multiprocessing.cpu_count()
+
+        self.pool = multiprocessing.dummy.Pool(processes=processes)
+
+    def get_cache_path(self):
+        name = '{0}_{1}_{2}.json'.format(self.name, self.__class__.__name__, re.sub('[^A-Za-z0-9+]', '_', str(self.comment)))
+
+        return os.path.join(tester_cache_dir, name)
+
+    def get_bindings_hash(self, tmp_dir):
+        # all unpacked files except the examples, they don't depend on each other
+        h = hashlib.sha256()
+
+        for path in list_files(tmp_dir):
+            relpath = os.path.relpath(path, tmp_dir)
+
+            if relpath.startswith('examples' + os.sep) or relpath == self.zipname:
+                continue
+
+            h.update(relpath.encode('utf-8') + b'\0' + hash_output_file(path).encode('utf-8'))
+
+        return h.hexdigest()
+
+    def get_cache_key(self, cookie, args, env):
+        if self.bindings_hash == None or not os.path.isfile(cookie[0]):
+            return None
+
+        h = hashlib.sha256()
+
+        h.update(get_tool_fingerprint(args[0]).encode('utf-8') + b'\0')
+        h.update(json.dumps([args, sorted(env.items()) if env != None else None]).encode('utf-8') + b'\0')
+        h.update(self.bindings_hash.encode('utf-8') + b'\0')
+
+        with open(cookie[0], 'rb') as f:
+            h.update(f.read())
+
+        return h.hexdigest()
+
+    def load_cached_results(self):
+        try:
+            with open(self.get_cache_path(), 'r') as f:
+                self.cached_results = json.load(f)
+        except (OSError, ValueError):
+            self.cached_results = {}
+
+    def store_results(self):
+        # only keep the results of this run, to not let the cache grow forever
+        try:
+            os.makedirs(tester_cache_dir, exist_ok=True)
+
+            cache_tmp_path = self.get_cache_path() + '.{0}.tmp'.format(os.getpid())
+
+            with open(cache_tmp_path, 'w') as f:
+                json.dump(self.results, f)
+
+            os.replace(cache_tmp_path, self.get_cache_path())
+        except OSError as e:
+            print('### could not write tester cache: {0}'.format(e))
 
     def execute(self, cookie, args, env=None):
+        if enable_tester_cache:
+            key = self.get_cache_key(cookie, args, env)
+        else:
+            key = None
+
+        if key != None and key in self.cached_results:
+            self.cached_count += 1
+            self.results[key] = self.cached_results[key]
+            self.handle_result(cookie, 0, self.cached_results[key], cached=True)
+            return
+
         def callback(result):
-            self.handle_result(*result)
+            if self.handle_result(*result) and key != None:
+                self.results[key] = result[2]
 
         self.pool.apply_async(tester_worker, args=(cookie, args, env), callback=callback)
 
@@ -4743,7 +5509,7 @@ class Tester(object):
         self.test_count += 1
         self.test((path,), path, extra)
 
-    def handle_result(self, cookie, exit_code, output):
+    def handle_result(self, cookie, exit_code, output, cached=False):
         if exit_code == None: # FIXME: add better handling
             if len(output) > 0:
                 print(output)
@@ -4751,12 +5517,18 @@ class Tester(object):
             sys.exit(1)
 
         path = cookie[0]
-        success = self.check_success(exit_code, output)
+
+        if cached:
+            success = True
+            cached_suffix = ' (cached)'
+        else:
+            success = self.check_success(exit_code, output)
+            cached_suffix = ''
 
         if self.comment != None:
-            print('>>> [{0}] testing {1}'.format(self.comment, path))
+            print('>>> [{0}] testing {1}{2}'.format(self.comment, path, cached_suffix))
         else:
-            print('>>> testing {0}'.format(path))
+            print('>>> testing {0}{1}'.format(path, cached_suffix))
 
         output = output.strip()
 
@@ -4778,6 +5550,8 @@ class Tester(object):
                 self.failure_count += 1
                 print('>>> test failed\n')
 
+        return success
+
     def after_unzip(self):
         return True
 
@@ -4817,6 +5591,10 @@ class Tester(object):
             if not self.after_unzip():
                 return False
 
+            if enable_tester_cache:
+                self.bindings_hash = self.get_bindings_hash(tmp_dir)
+                self.load_cached_results()
+
             # test
             for subdir in self.subdirs:
                 for root, _, files in os.walk(os.path.join(tmp_dir, subdir)):
@@ -4832,13 +5610,16 @@ class Tester(object):
             self.pool.close()
             self.pool.join()
 
+        if enable_tester_cache:
+            self.store_results()
+
         # report
         if self.comment != None:
-            print('### [{0}] {1} file(s) tested, {2} test(s) succeeded, {3} failure(s) occurred'
-                  .format(self.comment, self.test_count, self.success_count, self.failure_count))
+            print('### [{0}] {1} file(s) tested, {2} test(s) succeeded ({3} cached), {4} failure(s) occurred'
+                  .format(self.comment, self.test_count, self.success_count, self.cached_count, self.failure_count))
         else:
-            print('### {0} file(s) tested, {1} test(s) succeeded, {2} failure(s) occurred'
-                  .format(self.test_count, self.success_count, self.failure_count))
+            print('### {0} file(s) tested, {1} test(s) succeeded ({2} cached), {3} failure(s) occurred'
+                  .format(self.test_count, self.success_count, self.cached_count, self.failure_count))
 
         return self.failure_count == 0
 
@@ -4855,13 +5636,156 @@ class ChangedDirectory(object):
     def __exit__(self, type_, value, traceback):
         os.chdir(self.previous_path)
 
+docker_image_name = 'tinkerforge/builder-generators-debian:1.0.0'
+worker_container_name = 'tinkerforge-builder-generators-worker'
+worker_socket_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), '.cache', 'worker.sock')
+
+# the build worker answers a job with frames of a 1 byte type and a 4 byte length,
+# followed by the payload. output frames carry raw output, the exit frame the exit code
+WORKER_FRAME_OUTPUT = 0
+WORKER_FRAME_EXIT = 1
+
+def check_docker():
+    if shutil.which('docker') == None:
+        print('error: docker is not installed')
+        sys.exit(1)
+
+    if len(subprocess.check_output(['docker', 'images', '-q', docker_image_name]).strip()) == 0:
+        print('error: docker image {0} is missing'.format(docker_image_name))
+        sys.exit(1)
+
+def get_docker_run_args(run_options, command):
+    generators_host_dir = os.path.dirname(os.path.realpath(__file__))
+
+    root_host_dir = os.path.realpath(os.path.join(generators_host_dir, '..'))
+    root_container_dir = root_host_dir
+
+    m2_host_dir = os.path.join(generators_host_dir, '.m2')
+    m2_container_dir = '/home/foobar/.m2'
+
+    gnupg_host_dir = os.path.expanduser('~/.gnupg')
+    gnupg_container_dir = '/home/foobar/.gnupg'
+
+    os.makedirs(m2_host_dir, exist_ok=True)
+
+    return ['docker', 'run'] + run_options + \
+           ['-v',
+            '{0}:{1}'.format(root_host_dir, root_container_dir),
+            '-v',
+            '{0}:{1}'.format(m2_host_dir, m2_container_dir),
+            '-v',
+            '{0}:{1}'.format(gnupg_host_dir, gnupg_container_dir),
+            '-u',
+            '{0}:{1}'.format(os.getuid(), os.getgid()),
+            docker_image_name,
+            'bash',
+            '-c',
+            command]
+
+def connect_worker():
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.connect(worker_socket_path)
+    except OSError:
+        sock.close()
+        return None
+
+    return sock
+
+def start_worker_container():
+    check_docker()
+
+    print('\033[01;35m>>> starting build worker in docker container\033[0m')
+
+    generators_container_dir = os.path.dirname(os.path.realpath(__file__))
+
+    if subprocess.call(get_docker_run_args(['--rm', '-d', '--name', worker_container_name],
+                                           'cd {0}; python3 -u build_worker.py serve'.format(generators_container_dir)),
+                       stdout=subprocess.DEVNULL) != 0:
+        print('error: could not start build worker container')
+        sys.exit(1)
+
+    # the worker preloads all modules and configs before it starts listening
+    for _ in range(120):
+        sock = connect_worker()
+
+        if sock != None:
+            return sock
+
+        time.sleep(0.5)
+
+    print('error: build worker container did not start listening on {0}'.format(worker_socket_path))
+    sys.exit(1)
+
+def recv_exactly(sock, length):
+    data = b''
+
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+
+        if len(chunk) == 0:
+            return None
+
+        data += chunk
+
+    return data
+
+def run_in_worker(script_path, docker):
+    sock = connect_worker()
+
+    if sock == None:
+        if not docker:
+            print('error: no build worker is running, start one with: python3 build_worker.py serve')
+            sys.exit(1)
+
+        sock = start_worker_container()
+
+    script_name = os.path.split(script_path)[-1]
+
+    print('\033[01;35m>>> running {0} in build worker\033[0m'.format(script_name))
+
+    job = {'script': os.path.realpath(script_path),
+           'argv': sys.argv[1:] + ['--no-worker', '--no-docker'],
+           'cwd': os.getcwd()}
+
+    with sock:
+        sock.sendall(json.dumps(job).encode('utf-8') + b'\n')
+
+        while True:
+            header = recv_exactly(sock, 5)
+
+            if header == None:
+                print('error: build worker closed the connection')
+                return 1
+
+            frame_type, length = struct.unpack('<BI', header)
+            payload = recv_exactly(sock, length)
+
+            if payload == None:
+                print('error: build worker closed the connection')
+                return 1
+
+            if frame_type == WORKER_FRAME_OUTPUT:
+                sys.stdout.buffer.write(payload)
+                sys.stdout.buffer.flush()
+            elif frame_type == WORKER_FRAME_EXIT:
+                return struct.unpack('<i', payload)[0]
+
 def dockerize(bindings_name, script_path, add_arguments=None):
     parser = argparse.ArgumentParser()
 
     parser.add_argument('-d', '--docker', action='store_true', help='run this script in docker container')
     parser.add_argument('-D', '--no-docker', action='store_false', help='run this script normally [default]', dest='docker')
+    parser.add_argument('-w', '--worker', action='store_true', help='run this script in the persistent build worker, together with --docker the worker runs in a docker container that is started on first use')
+    parser.add_argument('-W', '--no-worker', action='store_false', help='run this script in a new process [default]', dest='worker')
     parser.add_argument('-v', '--verbose', action='store_true', help='enable verbose prints')
     parser.add_argument('-V', '--no-verbose', action='store_false', help='disable verbose prints [default]', dest='verbose')
+    parser.add_argument('-i', '--incremental', action='store_true', help='skip generators whose inputs did not change and keep unchanged files')
+    parser.add_argument('-I', '--no-incremental', action='store_false', help='always regenerate everything [default]', dest='incremental')
+    parser.add_argument('--profile', nargs='?', const=os.path.join(os.path.dirname(os.path.realpath(__file__)), '.cache', 'profile'), metavar='DIR',
+                        help='record wall and CPU time per generator, config and device and write a report to DIR [default: .cache/profile]')
+    parser.add_argument('--profile-pstats', action='store_true', help='also dump cProfile stats per generator and config, requires --profile')
 
     if add_arguments != None:
         add_arguments(parser)
@@ -4871,52 +5795,30 @@ def dockerize(bindings_name, script_path, add_arguments=None):
     global enable_verbose
     enable_verbose = args.verbose
 
-    if args.docker:
-        if shutil.which('docker') == None:
-            print('error: docker is not installed')
-            sys.exit(1)
+    global enable_incremental
+    enable_incremental = args.incremental
 
-        image_name = 'tinkerforge/builder-generators-debian:1.0.0'
+    if args.profile_pstats and args.profile == None:
+        parser.error('--profile-pstats requires --profile')
 
-        if len(subprocess.check_output(['docker', 'images', '-q', image_name]).strip()) == 0:
-            print('error: docker image {0} is missing'.format(image_name))
-            sys.exit(1)
+    if args.profile != None and not args.docker and not args.worker:
+        atexit.register(enable_profile(args.profile, args.profile_pstats).write_report)
+
+    if args.worker:
+        sys.exit(run_in_worker(script_path, args.docker))
+
+    if args.docker:
+        check_docker()
 
         script_name = os.path.split(script_path)[-1]
 
         print('\033[01;35m>>> running {0} in docker container\033[0m'.format(script_name))
 
-        generators_host_dir = os.path.dirname(os.path.realpath(__file__))
-        generators_container_dir = generators_host_dir
-
-        root_host_dir = os.path.realpath(os.path.join(generators_host_dir, '..'))
-        root_container_dir = root_host_dir
-
-        m2_host_dir = os.path.join(generators_host_dir, '.m2')
-        m2_container_dir = '/home/foobar/.m2'
-
-        gnupg_host_dir = os.path.expanduser('~/.gnupg')
-        gnupg_container_dir = '/home/foobar/.gnupg'
-
-        os.makedirs(m2_host_dir, exist_ok=True)
-
-        sys.exit(subprocess.call(['docker',
-                                  'run',
-                                  '--rm',
-                                  '-it',
-                                  '-v',
-                                  '{0}:{1}'.format(root_host_dir, root_container_dir),
-                                  '-v',
-                                  '{0}:{1}'.format(m2_host_dir, m2_container_dir),
-                                  '-v',
-                                  '{0}:{1}'.format(gnupg_host_dir, gnupg_container_dir),
-                                  '-u',
-                                  '{0}:{1}'.format(os.getuid(), os.getgid()),
-                                  image_name,
-                                  'bash',
-                                  '-c',
-                                  'cd {0}; python3 -u {1} {2}'.format(os.path.join(generators_container_dir, bindings_name),
-                                                                      script_name,
-                                                                      shlex.join(sys.argv[1:] + ['--no-docker']))]))
+        generators_container_dir = os.path.dirname(os.path.realpath(__file__))
+
+        sys.exit(subprocess.call(get_docker_run_args(['--rm', '-it'],
+                                                     'cd {0}; python3 -u {1} {2}'.format(os.path.join(generators_container_dir, bindings_name),
+                                                                                         script_name,
+                                                                                         shlex.join(sys.argv[1:] + ['--no-docker'])))))
 
     return args
@@ -88,7 +88,7 @@ def main():
         if not os.path.isdir(binding) or os.path.exists(os.path.join(generators_dir, binding, 'skip_copy_all')):
             continue
 
-        if binding not in ['.git', '.m2', '.vscode', '__pycache__', 'configs', 'docker']:
+        if binding not in ['.cache', '.git', '.m2', '.vscode', '__pycache__', 'configs', 'docker']:
             bindings.append(binding)
 
     bindings = sorted(bindings)
@@ -110,7 +110,8 @@ def main():
 
             path_binding = os.path.join(path, 'python')
             src_file_path = os.path.join(path_binding, 'bindings')
-            files = [f for f in os.listdir(src_file_path) if f.endswith('.py')]
+            # brickv and flash-test don't use the asyncio bindings and don't get async_ip_connection.py
+            files = [f for f in os.listdir(src_file_path) if f.endswith('.py') and not f.startswith('async_')]
 
             files.remove('device_factory.py')
 
@@ -9,6 +9,9 @@ if sys.hexversion < 0x3040000:
 
 import os
 import socket
+import traceback
+import multiprocessing
+import queue
 import importlib.util
 import importlib.machinery
 
@@ -55,6 +58,111 @@ def modify_items(kind, active_items, all_items, action, item):
 
     return active_items
 
+# generators that have to be done for a binding before a generator can run for it
+generator_dependencies = {
+    'bindings': [],
+    'examples': [],
+    'doc': ['examples'],
+    'zip': ['bindings', 'examples'],
+    'debian_package': ['zip']
+}
+
+# bindings whose units have to be done before a generator can run for a binding,
+# because the generator regenerates these bindings itself
+binding_dependencies = {
+    ('zip', 'tvpl'): ['javascript']
+}
+
+def get_unit_name(unit):
+    generator, binding, language = unit
+
+    return '{0}/{1}/{2}'.format(binding, generator, language)
+
+def generate_unit(generator, binding, language):
+    try:
+        module = importlib.import_module('generators.{0}.generate_{0}_{1}'.format(binding, generator))
+    except ImportError: # FIXME: Python 3.6 has ModuleNotFoundError, which would be better to use here, but Debian Stretch has only Python 3.5
+        print('\033[01;36m### generator missing\033[0m')
+    else:
+        module.generate(os.path.join(generators_dir, binding), language)
+
+def run_unit(unit):
+    output, _, exc = common.run_captured(generate_unit, *unit)
+
+    if exc == None:
+        error = None
+    elif isinstance(exc, common.GeneratorError):
+        error = 'GeneratorError: {0}'.format(exc)
+    elif isinstance(exc, SystemExit): # common.execute exits on failing commands
+        error = 'exited with code {0}'.format(exc.code)
+    else:
+        error = ''.join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+
+    # the profile report is written by the main process
+    if common.profiler != None:
+        records = common.profiler.take_records()
+    else:
+        records = []
+
+    return unit, output, error, records
+
+def print_unit_output(unit, output):
+    prefix = '[{0}] '.format(get_unit_name(unit))
+
+    for line in output.splitlines():
+        print(prefix + line)
+
+def run_units(units, jobs):
+    # a unit depends on all earlier units for the same binding with a generator
+    # it depends on, and on all units of the bindings it depends on
+    dependencies = {}
+
+    for i, unit in enumerate(units):
+        generator, binding, language = unit
+        dependency_bindings = binding_dependencies.get((generator, binding), [])
+
+        dependencies[unit] = set(other for other in units[:i]
+                                 if (other[1] == binding and other[0] in generator_dependencies[generator]) or other[1] in dependency_bindings)
+
+    pending = list(units)
+    running = set()
+    done = set()
+    results = queue.Queue()
+
+    pool = multiprocessing.Pool(jobs, initializer=common.init_worker, initargs=(common.get_worker_options(),))
+
+    try:
+        while len(pending) > 0 or len(running) > 0:
+            for unit in list(pending):
+                if dependencies[unit] <= done:
+                    pending.remove(unit)
+                    running.add(unit)
+
+                    print('\033[01;32m>>> running {0} generator for {1} bindings ({2})\033[0m'.format(unit[0], unit[1], unit[2]))
+
+                    pool.apply_async(run_unit, (unit,), callback=results.put,
+                                     error_callback=lambda e, unit=unit: results.put((unit, '', str(e), [])))
+
+            unit, output, error, records = results.get()
+
+            running.remove(unit)
+
+            if common.profiler != None:
+                common.profiler.add_records(records)
+            print_unit_output(unit, output)
+
+            if error != None:
+                print('\033[01;31m>>> {0} failed: {1}\033[0m'.format(get_unit_name(unit), error.rstrip()))
+
+                return 1
+
+            done.add(unit)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return 0
+
 def main(args):
     all_generators = ['bindings', 'examples', 'doc', 'zip', 'debian_package']
 
@@ -80,7 +188,7 @@ def main(args):
         if not os.path.isdir(binding) or os.path.exists(os.path.join(generators_dir, binding, 'skip_generate_all')):
             continue
 
-        if binding not in ['.git', '.m2', '.vscode', '__pycache__', 'configs', 'docker']:
+        if binding not in ['.cache', '.git', '.m2', '.vscode', '__pycache__', 'configs', 'docker']:
             all_bindings.append(binding)
 
     all_bindings = sorted(all_bindings)
@@ -105,6 +213,27 @@ def main(args):
         'debian_package': ['en']
     }
 
+    if args.jobs > 1:
+        units = []
+
+        for generator in all_generators:
+            if generator not in active_generators:
+                continue
+
+            for binding in all_bindings:
+                if binding not in active_bindings:
+                    continue
+
+                for language in languages[generator]:
+                    units.append((generator, binding, language))
+
+        if run_units(units, args.jobs) != 0:
+            return 1
+
+        print('\033[01;35m>>> done\033[0m')
+
+        return 0
+
     for generator in all_generators:
         if generator not in active_generators:
             continue
@@ -129,5 +258,6 @@ if __name__ == '__main__':
     def add_arguments(parser):
         parser.add_argument('-g', '--generators', nargs=1, help='comma separated list of generators, each prefixed by +/-/>/<')
         parser.add_argument('-b', '--bindings', nargs=1, help='comma separated list of bindings, each prefixed by +/-/>/<')
+        parser.add_argument('-j', '--jobs', type=int, default=1, help='number of generators to run in parallel [default: 1]')
 
     sys.exit(main(common.dockerize('', __file__, add_arguments=add_arguments)))
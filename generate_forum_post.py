@@ -57,7 +57,7 @@ def main():
         if not os.path.isdir(binding) or os.path.exists(os.path.join(generators_dir, binding, 'skip_generate_forum_post')):
             continue
 
-        if binding not in ['.git', '.vscode', '.m2', '__pycache__', 'configs', 'docker']:
+        if binding not in ['.cache', '.git', '.vscode', '.m2', '__pycache__', 'configs', 'docker']:
             bindings.append(binding)
 
     display_names = []
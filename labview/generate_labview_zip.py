@@ -57,6 +57,8 @@ from generators import common
 from generators.labview import labview_common
 
 class LabVIEWZipGenerator(labview_common.LabVIEWGeneratorTrait, common.ZipGenerator):
+    incremental_extra_inputs = ['../csharp/IPConnection.cs', '../csharp/AssemblyInfo.cs.template']
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
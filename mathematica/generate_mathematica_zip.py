@@ -56,6 +56,8 @@ from generators import common
 from generators.mathematica import mathematica_common
 
 class MathematicaZipGenerator(mathematica_common.MathematicaGeneratorTrait, common.ZipGenerator):
+    incremental_extra_inputs = ['../csharp/IPConnection.cs', '../csharp/AssemblyInfo.cs.template']
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
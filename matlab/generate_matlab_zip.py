@@ -56,6 +56,8 @@ from generators.java import java_common
 from generators.matlab import matlab_common
 
 class MATLABZipGenerator(matlab_common.MATLABGeneratorTrait, common.ZipGenerator):
+    incremental_extra_inputs = ['../java']
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
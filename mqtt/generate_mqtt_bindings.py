@@ -70,28 +70,25 @@ class {0}(MQTTCallbackDevice):
 
         return template.format(self.get_python_class_name())
 
+    def get_mqtt_response_expected(self):
+        response_expected = []
+        mapping = {'always_true': 1, 'true': 2, 'false': 3}
+
+        for packet in self.get_packets('function'):
+            response_expected.append('{0}: {1}'.format(packet.get_function_id(),
+                                                       mapping[packet.get_response_expected()]))
+
+        return '\tdefault_response_expected = create_response_expected(Device.default_response_expected, {{{0}}})\n'.format(', '.join(response_expected))
+
     def get_mqtt_init_method(self):
         template = """
 	def __init__(self, uid, ipcon, device_class_name, device_class, mqttc):
-		MQTTCallbackDevice.__init__(self, uid, ipcon, {1}, device_names[{1}], device_class_name, device_class, mqttc)
-
-{0}
+		MQTTCallbackDevice.__init__(self, uid, ipcon, {0}, device_names[{0}], device_class_name, device_class, mqttc)
 
 		ipcon.add_device(self)
 """
-        response_expected = []
-        mapping = {'always_true': 1, 'true': 2, 'false': 3}
 
-        for packet in self.get_packets('function'):
-            response_expected.append('re[{0}] = {1}'.format(packet.get_function_id(),
-                                                            mapping[packet.get_response_expected()]))
-
-        if len(response_expected) > 0:
-            return template.format('\t\tre = self.response_expected\n\t\t' + '; '.join(response_expected),
-                                   self.get_device_identifier())
-        else:
-            return template.format('',
-                                   self.get_device_identifier())
+        return template.format(self.get_device_identifier())
 
     def get_mqtt_function_map(self):
         template = "\tfunctions = {{\n\t\t{entries}\n\t}}\n"
@@ -217,7 +214,7 @@ class {0}(MQTTCallbackDevice):
     def get_mqtt_callback_map(self):
         template = "\tcallbacks = {{\n\t\t{entries}\n\t}}\n"
         entry_template = "'{mqtt_name}': CallbackInfo({id}, {names}, [{symbols}], ({response_size}, '{fmt}'), {hl_info})"
-        hl_template = "[{2}, {{'fixed_length': {0}, 'single_chunk': {1}}}, None]"
+        hl_template = "({2}, {{'fixed_length': {0}, 'single_chunk': {1}}})"
 
         entries = []
 
@@ -246,12 +243,15 @@ class {0}(MQTTCallbackDevice):
 
     def get_mqtt_source(self):
         source  = self.get_mqtt_class()
+        source += self.get_mqtt_response_expected()
         source += self.get_mqtt_function_map()
         source += self.get_mqtt_callback_map()
         source += self.get_mqtt_init_method()
         return source
 
 class MQTTBindingsGenerator(mqtt_common.MQTTGeneratorTrait, common.BindingsGenerator):
+    incremental_extra_inputs = ['../python/ip_connection.py']
+
     def get_device_class(self):
         return MQTTBindingsDevice
 
@@ -186,6 +186,17 @@ time critical or recurring data from the device. The registration is done
 with the corresponding ``.../register/...`` topic and an optional suffix.
 This suffix can be used to deregister the callback later.
 
+Instead of "true" the registration payload can also be a JSON object with
+the member ``register`` set to true and optional publish policy members:
+``max_rate`` limits the messages to the given number per second,
+``coalesce`` publishes the latest of the suppressed messages once
+``max_rate`` allows it again instead of dropping them, ``deadband`` only
+publishes a message if a numeric value changed by at least the given amount
+and ``batch`` collects the given number of messages and publishes them as
+one JSON array. A batch that is not full after ``batch_timeout`` seconds is
+published as it is. By default this is the time a full batch takes at
+``max_rate``, but at least 1 second.
+
 .. note::
  Using callbacks for recurring events is *always* preferred
  compared to using getters. It will use less USB bandwidth and the latency
@@ -204,6 +215,18 @@ oder wiederkehrende Daten vom Gerät zu erhalten. Die Registrierung kann
 mit dem entsprechenden ``.../register/...``-Topic und einem optionalen Suffix durchgeführt werden.
 Mit diesem Suffix kann das Callback später deregistriert werden.
 
+Anstelle von "true" kann der Registrierungs-Payload auch ein JSON-Objekt sein,
+dessen Member ``register`` auf true gesetzt ist und das optionale
+Veröffentlichungsregeln enthält: ``max_rate`` begrenzt die Nachrichten auf die
+angegebene Anzahl pro Sekunde, ``coalesce`` veröffentlicht die letzte der
+unterdrückten Nachrichten sobald ``max_rate`` es wieder erlaubt, anstatt sie zu
+verwerfen, ``deadband`` veröffentlicht eine Nachricht nur, wenn sich ein
+numerischer Wert um mindestens den angegebenen Betrag geändert hat und
+``batch`` sammelt die angegebene Anzahl an Nachrichten und veröffentlicht sie
+als ein JSON-Array. Ein Batch, der nach ``batch_timeout`` Sekunden nicht voll
+ist, wird so veröffentlicht wie er ist. Standardmäßig ist das die Zeit, die ein
+voller Batch bei ``max_rate`` benötigt, mindestens aber 1 Sekunde.
+
 .. note::
  Callbacks für wiederkehrende Ereignisse zu verwenden ist
  *immer* zu bevorzugen gegenüber der Verwendung von Abfragen.
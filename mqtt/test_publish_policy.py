@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+
+# tinkerforge.footer is only the last part of the generated tinkerforge_mqtt
+# script. run it after the imports of tinkerforge.header, but without the paho
+# check, and the IP Connection to test its PublishPolicy without paho and a broker
+
+directory = os.path.dirname(os.path.realpath(__file__))
+
+with open(os.path.join(directory, 'tinkerforge.header'), 'r') as f:
+    header = f.read()
+
+with open(os.path.join(directory, '..', 'python', 'ip_connection.py'), 'r') as f:
+    ipcon = f.read()
+
+with open(os.path.join(directory, 'tinkerforge.footer'), 'r') as f:
+    footer = f.read()
+
+footer_globals = {'__name__': 'tinkerforge_footer'}
+
+exec(header[header.index('import sys'):header.index('def fatal_error')], footer_globals)
+exec(ipcon, footer_globals)
+exec(footer, footer_globals)
+
+PublishPolicy = footer_globals['PublishPolicy']
+MQTTBindings = footer_globals['MQTTBindings']
+
+class FakeMQTTClient:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload):
+        self.published.append((topic, json.loads(payload)))
+
+class FakeScheduler:
+    def __init__(self):
+        self.scheduled = []
+
+    def schedule(self, deadline, function):
+        self.scheduled.append((deadline, function))
+
+    def run_all(self):
+        scheduled = self.scheduled
+        self.scheduled = []
+
+        for deadline, function in scheduled:
+            function()
+
+def create_policy(max_rate=None, deadband=None, coalesce=False, batch=1, batch_timeout=None):
+    mqttc = FakeMQTTClient()
+    scheduler = FakeScheduler()
+    policy = PublishPolicy(mqttc, scheduler, 'topic', max_rate, deadband, coalesce, batch, batch_timeout)
+
+    return policy, mqttc, scheduler
+
+#
+# max rate
+#
+
+policy, mqttc, scheduler = create_policy(max_rate=10)
+
+policy.handle({'value': 1})
+policy.handle({'value': 2})
+policy.handle({'value': 3})
+
+assert(mqttc.published == [('topic', {'value': 1})])
+assert(len(scheduler.scheduled) == 0) # dropped, not coalesced
+
+time.sleep(0.15)
+
+policy.handle({'value': 4})
+
+assert(mqttc.published == [('topic', {'value': 1}), ('topic', {'value': 4})])
+
+#
+# coalesce
+#
+
+policy, mqttc, scheduler = create_policy(max_rate=10, coalesce=True)
+
+policy.handle({'value': 1})
+policy.handle({'value': 2})
+policy.handle({'value': 3})
+
+assert(mqttc.published == [('topic', {'value': 1})])
+assert(len(scheduler.scheduled) == 1) # one flush for all suppressed messages
+
+scheduler.run_all()
+
+assert(mqttc.published == [('topic', {'value': 1}), ('topic', {'value': 3})])
+
+scheduler.run_all()
+
+assert(len(mqttc.published) == 2) # nothing pending anymore
+
+#
+# deadband
+#
+
+policy, mqttc, scheduler = create_policy(deadband=1)
+
+policy.handle({'value': 0, 'values': [0, 0]})
+policy.handle({'value': 0.5, 'values': [0.5, 0]})
+policy.handle({'value': 1, 'values': [0, 0]})
+policy.handle({'value': 1, 'values': [0, -1]})
+policy.handle({'value': 1, 'values': [0, -1.5]})
+
+assert(mqttc.published == [('topic', {'value': 0, 'values': [0, 0]}),
+                           ('topic', {'value': 1, 'values': [0, 0]}),
+                           ('topic', {'value': 1, 'values': [0, -1]})])
+
+#
+# batch
+#
+
+policy, mqttc, scheduler = create_policy(batch=3)
+
+assert(policy.batch_timeout == 1.0)
+
+policy.handle({'value': 1})
+policy.handle({'value': 2})
+
+assert(len(mqttc.published) == 0)
+assert(len(scheduler.scheduled) == 1) # scheduled by the first sample of the batch
+
+policy.handle({'value': 3})
+
+assert(mqttc.published == [('topic', [{'value': 1}, {'value': 2}, {'value': 3}])])
+
+scheduler.run_all()
+
+assert(len(mqttc.published) == 1) # the batch was full before its timeout
+
+#
+# batch timeout
+#
+
+policy, mqttc, scheduler = create_policy(max_rate=1, batch=5)
+
+assert(policy.batch_timeout == 5.0)
+
+policy, mqttc, scheduler = create_policy(batch=5, batch_timeout=0.5)
+
+before = time.time()
+
+policy.handle({'value': 1})
+policy.handle({'value': 2})
+
+assert(len(scheduler.scheduled) == 1)
+assert(before + 0.5 <= scheduler.scheduled[0][0] <= time.time() + 0.5)
+
+scheduler.run_all()
+
+assert(mqttc.published == [('topic', [{'value': 1}, {'value': 2}])])
+
+policy.handle({'value': 3})
+scheduler.run_all()
+
+assert(mqttc.published == [('topic', [{'value': 1}, {'value': 2}]),
+                           ('topic', [{'value': 3}])])
+
+#
+# deactivate
+#
+
+policy, mqttc, scheduler = create_policy(max_rate=10, coalesce=True, batch=2)
+
+policy.handle({'value': 1})
+policy.handle({'value': 2})
+policy.deactivate()
+policy.handle({'value': 3})
+scheduler.run_all()
+
+assert(len(mqttc.published) == 0)
+
+#
+# reset callbacks
+#
+
+class FakeCallbackDevice:
+    def __init__(self, publish_policies):
+        self.publish_policies = publish_policies
+
+class FakeIPConnection:
+    def __init__(self):
+        self.devices = {}
+
+class FakeMQTTBindings(MQTTBindings):
+    def __init__(self, callback_devices): # no broker and no brickd
+        self.ipcon = FakeIPConnection()
+        self.callback_devices = callback_devices
+
+policy_a, mqttc_a, scheduler_a = create_policy(batch=2)
+policy_b, mqttc_b, scheduler_b = create_policy(max_rate=10, coalesce=True)
+
+policy_a.handle({'value': 1})
+policy_b.handle({'value': 1})
+policy_b.handle({'value': 2})
+
+bindings = FakeMQTTBindings({'a': FakeCallbackDevice({(1, 'topic'): policy_a}),
+                             'b': FakeCallbackDevice({(1, 'topic'): policy_b})})
+
+bindings.handle_bindings_call('request', None, 'reset_callbacks', '', None)
+
+assert(bindings.callback_devices == {})
+
+scheduler_a.run_all()
+scheduler_b.run_all()
+
+assert(len(mqttc_a.published) == 0) # partial batch is dropped
+assert(mqttc_b.published == [('topic', {'value': 1})]) # coalesced message is dropped
+
+print('OK')
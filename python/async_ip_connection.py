@@ -0,0 +1,823 @@
+# -*- coding: utf-8 -*-
+#
+# Redistribution and use in source and binary forms of this file,
+# with or without modification, are permitted. See the Creative
+# Commons Zero (CC0 1.0) License for more details.
+
+# asyncio variant of the IP Connection, requires Python 3.5 or newer
+
+import asyncio
+import collections
+import functools
+import struct
+import socket
+import time
+import os
+import math
+import hmac
+import hashlib
+
+try:
+    from .ip_connection import Device, BrickDaemon, IPConnection, Error, get_uid_from_data, get_function_id_from_data, \
+                               get_sequence_number_from_data, get_payload_codec, unpack_response, \
+                               dispatch_callback, create_stream_buffer, store_stream_chunk, get_device_display_name
+except ImportError:
+    from ip_connection import Device, BrickDaemon, IPConnection, Error, get_uid_from_data, get_function_id_from_data, \
+                              get_sequence_number_from_data, get_payload_codec, unpack_response, \
+                              dispatch_callback, create_stream_buffer, store_stream_chunk, get_device_display_name
+
+class AsyncCallbackIterator(object):
+    """
+    Async iterator over the callbacks with one callback ID, as returned by
+    AsyncDevice.callbacks and AsyncIPConnection.callbacks. Each item is a
+    tuple of the callback parameters.
+    """
+
+    # internal
+    def __init__(self, registry, callback_id, max_queue_size):
+        self.registry = registry
+        self.callback_id = callback_id
+        self.max_queue_size = max_queue_size
+        self.items = collections.deque()
+        self.waiter = None
+        self.closed = False
+        self.drop_count = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while len(self.items) == 0:
+            if self.closed:
+                raise StopAsyncIteration
+
+            self.waiter = asyncio.get_event_loop().create_future()
+
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+
+        return self.items.popleft()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Stops the delivery of callbacks to this iterator. Callbacks that were
+        already queued are still returned, then the iteration ends.
+        """
+
+        if self.closed:
+            return
+
+        self.closed = True
+        self.registry.remove(self)
+
+        if self.waiter != None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    # internal
+    def put(self, values):
+        if self.max_queue_size != None and len(self.items) >= self.max_queue_size:
+            self.items.popleft()
+            self.drop_count += 1
+
+        self.items.append(values)
+
+        if self.waiter != None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+# internal
+class AsyncCallbackRegistry(object):
+    def __init__(self, registered_callbacks):
+        self.registered_callbacks = registered_callbacks
+        self.iterators = {}
+
+    def add(self, callback_id, max_queue_size):
+        if max_queue_size != None and max_queue_size < 1:
+            raise ValueError('Maximum queue size has to be greater than 0')
+
+        iterator = AsyncCallbackIterator(self, callback_id, max_queue_size)
+
+        self.iterators.setdefault(callback_id, []).append(iterator)
+        self.registered_callbacks[callback_id] = functools.partial(self.deliver, callback_id)
+
+        return iterator
+
+    def remove(self, iterator):
+        iterators = self.iterators.get(iterator.callback_id, [])
+
+        if iterator in iterators:
+            iterators.remove(iterator)
+
+        if len(iterators) == 0:
+            self.iterators.pop(iterator.callback_id, None)
+
+            if isinstance(self.registered_callbacks.get(iterator.callback_id), functools.partial):
+                self.registered_callbacks.pop(iterator.callback_id, None)
+
+    def deliver(self, callback_id, *values):
+        for iterator in self.iterators.get(callback_id, []):
+            iterator.put(values)
+
+class AsyncDevice(Device):
+    """
+    Base class of the asyncio device classes. They are created with an
+    AsyncIPConnection and all their device functions are coroutines.
+
+    Create the devices from within the event loop that runs the
+    AsyncIPConnection, the locks of the device are bound to it.
+    """
+
+    __slots__ = ['request_lock', 'callback_registry']
+
+    # internal
+    def __init__(self, uid, ipcon, device_identifier, device_display_name):
+        Device.__init__(self, uid, ipcon, device_identifier, device_display_name)
+
+        self.init_async()
+
+    # internal
+    def init_async(self):
+        self.device_identifier_lock = asyncio.Lock()
+        self.stream_lock = asyncio.Lock()
+        self.request_lock = asyncio.Lock() # only one request per device is in-flight
+        self.callback_registry = AsyncCallbackRegistry(self.registered_callbacks)
+
+    def callbacks(self, callback_id, max_queue_size=None):
+        """
+        Returns an async iterator over the callbacks with the given
+        *callback_id*. Each item is a tuple of the callback parameters::
+
+            async for temperature, in device.callbacks(device.CALLBACK_TEMPERATURE):
+                print(temperature)
+
+        If the iterator has *max_queue_size* callbacks waiting to be consumed
+        then the oldest waiting callback is dropped for a new one. Use close
+        or an async with statement to end the iteration.
+        """
+
+        return self.callback_registry.add(callback_id, max_queue_size)
+
+    async def call_many(self, calls):
+        """
+        Calls several device functions at once and returns their results as
+        a list in the same order as the given *calls*. Each item of *calls*
+        is either a device function or a tuple of a device function and its
+        arguments.
+        """
+
+        coroutines = []
+
+        for call in calls:
+            if isinstance(call, tuple):
+                coroutines.append(call[0](*call[1:]))
+            else:
+                coroutines.append(call())
+
+        return list(await asyncio.gather(*coroutines))
+
+    # internal
+    async def check_validity(self):
+        if self.replaced:
+            raise Error(Error.DEVICE_REPLACED, 'Device has been replaced')
+
+        if self.device_identifier < 0:
+            return
+
+        if self.device_identifier_check == Device.DEVICE_IDENTIFIER_CHECK_MATCH:
+            return
+
+        async with self.device_identifier_lock:
+            if self.device_identifier_check == Device.DEVICE_IDENTIFIER_CHECK_PENDING:
+                device_identifier = (await self.ipcon.send_request(self, 255, (), '', 33, '8s 8s c 3B 3B H'))[5] # <device>.get_identity
+
+                if device_identifier == self.device_identifier:
+                    self.device_identifier_check = Device.DEVICE_IDENTIFIER_CHECK_MATCH
+                else:
+                    self.device_identifier_check = Device.DEVICE_IDENTIFIER_CHECK_MISMATCH
+                    self.wrong_device_display_name = get_device_display_name(device_identifier)
+
+            if self.device_identifier_check == Device.DEVICE_IDENTIFIER_CHECK_MISMATCH:
+                raise Error(Error.WRONG_DEVICE_TYPE,
+                            'UID {0} belongs to a {1} instead of the expected {2}'
+                            .format(self.uid_string, self.wrong_device_display_name, self.device_display_name))
+
+    # internal
+    async def read_stream_out(self, function, args, stream_name_under, stream_name_space,
+                              fixed_length, chunk_cardinality, no_data_chunk_offset, typecode):
+        # see Device.read_stream_out, only one request per device can be
+        # in-flight here, so the chunks are always requested one by one
+        length_name = stream_name_under + '_length'
+        chunk_offset_name = stream_name_under + '_chunk_offset'
+        chunk_data_name = stream_name_under + '_chunk_data'
+
+        async with self.stream_lock:
+            ret = await function(*args)
+            chunk_offset = getattr(ret, chunk_offset_name)
+
+            if fixed_length != None:
+                length = fixed_length
+
+                if chunk_offset == no_data_chunk_offset: # maximum chunk offset -> stream has no data
+                    length = 0
+                    chunk_offset = 0
+            else:
+                length = getattr(ret, length_name)
+
+            chunk_count = max((length + chunk_cardinality - 1) // chunk_cardinality, 1)
+            data = create_stream_buffer(chunk_count * chunk_cardinality, typecode)
+            out_of_sync = chunk_offset != 0
+
+            if not out_of_sync and length > 0:
+                store_stream_chunk(data, 0, getattr(ret, chunk_data_name))
+
+            chunk_offset = chunk_cardinality
+
+            while not out_of_sync and chunk_offset < length:
+                ret = await function(*args)
+
+                if fixed_length == None:
+                    length = getattr(ret, length_name)
+
+                out_of_sync = getattr(ret, chunk_offset_name) != chunk_offset
+
+                if not out_of_sync:
+                    store_stream_chunk(data, chunk_offset, getattr(ret, chunk_data_name))
+                    chunk_offset += chunk_cardinality
+
+            if out_of_sync: # discard remaining stream to bring it back in-sync
+                while getattr(ret, chunk_offset_name) + chunk_cardinality < length:
+                    ret = await function(*args)
+
+                    if fixed_length == None:
+                        length = getattr(ret, length_name)
+
+                raise Error(Error.STREAM_OUT_OF_SYNC, '{0} stream is out-of-sync'.format(stream_name_space))
+
+        del data[length:]
+
+        return ret, self.get_stream_result(data)
+
+class AsyncBrickDaemon(AsyncDevice):
+    __slots__ = []
+
+    FUNCTION_GET_AUTHENTICATION_NONCE = 1
+    FUNCTION_AUTHENTICATE = 2
+
+    default_response_expected = BrickDaemon.default_response_expected
+
+    def __init__(self, uid, ipcon):
+        AsyncDevice.__init__(self, uid, ipcon, 0, 'Brick Daemon')
+
+        self.api_version = (2, 0, 0)
+
+        ipcon.add_device(self)
+
+    async def get_authentication_nonce(self):
+        return await self.ipcon.send_request(self, AsyncBrickDaemon.FUNCTION_GET_AUTHENTICATION_NONCE, (), '', 12, '4B')
+
+    async def authenticate(self, client_nonce, digest):
+        await self.ipcon.send_request(self, AsyncBrickDaemon.FUNCTION_AUTHENTICATE, (client_nonce, digest), '4B 20B', 0, '')
+
+class AsyncIPConnection(object):
+    """
+    asyncio variant of the IP Connection. It uses no threads, one event loop
+    can drive many AsyncIPConnection objects and their devices. Requests to
+    different devices are in-flight at the same time, requests to the same
+    device are sent one after another.
+
+    Create it from within the event loop that runs it, its locks are bound
+    to this loop.
+    """
+
+    FUNCTION_ENUMERATE = IPConnection.FUNCTION_ENUMERATE
+    FUNCTION_DISCONNECT_PROBE = IPConnection.FUNCTION_DISCONNECT_PROBE
+
+    CALLBACK_ENUMERATE = IPConnection.CALLBACK_ENUMERATE
+    CALLBACK_CONNECTED = IPConnection.CALLBACK_CONNECTED
+    CALLBACK_DISCONNECTED = IPConnection.CALLBACK_DISCONNECTED
+
+    BROADCAST_UID = IPConnection.BROADCAST_UID
+
+    # enumeration_type parameter to the enumerate callback
+    ENUMERATION_TYPE_AVAILABLE = IPConnection.ENUMERATION_TYPE_AVAILABLE
+    ENUMERATION_TYPE_CONNECTED = IPConnection.ENUMERATION_TYPE_CONNECTED
+    ENUMERATION_TYPE_DISCONNECTED = IPConnection.ENUMERATION_TYPE_DISCONNECTED
+
+    # connect_reason parameter to the connected callback
+    CONNECT_REASON_REQUEST = IPConnection.CONNECT_REASON_REQUEST
+    CONNECT_REASON_AUTO_RECONNECT = IPConnection.CONNECT_REASON_AUTO_RECONNECT
+
+    # disconnect_reason parameter to the disconnected callback
+    DISCONNECT_REASON_REQUEST = IPConnection.DISCONNECT_REASON_REQUEST
+    DISCONNECT_REASON_ERROR = IPConnection.DISCONNECT_REASON_ERROR
+    DISCONNECT_REASON_SHUTDOWN = IPConnection.DISCONNECT_REASON_SHUTDOWN
+
+    # returned by get_connection_state
+    CONNECTION_STATE_DISCONNECTED = IPConnection.CONNECTION_STATE_DISCONNECTED
+    CONNECTION_STATE_CONNECTED = IPConnection.CONNECTION_STATE_CONNECTED
+    CONNECTION_STATE_PENDING = IPConnection.CONNECTION_STATE_PENDING # auto-reconnect in process
+
+    QUEUE_EXIT = IPConnection.QUEUE_EXIT
+    QUEUE_META = IPConnection.QUEUE_META
+    QUEUE_PACKET = IPConnection.QUEUE_PACKET
+
+    DISCONNECT_PROBE_INTERVAL = IPConnection.DISCONNECT_PROBE_INTERVAL
+    AUTO_RECONNECT_INTERVAL = 0.1
+
+    def __init__(self):
+        """
+        Creates an asyncio IP Connection object that can be used to enumerate
+        the available devices. It is also required for the constructor of the
+        asyncio Bricks and Bricklets.
+        """
+
+        self.host = None
+        self.port = None
+        self.timeout = 2.5
+        self.auto_reconnect = True
+        self.auto_reconnect_allowed = False
+        self.next_sequence_number = 0
+        self.next_authentication_nonce = 0
+        self.authentication_lock = asyncio.Lock() # protects authentication handshake
+        self.devices = {}
+        self.pending_requests = {} # (UID, function ID, sequence number) -> future
+        self.registered_callbacks = {}
+        self.callback_registry = AsyncCallbackRegistry(self.registered_callbacks)
+        self.reader = None
+        self.writer = None
+        self.connection_state = AsyncIPConnection.CONNECTION_STATE_DISCONNECTED
+        self.receive_task = None
+        self.callback_queue = None
+        self.callback_task = None
+        self.disconnect_probe_flag = False
+        self.disconnect_probe_task = None
+        self.brickd = AsyncBrickDaemon('2', self)
+
+    async def connect(self, host, port):
+        """
+        Creates a TCP/IP connection to the given *host* and *port*. The host
+        and port can point to a Brick Daemon or to a WIFI/Ethernet Extension.
+
+        Devices can only be controlled when the connection was established
+        successfully.
+        """
+
+        if self.writer != None or self.connection_state == AsyncIPConnection.CONNECTION_STATE_PENDING:
+            raise Error(Error.ALREADY_CONNECTED,
+                        'Already connected to {0}:{1}'.format(self.host, self.port))
+
+        self.host = host
+        self.port = port
+
+        await self.connect_unlocked(AsyncIPConnection.CONNECT_REASON_REQUEST)
+
+    async def disconnect(self):
+        """
+        Disconnects the TCP/IP connection from the Brick Daemon or the
+        WIFI/Ethernet Extension.
+        """
+
+        self.auto_reconnect_allowed = False
+
+        if self.connection_state == AsyncIPConnection.CONNECTION_STATE_PENDING:
+            self.connection_state = AsyncIPConnection.CONNECTION_STATE_DISCONNECTED # stops auto-reconnect
+            return
+
+        if self.writer == None:
+            raise Error(Error.NOT_CONNECTED, 'Not connected')
+
+        receive_task = self.receive_task
+        self.receive_task = None
+
+        receive_task.cancel()
+
+        try:
+            await receive_task
+        except asyncio.CancelledError:
+            pass
+
+        self.close_connection()
+        self.callback_queue.put_nowait((AsyncIPConnection.QUEUE_META,
+                                        (AsyncIPConnection.CALLBACK_DISCONNECTED,
+                                         AsyncIPConnection.DISCONNECT_REASON_REQUEST)))
+
+        # end callback task after the disconnected callback
+        self.callback_queue.put_nowait((AsyncIPConnection.QUEUE_EXIT, None))
+        self.callback_queue = None
+        self.callback_task = None
+
+    async def authenticate(self, secret):
+        """
+        Performs an authentication handshake with the connected Brick Daemon or
+        WIFI/Ethernet Extension. See IPConnection.authenticate for details.
+        """
+
+        try:
+            secret_bytes = secret.encode('ascii')
+        except UnicodeEncodeError:
+            raise Error(Error.NON_ASCII_CHAR_IN_SECRET, 'Authentication secret contains non-ASCII characters')
+
+        async with self.authentication_lock:
+            if self.next_authentication_nonce == 0:
+                try:
+                    self.next_authentication_nonce = struct.unpack('<I', os.urandom(4))[0]
+                except NotImplementedError:
+                    subseconds, seconds = math.modf(time.time())
+                    seconds = int(seconds)
+                    subseconds = int(subseconds * 1000000)
+                    self.next_authentication_nonce = ((seconds << 26 | seconds >> 6) & 0xFFFFFFFF) + subseconds + os.getpid()
+
+            server_nonce = await self.brickd.get_authentication_nonce()
+            client_nonce = struct.unpack('<4B', struct.pack('<I', self.next_authentication_nonce))
+            self.next_authentication_nonce = (self.next_authentication_nonce + 1) % (1 << 32)
+
+            h = hmac.new(secret_bytes, digestmod=hashlib.sha1)
+
+            h.update(struct.pack('<4B', *server_nonce))
+            h.update(struct.pack('<4B', *client_nonce))
+
+            digest = struct.unpack('<20B', h.digest())
+            h = None
+
+            await self.brickd.authenticate(client_nonce, digest)
+
+    def get_connection_state(self):
+        """
+        Can return the following states:
+
+        - CONNECTION_STATE_DISCONNECTED: No connection is established.
+        - CONNECTION_STATE_CONNECTED: A connection to the Brick Daemon or
+          the WIFI/Ethernet Extension is established.
+        - CONNECTION_STATE_PENDING: IP Connection is currently trying to
+          connect.
+        """
+
+        return self.connection_state
+
+    def set_auto_reconnect(self, auto_reconnect):
+        """
+        Enables or disables auto-reconnect. If auto-reconnect is enabled,
+        the IP Connection will try to reconnect to the previously given
+        host and port, if the connection is lost.
+
+        Default value is *True*.
+        """
+
+        self.auto_reconnect = bool(auto_reconnect)
+
+        if not self.auto_reconnect:
+            self.auto_reconnect_allowed = False
+
+    def get_auto_reconnect(self):
+        """
+        Returns *true* if auto-reconnect is enabled, *false* otherwise.
+        """
+
+        return self.auto_reconnect
+
+    def set_timeout(self, timeout):
+        """
+        Sets the timeout in seconds for getters and for setters for which the
+        response expected flag is activated.
+
+        Default timeout is 2.5.
+        """
+
+        timeout = float(timeout)
+
+        if timeout < 0:
+            raise ValueError('Timeout cannot be negative')
+
+        self.timeout = timeout
+
+    def get_timeout(self):
+        """
+        Returns the timeout as set by set_timeout.
+        """
+
+        return self.timeout
+
+    async def enumerate(self):
+        """
+        Broadcasts an enumerate request. All devices will respond with an
+        enumerate callback.
+        """
+
+        request, _, _ = self.create_packet_header(None, 8, AsyncIPConnection.FUNCTION_ENUMERATE)
+
+        await self.send(request)
+
+    def callbacks(self, callback_id, max_queue_size=None):
+        """
+        Returns an async iterator over the enumerate, connected or
+        disconnected callbacks, as selected by *callback_id*. Each item is a
+        tuple of the callback parameters::
+
+            async for uid, connected_uid, position, hardware_version, firmware_version, \\
+                      device_identifier, enumeration_type in ipcon.callbacks(ipcon.CALLBACK_ENUMERATE):
+                print(uid)
+
+        See AsyncDevice.callbacks for the meaning of *max_queue_size*.
+        """
+
+        return self.callback_registry.add(callback_id, max_queue_size)
+
+    def register_callback(self, callback_id, function):
+        """
+        Registers the given *function* with the given *callback_id*. It is
+        called from the event loop and should not block.
+        """
+
+        if function is None:
+            self.registered_callbacks.pop(callback_id, None)
+        else:
+            self.registered_callbacks[callback_id] = function
+
+    # internal
+    def add_device(self, device):
+        replaced_device = self.devices.get(device.uid)
+
+        if replaced_device != None:
+            replaced_device.replaced = True
+
+        self.devices[device.uid] = device
+
+    # internal
+    async def connect_unlocked(self, connect_reason):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        sock = writer.get_extra_info('socket')
+
+        if sock != None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.reader = reader
+        self.writer = writer
+        self.connection_state = AsyncIPConnection.CONNECTION_STATE_CONNECTED
+        self.auto_reconnect_allowed = False
+        self.disconnect_probe_flag = True
+
+        if self.callback_task == None:
+            self.callback_queue = asyncio.Queue()
+            self.callback_task = asyncio.ensure_future(self.callback_loop(self.callback_queue))
+
+        self.receive_task = asyncio.ensure_future(self.receive_loop(reader))
+        self.disconnect_probe_task = asyncio.ensure_future(self.disconnect_probe_loop())
+
+        self.callback_queue.put_nowait((AsyncIPConnection.QUEUE_META,
+                                        (AsyncIPConnection.CALLBACK_CONNECTED, connect_reason)))
+
+    # internal
+    def close_connection(self):
+        if self.disconnect_probe_task != None:
+            self.disconnect_probe_task.cancel()
+            self.disconnect_probe_task = None
+
+        if self.writer != None:
+            self.writer.close()
+            self.writer = None
+
+        self.reader = None
+        self.connection_state = AsyncIPConnection.CONNECTION_STATE_DISCONNECTED
+
+        # don't wait for the timeout of pending requests
+        for future in self.pending_requests.values():
+            if not future.done():
+                future.set_exception(Error(Error.NOT_CONNECTED, 'Not connected'))
+
+    # internal
+    async def receive_loop(self, reader):
+        disconnect_reason = AsyncIPConnection.DISCONNECT_REASON_SHUTDOWN
+
+        try:
+            while True:
+                header = await reader.readexactly(8)
+                length = header[4]
+
+                if length < 8:
+                    disconnect_reason = AsyncIPConnection.DISCONNECT_REASON_ERROR
+                    break # stream cannot be parsed anymore
+
+                if length > 8:
+                    packet = header + await reader.readexactly(length - 8)
+                else:
+                    packet = header
+
+                self.handle_response(packet)
+        except asyncio.IncompleteReadError:
+            pass # peer closed the connection
+        except OSError:
+            disconnect_reason = AsyncIPConnection.DISCONNECT_REASON_ERROR
+
+        self.receive_task = None
+        self.handle_disconnect_by_peer(disconnect_reason)
+
+    # internal
+    def handle_response(self, packet):
+        self.disconnect_probe_flag = False
+
+        function_id = get_function_id_from_data(packet)
+        sequence_number = get_sequence_number_from_data(packet)
+
+        if sequence_number == 0 and function_id == AsyncIPConnection.CALLBACK_ENUMERATE:
+            if AsyncIPConnection.CALLBACK_ENUMERATE in self.registered_callbacks:
+                self.callback_queue.put_nowait((AsyncIPConnection.QUEUE_PACKET, packet))
+
+            return
+
+        uid = get_uid_from_data(packet)
+        device = self.devices.get(uid)
+
+        if device == None:
+            return # Response from an unknown device, ignoring it
+
+        if sequence_number == 0:
+            if function_id in device.registered_callbacks or \
+               -function_id in device.high_level_callbacks:
+                self.callback_queue.put_nowait((AsyncIPConnection.QUEUE_PACKET, packet))
+
+            return
+
+        future = self.pending_requests.get((uid, function_id, sequence_number))
+
+        if future != None and not future.done():
+            future.set_result(packet)
+
+        # Response seems to be OK, but can't be handled
+
+    # internal
+    def handle_disconnect_by_peer(self, disconnect_reason):
+        self.close_connection()
+
+        self.auto_reconnect_allowed = True
+
+        self.callback_queue.put_nowait((AsyncIPConnection.QUEUE_META,
+                                        (AsyncIPConnection.CALLBACK_DISCONNECTED, disconnect_reason)))
+
+    # internal
+    async def callback_loop(self, callback_queue):
+        while True:
+            kind, data = await callback_queue.get()
+
+            if kind == AsyncIPConnection.QUEUE_EXIT:
+                break
+            elif kind == AsyncIPConnection.QUEUE_META:
+                await self.dispatch_meta(*data)
+            elif kind == AsyncIPConnection.QUEUE_PACKET:
+                # don't dispatch callbacks when there is no connection
+                if self.writer != None:
+                    await self.dispatch_packet(data)
+
+    # internal
+    async def dispatch_meta(self, function_id, parameter):
+        cb = self.registered_callbacks.get(function_id)
+
+        if cb != None:
+            cb(parameter)
+
+        if function_id == AsyncIPConnection.CALLBACK_DISCONNECTED and \
+           parameter != AsyncIPConnection.DISCONNECT_REASON_REQUEST and \
+           self.auto_reconnect and self.auto_reconnect_allowed:
+            self.connection_state = AsyncIPConnection.CONNECTION_STATE_PENDING
+
+            # there is no callback to deliver while there is no connection
+            while self.connection_state == AsyncIPConnection.CONNECTION_STATE_PENDING and \
+                  self.auto_reconnect_allowed:
+                await asyncio.sleep(AsyncIPConnection.AUTO_RECONNECT_INTERVAL)
+
+                if self.connection_state != AsyncIPConnection.CONNECTION_STATE_PENDING:
+                    break # disconnect was called in the meantime
+
+                try:
+                    await self.connect_unlocked(AsyncIPConnection.CONNECT_REASON_AUTO_RECONNECT)
+                except OSError:
+                    pass
+
+            if self.writer == None:
+                self.connection_state = AsyncIPConnection.CONNECTION_STATE_DISCONNECTED
+
+    # internal
+    async def dispatch_packet(self, packet):
+        uid = get_uid_from_data(packet)
+        function_id = get_function_id_from_data(packet)
+
+        if function_id == AsyncIPConnection.CALLBACK_ENUMERATE:
+            cb = self.registered_callbacks.get(AsyncIPConnection.CALLBACK_ENUMERATE)
+
+            if cb == None:
+                return
+
+            if len(packet) != 34:
+                return # silently ignoring callback with wrong length
+
+            cb(*get_payload_codec('8s 8s c 3B 3B H B').unpack(packet, 8))
+
+            return
+
+        device = self.devices.get(uid)
+
+        if device == None:
+            return
+
+        try:
+            await device.check_validity()
+        except Error:
+            return # silently ignoring callback for invalid device
+
+        dispatch_callback(device, function_id, packet)
+
+    # internal
+    async def disconnect_probe_loop(self):
+        request, _, _ = self.create_packet_header(None, 8, AsyncIPConnection.FUNCTION_DISCONNECT_PROBE)
+
+        while self.writer != None:
+            await asyncio.sleep(AsyncIPConnection.DISCONNECT_PROBE_INTERVAL)
+
+            if self.disconnect_probe_flag:
+                try:
+                    await self.send(request)
+                except Error:
+                    break # connection is lost, the receive task handles this
+            else:
+                self.disconnect_probe_flag = True
+
+    # internal
+    async def send(self, packet):
+        writer = self.writer
+
+        if writer == None:
+            raise Error(Error.NOT_CONNECTED, 'Not connected')
+
+        writer.write(packet)
+
+        self.disconnect_probe_flag = False
+
+        # only waits if the write buffer of the transport is above its
+        # high-water mark. the receive task handles the lost connection
+        try:
+            await writer.drain()
+        except OSError:
+            raise Error(Error.NOT_CONNECTED, 'Not connected', suppress_context=True)
+
+    # internal
+    async def send_request(self, device, function_id, data, form, length_ret, form_ret):
+        payload = get_payload_codec(form).pack(data)
+
+        if not device.get_response_expected(function_id):
+            header, _, _ = self.create_packet_header(device, 8 + len(payload), function_id)
+
+            await self.send(header + payload)
+
+            return
+
+        async with device.request_lock:
+            header, _, sequence_number = self.create_packet_header(device, 8 + len(payload), function_id)
+            key = (device.uid, function_id, sequence_number)
+            future = asyncio.get_event_loop().create_future()
+
+            self.pending_requests[key] = future
+
+            try:
+                await self.send(header + payload)
+
+                try:
+                    response = await asyncio.wait_for(future, self.timeout)
+                except asyncio.TimeoutError:
+                    msg = 'Did not receive response for function {0} in time'.format(function_id)
+                    raise Error(Error.TIMEOUT, msg, suppress_context=True)
+            finally:
+                del self.pending_requests[key]
+
+        return unpack_response(response, function_id, length_ret, form_ret)
+
+    # internal
+    def get_next_sequence_number(self):
+        sequence_number = self.next_sequence_number + 1
+        self.next_sequence_number = sequence_number % 15
+
+        return sequence_number
+
+    # internal
+    def create_packet_header(self, device, length, function_id):
+        uid = AsyncIPConnection.BROADCAST_UID
+        sequence_number = self.get_next_sequence_number()
+        r_bit = 0
+
+        if device is not None:
+            uid = device.uid
+
+            if device.get_response_expected(function_id):
+                r_bit = 1
+
+        sequence_number_and_options = (sequence_number << 4) | (r_bit << 3)
+
+        return (struct.pack('<IBBBB', uid, length, function_id,
+                            sequence_number_and_options, 0),
+                bool(r_bit),
+                sequence_number)
@@ -0,0 +1,454 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import time
+import types
+import struct
+import socket
+import argparse
+import selectors
+import threading
+import tracemalloc
+
+def load_ip_connection():
+    # the IP Connection imports device_display_names relative to its package,
+    # embed it the same way as the MQTT and Shell bindings do instead. the
+    # module is registered, so that ip_connection_pool can import it
+    module = types.ModuleType('ip_connection')
+    namespace = module.__dict__
+
+    namespace['INTERNAL_DEVICE_DISPLAY_NAMES'] = True
+    namespace['get_device_display_name'] = lambda device_identifier: 'Unknown Device [{0}]'.format(device_identifier)
+
+    with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'ip_connection.py'), 'r') as f:
+        exec(compile(f.read(), 'ip_connection.py', 'exec'), namespace)
+
+    sys.modules['ip_connection'] = module
+
+    return namespace
+
+class ReplaySocket(object):
+    def __init__(self, stream, receive_size):
+        self.stream = stream
+        self.receive_size = receive_size
+        self.offset = 0
+
+    def recv(self, size):
+        size = min(size, self.receive_size)
+        data = self.stream[self.offset:self.offset + size]
+        self.offset += len(data)
+
+        return data
+
+    def recv_into(self, buffer, size):
+        size = min(size, self.receive_size, len(buffer))
+        data = self.stream[self.offset:self.offset + size]
+        buffer[:len(data)] = data
+        self.offset += len(data)
+
+        return len(data)
+
+def make_stream(count):
+    # mix of IMU Bricklet 3.0 all-data callbacks and Thermal Imaging Bricklet
+    # low-level high contrast image callbacks, as sent by brickd
+    imu = struct.pack('<IBBBB', 12345, 54, 33, 0, 0) + bytes(bytearray(range(46)))
+    thermal = struct.pack('<IBBBB', 23456, 72, 12, 0, 0) + bytes(bytearray(range(64)))
+    stream = bytearray()
+
+    for i in range(count):
+        if i % 4 == 3:
+            stream += thermal
+        else:
+            stream += imu
+
+    return bytes(stream)
+
+def parse_legacy(sock, handle_response):
+    # receive loop of the IP Connection before the zero-copy receive buffer
+    pending_data = bytes()
+
+    while True:
+        data = sock.recv(8192)
+
+        if len(data) == 0:
+            break
+
+        pending_data += data
+
+        while True:
+            if len(pending_data) < 8:
+                break
+
+            length = struct.unpack('<B', pending_data[4:5])[0]
+
+            if len(pending_data) < length:
+                break
+
+            packet = pending_data[0:length]
+            pending_data = pending_data[length:]
+
+            handle_response(packet)
+
+def parse_receive_buffer(ip_connection, sock, handle_response):
+    receive_buffer = ip_connection['IPConnection'].ReceiveBuffer()
+
+    while True:
+        if receive_buffer.receive(sock) == 0:
+            break
+
+        while True:
+            packet = receive_buffer.get_packet()
+
+            if packet == None:
+                break
+
+            handle_response(packet)
+
+def benchmark_receive(args):
+    ip_connection = load_ip_connection()
+
+    if args.stream != None:
+        with open(args.stream, 'rb') as f:
+            stream = f.read()
+    else:
+        stream = make_stream(args.packets)
+
+    parsers = [
+        ('before', lambda sock, handle_response: parse_legacy(sock, handle_response)),
+        ('after', lambda sock, handle_response: parse_receive_buffer(ip_connection, sock, handle_response))
+    ]
+
+    print('replaying {0} bytes in receives of up to {1} bytes'.format(len(stream), args.receive_size))
+
+    for name, parser in parsers:
+        best = None
+        packets = []
+
+        for _ in range(args.repeat):
+            packets = []
+            start = time.time()
+
+            parser(ReplaySocket(stream, args.receive_size), packets.append)
+
+            elapsed = time.time() - start
+
+            if best == None or elapsed < best:
+                best = elapsed
+
+        print('{0:>6}: {1} packets, {2:.0f} packets/s'.format(name, len(packets), len(packets) / best))
+
+def make_device_classes(ip_connection, function_count, callback_count):
+    # a device class as generated by the Python bindings generator, with its
+    # tables shared by all instances, and one that fills per-instance tables
+    # in its __init__ as the generated code did before
+    Device = ip_connection['Device']
+    response_expected = {}
+    callback_formats = {}
+
+    for function_id in range(1, function_count + 1):
+        if function_id % 2 == 0:
+            response_expected[function_id] = Device.RESPONSE_EXPECTED_ALWAYS_TRUE
+        else:
+            response_expected[function_id] = Device.RESPONSE_EXPECTED_FALSE
+
+    for function_id in range(function_count + 1, function_count + callback_count + 1):
+        callback_formats[function_id] = (16, ip_connection['get_payload_codec']('I i'))
+
+    class SharedDevice(Device):
+        default_response_expected = ip_connection['create_response_expected'](Device.default_response_expected, response_expected)
+        default_callback_formats = callback_formats
+
+        def __init__(self, uid, ipcon):
+            Device.__init__(self, uid, ipcon, 1, 'Shared Device')
+
+            self.api_version = (2, 0, 0)
+
+    class LegacyDevice(object):
+        # the Device attributes before __slots__ and the shared tables
+        def __init__(self, uid, ipcon):
+            self.replaced = False
+            self.uid = ip_connection['base58decode'](uid)
+            self.uid_string = uid
+            self.ipcon = ipcon
+            self.device_identifier = 1
+            self.device_display_name = 'Legacy Device'
+            self.device_identifier_lock = ip_connection['threading'].Lock()
+            self.device_identifier_check = Device.DEVICE_IDENTIFIER_CHECK_PENDING
+            self.wrong_device_display_name = '?'
+            self.api_version = (0, 0, 0)
+            self.registered_callbacks = {}
+            self.callback_formats = {}
+            self.high_level_callbacks = {}
+            self.pending_request_count = 0
+            self.stream_lock = ip_connection['threading'].Lock()
+            self.stream_result_type = Device.STREAM_RESULT_TYPE_TUPLE
+            self.response_expected = [Device.RESPONSE_EXPECTED_INVALID_FUNCTION_ID] * 256
+
+            self.api_version = (2, 0, 0)
+
+            for function_id, flag in response_expected.items():
+                self.response_expected[function_id] = flag
+
+            for function_id, callback_format in callback_formats.items():
+                self.callback_formats[function_id] = callback_format
+
+    return SharedDevice, LegacyDevice
+
+def benchmark_memory(args):
+    ip_connection = load_ip_connection()
+    ipcon = ip_connection['IPConnection']()
+    uids = [ip_connection['base58encode'](i + 1) for i in range(args.devices)]
+    shared_class, legacy_class = make_device_classes(ip_connection, args.functions, args.callbacks)
+
+    print('creating {0} devices with {1} functions and {2} callbacks each'.format(args.devices, args.functions, args.callbacks))
+
+    for name, device_class in [('before', legacy_class), ('after', shared_class)]:
+        tracemalloc.start()
+
+        devices = [device_class(uid, ipcon) for uid in uids]
+        size = tracemalloc.get_traced_memory()[0]
+
+        tracemalloc.stop()
+
+        print('{0:>6}: {1:.0f} KiB per 1000 devices, {2:.0f} bytes per device'.format(name, size * 1000.0 / len(devices) / 1024, size / float(len(devices))))
+
+        del devices
+
+class FakeBrickDaemon(object):
+    # accepts any number of connections and answers every enumerate request
+    # with one enumerate callback, all in one thread
+    def __init__(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1024)
+        self.server.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ)
+        self.enumerate_callback = struct.pack('<IBBBB8s8sc3B3BHB', 12345, 34, 253, 0, 0, b'XYZ', b'0', b'a',
+                                              1, 0, 0, 2, 0, 0, 13, 0)
+        self.running = True
+        self.thread = threading.Thread(target=self.loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def get_port(self):
+        return self.server.getsockname()[1]
+
+    def loop(self):
+        while self.running:
+            for key, _ in self.selector.select(0.1):
+                if key.fileobj is self.server:
+                    try:
+                        conn, _ = self.server.accept()
+                    except BlockingIOError:
+                        continue
+
+                    conn.setblocking(True)
+                    self.selector.register(conn, selectors.EVENT_READ, bytearray())
+                    continue
+
+                conn = key.fileobj
+                pending = key.data
+
+                try:
+                    data = conn.recv(4096)
+                except OSError:
+                    data = b''
+
+                if len(data) == 0:
+                    self.selector.unregister(conn)
+                    conn.close()
+                    continue
+
+                pending += data
+
+                while len(pending) >= 8 and len(pending) >= pending[4]:
+                    if pending[5] == 254: # enumerate
+                        conn.sendall(self.enumerate_callback)
+
+                    del pending[:pending[4]]
+
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+
+        self.selector.close()
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+def benchmark_pool(args):
+    ip_connection = load_ip_connection()
+    IPConnection = ip_connection['IPConnection']
+
+    from ip_connection_pool import IPConnectionPool
+
+    brickd = FakeBrickDaemon()
+
+    print('connecting to {0} hosts and waiting for one enumerate callback from each'.format(args.hosts))
+
+    try:
+        for name in ['before', 'after']:
+            thread_count = threading.active_count()
+            enumerated = []
+            done = threading.Event()
+            pool = None
+
+            def cb_enumerate(uid, *_):
+                enumerated.append(uid)
+
+                if len(enumerated) == args.hosts:
+                    done.set()
+
+            start = time.time()
+
+            if name == 'after':
+                pool = IPConnectionPool()
+                ipcons = [pool.connect('127.0.0.1', brickd.get_port()) for _ in range(args.hosts)]
+            else:
+                ipcons = [IPConnection() for _ in range(args.hosts)]
+
+                for ipcon in ipcons:
+                    ipcon.connect('127.0.0.1', brickd.get_port())
+
+            for ipcon in ipcons:
+                ipcon.register_callback(IPConnection.CALLBACK_ENUMERATE, cb_enumerate)
+                ipcon.enumerate()
+
+            done.wait(30)
+
+            elapsed = time.time() - start
+            threads = threading.active_count() - thread_count
+
+            if pool != None:
+                pool.close()
+            else:
+                for ipcon in ipcons:
+                    ipcon.disconnect()
+
+            print('{0:>6}: {1} threads, {2} callbacks in {3:.2f} s'.format(name, threads, len(enumerated), elapsed))
+    finally:
+        brickd.stop()
+
+class CountingSocket(object):
+    # counts the send calls of the IP Connection
+    def __init__(self, sock):
+        self.sock = sock
+        self.send_count = 0
+
+    def send(self, data):
+        self.send_count += 1
+
+        return self.sock.send(data)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+def get_segment_count(sock):
+    # tcpi_segs_out of struct tcp_info, Linux 4.2 or newer
+    if not hasattr(socket, 'TCP_INFO'):
+        return None
+
+    tcp_info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 256)
+
+    if len(tcp_info) < 140:
+        return None
+
+    return struct.unpack_from('<I', tcp_info, 136)[0]
+
+def benchmark_send(args):
+    ip_connection = load_ip_connection()
+    IPConnection = ip_connection['IPConnection']
+    Device = ip_connection['Device']
+
+    class LEDStrip(Device):
+        default_response_expected = ip_connection['create_response_expected'](Device.default_response_expected, {
+            1: Device.RESPONSE_EXPECTED_FALSE # set_led_values, 70 bytes
+        })
+
+    brickd = FakeBrickDaemon()
+    values = list(range(60))
+
+    print('sending {0} setters without response to a local fake Brick Daemon'.format(args.packets))
+
+    try:
+        for name in ['before', 'window', 'batch']:
+            ipcon = IPConnection()
+            ipcon.connect('127.0.0.1', brickd.get_port())
+
+            if name == 'window':
+                ipcon.set_send_coalescing(args.window, args.byte_budget)
+            elif name == 'batch':
+                ipcon.set_send_coalescing(0, args.byte_budget)
+
+            led_strip = LEDStrip('XYZ', ipcon, 2103, 'LED Strip Bricklet 2.0')
+            sock = CountingSocket(ipcon.socket)
+            ipcon.socket = sock
+            segments_before = get_segment_count(sock)
+            start = time.time()
+
+            if name == 'batch':
+                with ipcon.batch():
+                    for i in range(args.packets):
+                        ipcon.send_request(led_strip, 1, (i, values), 'H 60B', 0, '')
+            else:
+                for i in range(args.packets):
+                    ipcon.send_request(led_strip, 1, (i, values), 'H 60B', 0, '')
+
+                ipcon.flush()
+
+            elapsed = time.time() - start
+            segments_after = get_segment_count(sock)
+
+            if segments_before != None and segments_after != None:
+                segments = str(segments_after - segments_before)
+            else:
+                segments = 'n/a'
+
+            ipcon.disconnect()
+
+            print('{0:>6}: {1} send calls, {2} TCP segments, {3:.0f} packets/s'.format(name, sock.send_count, segments, args.packets / elapsed))
+    finally:
+        brickd.stop()
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='benchmark')
+
+    receive = subparsers.add_parser('receive', help='replay a brickd byte stream through the receive parser')
+    receive.add_argument('--stream', help='file with a recorded brickd byte stream, default is a synthetic callback stream')
+    receive.add_argument('--packets', type=int, default=100000, help='number of packets in the synthetic callback stream')
+    receive.add_argument('--receive-size', type=int, default=8192, help='maximum number of bytes per receive')
+    receive.add_argument('--repeat', type=int, default=5, help='number of runs, the best one is reported')
+    receive.set_defaults(function=benchmark_receive)
+
+    memory = subparsers.add_parser('memory', help='measure the memory used by device objects')
+    memory.add_argument('--devices', type=int, default=1000, help='number of device objects')
+    memory.add_argument('--functions', type=int, default=40, help='number of functions per device')
+    memory.add_argument('--callbacks', type=int, default=8, help='number of callbacks per device')
+    memory.set_defaults(function=benchmark_memory)
+
+    pool = subparsers.add_parser('pool', help='measure the threads used by many connections with and without IPConnectionPool')
+    pool.add_argument('--hosts', type=int, default=100, help='number of connections to a local fake Brick Daemon')
+    pool.set_defaults(function=benchmark_pool)
+
+    send = subparsers.add_parser('send', help='count the send calls and TCP segments for a burst of setters with and without write coalescing')
+    send.add_argument('--packets', type=int, default=10000, help='number of setters without response')
+    send.add_argument('--window', type=float, default=0.005, help='write coalescing window in seconds')
+    send.add_argument('--byte-budget', type=int, default=1400, help='write coalescing byte budget')
+    send.set_defaults(function=benchmark_send)
+
+    args = parser.parse_args()
+
+    if args.benchmark == None:
+        parser.print_help()
+        return 1
+
+    args.function(args)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -31,6 +31,10 @@ if sys.hexversion < 0x3040000:
     sys.exit(1)
 
 import os
+import re
+import io
+import tokenize
+import textwrap
 import importlib.util
 import importlib.machinery
 
@@ -53,6 +57,72 @@ if 'generators' not in sys.modules:
 from generators import common
 from generators.python import python_common
 
+def get_python_payload_codec_name(form):
+    if len(form) == 0:
+        return '_CODEC_EMPTY'
+
+    return '_CODEC_' + form.replace(' ', '_').replace('!', 'BOOL')
+
+def make_python_async(methods):
+    # turn generated device methods into coroutines, the method bodies only
+    # differ in awaiting the request, validity check and low-level calls
+    methods = re.sub(r'^    def ', '    async def ', methods, flags=re.MULTILINE)
+    methods = re.sub(r'\bself\.(ipcon\.send_request|check_validity|read_stream_out|\w+_low_level)\(', r'await self.\1(', methods)
+    methods = methods.replace('with self.stream_lock:', 'async with self.stream_lock:')
+
+    return methods
+
+def strip_python_docstrings(source):
+    # remove the docstring of the module and of every class and function. a
+    # docstring is a string that forms the whole first logical line of a body
+    lines = source.split('\n')
+    removals = [] # (first line, last line, replace with pass)
+    at_line_start = True
+    at_body_start = True
+    is_header = False # current logical line starts a def or class
+    candidate = None # string at the start of a body, a docstring if it ends the logical line
+    docstring = None
+
+    for token in tokenize.generate_tokens(io.StringIO(source).readline):
+        if token.type in [tokenize.NL, tokenize.COMMENT, tokenize.INDENT]:
+            continue
+
+        if docstring != None:
+            # a body that consists of the docstring only needs a pass instead
+            removals.append((docstring.start[0], docstring.end[0], token.type in [tokenize.DEDENT, tokenize.ENDMARKER]))
+            docstring = None
+
+        if token.type == tokenize.DEDENT:
+            continue
+
+        if token.type == tokenize.NEWLINE:
+            docstring = candidate
+            candidate = None
+            at_body_start = is_header
+            is_header = False
+            at_line_start = True
+        elif at_line_start:
+            if at_body_start and token.type == tokenize.STRING:
+                candidate = token
+
+            is_header = token.type == tokenize.NAME and token.string in ['def', 'class', 'async']
+            at_body_start = False
+            at_line_start = False
+        else:
+            candidate = None
+
+    for first, last, replace_with_pass in reversed(removals):
+        if replace_with_pass:
+            indent = lines[first - 1][:len(lines[first - 1]) - len(lines[first - 1].lstrip())]
+            lines[first - 1:last] = [indent + 'pass']
+        else:
+            if last < len(lines) and len(lines[last].strip()) == 0:
+                last += 1 # the blank line after a class docstring
+
+            del lines[first - 1:last]
+
+    return '\n'.join(lines)
+
 class PythonBindingsDevice(python_common.PythonDevice):
     def get_python_import(self):
         template = """# -*- coding: utf-8 -*-
@@ -60,9 +130,9 @@ class PythonBindingsDevice(python_common.PythonDevice):
 from collections import namedtuple
 
 try:
-    from .ip_connection import Device, IPConnection, Error, create_char, create_char_list, create_string, create_chunk_data
+    from .ip_connection import Device, IPConnection, Error, create_char, create_char_list, create_string, create_chunk_data, create_response_expected, get_payload_codec
 except ValueError:
-    from ip_connection import Device, IPConnection, Error, create_char, create_char_list, create_string, create_chunk_data
+    from ip_connection import Device, IPConnection, Error, create_char, create_char_list, create_string, create_chunk_data, create_response_expected, get_payload_codec
 
 """
 
@@ -79,6 +149,14 @@ except ValueError:
         template = """{0} = namedtuple('{1}', [{2}])
 """
 
+        for name, name_tup, params in self.get_python_namedtuple_definitions():
+            tuples += template.format(name, name_tup, ', '.join(params))
+
+        return tuples
+
+    def get_python_namedtuple_definitions(self):
+        definitions = []
+
         for packet in self.get_packets('function'):
             if len(packet.get_elements(direction='out')) < 2:
                 continue
@@ -95,7 +173,7 @@ except ValueError:
             for element in packet.get_elements(direction='out'):
                 params.append("'{0}'".format(element.get_name().under))
 
-            tuples += template.format(name.camel, name_tup, ", ".join(params))
+            definitions.append((name.camel, name_tup, params))
 
         for packet in self.get_packets('function'):
             if not packet.has_high_level():
@@ -116,9 +194,35 @@ except ValueError:
             for element in packet.get_elements(direction='out', high_level=True):
                 params.append("'{0}'".format(element.get_name().under))
 
-            tuples += template.format(name.camel, name_tup, ", ".join(params))
+            definitions.append((name.camel, name_tup, params))
 
-        return tuples
+        return definitions
+
+    def get_python_payload_codecs(self):
+        template = "{0} = get_payload_codec('{1}')\n"
+        payload_codecs = ''
+
+        for name, form in sorted(self.get_python_payload_codec_forms().items()):
+            payload_codecs += template.format(name, form)
+
+        return common.wrap_non_empty('\n', payload_codecs, '')
+
+    def get_python_payload_codec_forms(self):
+        forms = set()
+
+        for packet in self.get_packets('function'):
+            forms.add(packet.get_python_format_list('in'))
+            forms.add(packet.get_python_format_list('out'))
+
+        for packet in self.get_packets('callback'):
+            forms.add(packet.get_python_format_list('out'))
+
+        codecs = {}
+
+        for form in forms:
+            codecs[get_python_payload_codec_name(form)] = form
+
+        return codecs
 
     def get_python_class(self):
         template = """
@@ -172,42 +276,46 @@ class {0}(Device):
 
         return '\n' + self.get_formatted_constants(constant_format)
 
-    def get_python_init_method(self):
+    def get_python_response_expected(self):
         template = """
-    def __init__(self, uid, ipcon):
-        \"\"\"
-        Creates an object with the unique device ID *uid* and adds it to
-        the IP Connection *ipcon*.
-        \"\"\"
-        Device.__init__(self, uid, ipcon, {0}.DEVICE_IDENTIFIER, {0}.DEVICE_DISPLAY_NAME)
-
-        self.api_version = ({1}, {2}, {3})
-
+    default_response_expected = create_response_expected(Device.default_response_expected, {{
+{0}
+    }})
 """
-        response_expected = ''
+        response_expected = []
 
         for packet in self.get_packets('function'):
-            response_expected += '        self.response_expected[{0}.FUNCTION_{1}] = {0}.RESPONSE_EXPECTED_{2}\n' \
-                                 .format(self.get_python_class_name(), packet.get_name().upper,
-                                         packet.get_response_expected().upper())
+            response_expected.append('        FUNCTION_{0}: Device.RESPONSE_EXPECTED_{1}'
+                                     .format(packet.get_name().upper, packet.get_response_expected().upper()))
 
-        return template.format(self.get_python_class_name(), *self.get_api_version()) + common.wrap_non_empty('', response_expected, '\n')
+        return template.format(',\n'.join(response_expected))
 
     def get_python_callback_formats(self):
-        callback_formats = ''
-        template = "        self.callback_formats[{0}.CALLBACK_{1}] = ({2}, '{3}')\n"
+        template = """
+    default_callback_formats = {{
+{0}
+    }}
+"""
+        callback_formats = []
 
         for packet in self.get_packets('callback'):
-            callback_formats += template.format(self.get_python_class_name(),
-                                                packet.get_name().upper,
-                                                packet.get_response_size(),
-                                                packet.get_python_format_list('out'))
+            callback_formats.append('        CALLBACK_{0}: ({1}, {2})'
+                                    .format(packet.get_name().upper,
+                                            packet.get_response_size(),
+                                            get_python_payload_codec_name(packet.get_python_format_list('out'))))
+
+        if len(callback_formats) == 0:
+            return ''
 
-        return callback_formats + '\n'
+        return template.format(',\n'.join(callback_formats))
 
     def get_python_high_level_callbacks(self):
-        high_level_callbacks = ''
-        template = "        self.high_level_callbacks[{0}.CALLBACK_{1}] = [{4}, {{'fixed_length': {2}, 'single_chunk': {3}}}, None]\n"
+        template = """
+    default_high_level_callbacks = {{
+{0}
+    }}
+"""
+        high_level_callbacks = []
 
         for packet in self.get_packets('callback'):
             stream = packet.get_high_level('stream_*')
@@ -218,13 +326,32 @@ class {0}(Device):
                 for element in packet.get_elements(direction='out'):
                     roles.append(element.get_role())
 
-                high_level_callbacks += template.format(self.get_python_class_name(),
-                                                        packet.get_name(skip=-2).upper,
-                                                        stream.get_fixed_length(),
-                                                        stream.has_single_chunk(),
-                                                        repr(tuple(roles)))
+                high_level_callbacks.append("        CALLBACK_{0}: ({1}, {{'fixed_length': {2}, 'single_chunk': {3}, 'typecode': {4}}})"
+                                            .format(packet.get_name(skip=-2).upper,
+                                                    repr(tuple(roles)),
+                                                    stream.get_fixed_length(),
+                                                    stream.has_single_chunk(),
+                                                    stream.get_chunk_data_element().get_python_array_typecode()))
+
+        if len(high_level_callbacks) == 0:
+            return ''
+
+        return template.format(',\n'.join(high_level_callbacks))
+
+    def get_python_init_method(self):
+        template = """
+    def __init__(self, uid, ipcon):
+        \"\"\"
+        Creates an object with the unique device ID *uid* and adds it to
+        the IP Connection *ipcon*.
+        \"\"\"
+        Device.__init__(self, uid, ipcon, {0}.DEVICE_IDENTIFIER, {0}.DEVICE_DISPLAY_NAME)
+
+        self.api_version = ({1}, {2}, {3})
+
+"""
 
-        return high_level_callbacks
+        return template.format(self.get_python_class_name(), *self.get_api_version())
 
     def get_python_add_device(self):
         return '        ipcon.add_device(self)\n'
@@ -235,21 +362,21 @@ class {0}(Device):
         \"\"\"
         {10}
         \"\"\"{11}{12}
-        return {1}(*self.ipcon.send_request(self, {2}.FUNCTION_{3}, ({4}{9}), '{5}', {6}, '{7}'))
+        return {1}(*self.ipcon.send_request(self, {2}.FUNCTION_{3}, ({4}{9}), {5}, {6}, {7}))
 """
         m_ret = """
     def {0}(self{7}{3}):
         \"\"\"
         {9}
         \"\"\"{10}{11}
-        return self.ipcon.send_request(self, {1}.FUNCTION_{2}, ({3}{8}), '{4}', {5}, '{6}')
+        return self.ipcon.send_request(self, {1}.FUNCTION_{2}, ({3}{8}), {4}, {5}, {6})
 """
         m_nor = """
     def {0}(self{5}{3}):
         \"\"\"
         {7}
         \"\"\"{8}{9}
-        self.ipcon.send_request(self, {1}.FUNCTION_{2}, ({3}{6}), '{4}', 0, '')
+        self.ipcon.send_request(self, {1}.FUNCTION_{2}, ({3}{6}), {4}, 0, {10})
 """
         methods = ''
         cls = self.get_python_class_name()
@@ -270,9 +397,9 @@ class {0}(Device):
                 if not ',' in par:
                     ct = ','
 
-            in_f = packet.get_python_format_list('in')
+            in_f = get_python_payload_codec_name(packet.get_python_format_list('in'))
             out_l = packet.get_response_size()
-            out_f = packet.get_python_format_list('out')
+            out_f = get_python_payload_codec_name(packet.get_python_format_list('out'))
 
             if packet.get_function_id() == 255: # <device>.get_identity
                 check = ''
@@ -287,7 +414,7 @@ class {0}(Device):
             elif out_c == 1:
                 methods += m_ret.format(ns, cls, nh, par, in_f, out_l, out_f, cp, ct, doc, check, coercions)
             else:
-                methods += m_nor.format(ns, cls, nh, par, in_f, cp, ct, doc, check, coercions)
+                methods += m_nor.format(ns, cls, nh, par, in_f, cp, ct, doc, check, coercions, out_f)
 
         # high-level
         template_stream_in = """
@@ -397,36 +524,10 @@ class {0}(Device):
     def {function_name}(self{high_level_parameters}):
         \"\"\"
         {doc}
-        \"\"\"{coercions}{fixed_length}
-        with self.stream_lock:
-            ret = self.{function_name}_low_level({parameters}){dynamic_length_3}
-            {chunk_offset_check}{stream_name_under}_out_of_sync = ret.{stream_name_under}_chunk_offset != 0
-            {chunk_offset_check_indent}{stream_name_under}_data = ret.{stream_name_under}_chunk_data
-
-            while not {stream_name_under}_out_of_sync and len({stream_name_under}_data) < {stream_name_under}_length:
-                ret = self.{function_name}_low_level({parameters}){dynamic_length_4}
-                {stream_name_under}_out_of_sync = ret.{stream_name_under}_chunk_offset != len({stream_name_under}_data)
-                {stream_name_under}_data += ret.{stream_name_under}_chunk_data
-
-            if {stream_name_under}_out_of_sync: # discard remaining stream to bring it back in-sync
-                while ret.{stream_name_under}_chunk_offset + {chunk_cardinality} < {stream_name_under}_length:
-                    ret = self.{function_name}_low_level({parameters}){dynamic_length_5}
-
-                raise Error(Error.STREAM_OUT_OF_SYNC, '{stream_name_space} stream is out-of-sync')
+        \"\"\"{coercions}
+        ret, {stream_name_under}_data = self.read_stream_out(self.{function_name}_low_level, {parameters_tuple}, '{stream_name_under}', '{stream_name_space}', {fixed_length}, {chunk_cardinality}, {no_data_chunk_offset}, {typecode})
 {result}
 """
-        template_stream_out_fixed_length = """
-        {stream_name_under}_length = {fixed_length}
-"""
-        template_stream_out_dynamic_length = """
-{{indent}}{stream_name_under}_length = ret.{stream_name_under}_length"""
-        template_stream_out_chunk_offset_check = """
-            if ret.{stream_name_under}_chunk_offset == (1 << {shift_size}) - 1: # maximum chunk offset -> stream has no data
-                {stream_name_under}_length = 0
-                {stream_name_under}_out_of_sync = False
-                {stream_name_under}_data = ()
-            else:
-                """
         template_stream_out_single_chunk = """
     def {function_name}(self{high_level_parameters}):
         \"\"\"
@@ -436,7 +537,7 @@ class {0}(Device):
 {result}
 """
         template_stream_out_result = """
-        return {stream_name_under}_data[:{stream_name_under}_length]"""
+        return {stream_name_under}_data"""
         template_stream_out_single_chunk_result = """
         return ret.{stream_name_under}_data[:ret.{stream_name_under}_length]"""
         template_stream_out_namedtuple_result = """
@@ -527,18 +628,17 @@ class {0}(Device):
                                            result=result)
             elif stream_out != None:
                 if stream_out.get_fixed_length() != None:
-                    fixed_length = template_stream_out_fixed_length.format(stream_name_under=stream_out.get_name().under,
-                                                                           fixed_length=stream_out.get_fixed_length())
-                    dynamic_length = ''
+                    fixed_length = stream_out.get_fixed_length()
                     shift_size = int(stream_out.get_chunk_offset_element().get_type().replace('uint', ''))
-                    chunk_offset_check = template_stream_out_chunk_offset_check.format(stream_name_under=stream_out.get_name().under,
-                                                                                       shift_size=shift_size)
-                    chunk_offset_check_indent = '    '
+                    no_data_chunk_offset = '(1 << {0}) - 1'.format(shift_size)
                 else:
-                    fixed_length = ''
-                    dynamic_length = template_stream_out_dynamic_length.format(stream_name_under=stream_out.get_name().under)
-                    chunk_offset_check = ''
-                    chunk_offset_check_indent = ''
+                    fixed_length = None
+                    no_data_chunk_offset = None
+
+                if len(packet.get_elements(direction='in')) == 1:
+                    parameters_tuple = '({0},)'.format(packet.get_python_parameters())
+                else:
+                    parameters_tuple = '({0})'.format(packet.get_python_parameters())
 
                 if len(packet.get_elements(direction='out', high_level=True)) < 2:
                     if stream_out.has_single_chunk():
@@ -553,7 +653,7 @@ class {0}(Device):
                             if stream_out.has_single_chunk():
                                 fields.append('ret.{0}_data[:ret.{0}_length]'.format(stream_out.get_name().under))
                             else:
-                                fields.append('{0}_data[:{0}_length]'.format(stream_out.get_name().under))
+                                fields.append('{0}_data'.format(stream_out.get_name().under))
                         else:
                             fields.append('ret.{0}'.format(element.get_name().under))
 
@@ -572,13 +672,11 @@ class {0}(Device):
                                            high_level_parameters=common.wrap_non_empty(', ', packet.get_python_parameters(high_level=True), ''),
                                            stream_name_space=stream_out.get_name().space,
                                            stream_name_under=stream_out.get_name().under,
+                                           parameters_tuple=parameters_tuple,
                                            fixed_length=fixed_length,
-                                           dynamic_length_3=dynamic_length.format(indent='    ' * 3),
-                                           dynamic_length_4=dynamic_length.format(indent='    ' * 4),
-                                           dynamic_length_5=dynamic_length.format(indent='    ' * 5),
-                                           chunk_offset_check=chunk_offset_check,
-                                           chunk_offset_check_indent=chunk_offset_check_indent,
                                            chunk_cardinality=stream_out.get_chunk_data_element().get_cardinality(),
+                                           no_data_chunk_offset=no_data_chunk_offset,
+                                           typecode=stream_out.get_chunk_data_element().get_python_array_typecode(),
                                            result=result)
 
         return methods
@@ -605,16 +703,79 @@ class {0}(Device):
 
         return template.format(self.get_name().camel, self.get_python_class_name())
 
+    def get_python_async_import(self):
+        template = """# -*- coding: utf-8 -*-
+{0}{1}
+# asyncio variant of the {2}, requires Python 3.5 or newer
+
+try:
+    from .async_ip_connection import AsyncDevice
+    from .ip_connection import Error, create_char, create_char_list, create_string, create_chunk_data
+    from .{3} import {4}
+except ImportError:
+    from async_ip_connection import AsyncDevice
+    from ip_connection import Error, create_char, create_char_list, create_string, create_chunk_data
+    from {3} import {4}
+
+"""
+
+        if not self.is_released():
+            released = '\n#### __DEVICE_IS_NOT_RELEASED__ ####\n'
+        else:
+            released = ''
+
+        names = [self.get_python_class_name()]
+        names += [definition[0] for definition in self.get_python_namedtuple_definitions()]
+        names += sorted(self.get_python_payload_codec_forms().keys())
+        names = ', '.join(names)
+
+        return template.format(self.get_generator().get_header_comment('hash'),
+                               released,
+                               self.get_long_display_name(),
+                               self.get_python_import_name(),
+                               '\n        '.join(textwrap.wrap('(' + names + ')', 100)))
+
+    def get_python_async_class(self):
+        template = """class Async{0}({0}, AsyncDevice):
+    \"\"\"
+    {1}
+
+    All device functions of this class are coroutines, use it with an
+    AsyncIPConnection.
+    \"\"\"
+
+    def __init__(self, uid, ipcon):
+        \"\"\"
+        Creates an object with the unique device ID *uid* and adds it to
+        the asyncio IP Connection *ipcon*.
+        \"\"\"
+        {0}.__init__(self, uid, ipcon)
+
+        self.init_async()
+"""
+
+        return template.format(self.get_python_class_name(),
+                               common.select_lang(self.get_description()))
+
+    def get_python_async_source(self):
+        source  = self.get_python_async_import()
+        source += self.get_python_async_class()
+        source += make_python_async(self.get_python_methods())
+
+        return common.strip_trailing_whitespace(source)
+
     def get_python_source(self):
         source  = self.get_python_import()
         source += self.get_python_namedtuples()
+        source += self.get_python_payload_codecs()
         source += self.get_python_class()
         source += self.get_python_callback_id_definitions()
         source += self.get_python_function_id_definitions()
         source += self.get_python_constants()
-        source += self.get_python_init_method()
+        source += self.get_python_response_expected()
         source += self.get_python_callback_formats()
         source += self.get_python_high_level_callbacks()
+        source += self.get_python_init_method()
         source += self.get_python_add_device()
         source += self.get_python_methods()
         source += self.get_python_register_callback_method()
@@ -657,6 +818,8 @@ class PythonBindingsPacket(python_common.PythonPacket):
         return '\n        '.join(coercions)
 
 class PythonBindingsGenerator(python_common.PythonGeneratorTrait, common.BindingsGenerator):
+    strip_docstrings = False # smaller bindings for memory constrained targets
+
     def get_device_class(self):
         return PythonBindingsDevice
 
@@ -666,6 +829,9 @@ class PythonBindingsGenerator(python_common.PythonGeneratorTrait, common.Binding
     def get_element_class(self):
         return python_common.PythonElement
 
+    def get_input_options(self):
+        return [('strip_docstrings', self.strip_docstrings)]
+
     def prepare(self):
         common.BindingsGenerator.prepare(self)
 
@@ -676,52 +842,117 @@ class PythonBindingsGenerator(python_common.PythonGeneratorTrait, common.Binding
     def generate(self, device):
         filename = '{0}_{1}.py'.format(device.get_category().under, device.get_name().under)
 
+        async_filename = 'async_' + filename
+
+        source = device.get_python_source()
+        async_source = device.get_python_async_source()
+
+        if self.strip_docstrings:
+            source = strip_python_docstrings(source)
+            async_source = strip_python_docstrings(async_source)
+
         with open(os.path.join(self.get_bindings_dir(), filename), 'w') as f:
-            f.write(device.get_python_source())
+            f.write(source)
+
+        with open(os.path.join(self.get_bindings_dir(), async_filename), 'w') as f:
+            f.write(async_source)
 
-        self.device_factory_all_classes.append((device.get_python_import_name(), device.get_python_class_name()))
+        device_factory_class = (device.get_device_identifier(), device.get_python_import_name(), device.get_python_class_name(), device.get_long_display_name())
+
+        self.device_factory_all_classes.append(device_factory_class)
 
         if device.is_released():
-            self.device_factory_released_classes.append((device.get_python_import_name(), device.get_python_class_name()))
+            self.device_factory_released_classes.append(device_factory_class)
             self.device_display_names.append((device.get_device_identifier(), device.get_long_display_name()))
             self.released_files.append(filename)
+            self.released_files.append(async_filename)
 
     def finish(self):
-        template_import = """try:
-    from .{0} import {1}
-except ValueError:
-    from {0} import {1}
-"""
         template = """# -*- coding: utf-8 -*-
-{0}
-{1}
+{header}
+import sys
+import importlib
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
-DEVICE_CLASSES = {{
-{2}
+# the device modules are only imported on first use of a device class
+DEVICE_MODULES = {{
+{modules}
 }}
 
+DEVICE_DISPLAY_NAMES = {{
+{display_names}
+}}
+
+DEVICE_CLASS_NAMES = dict((class_name, device_identifier) for device_identifier, (_, class_name) in DEVICE_MODULES.items())
+
+_device_classes = {{}}
+
 def get_device_class(device_identifier):
-    return DEVICE_CLASSES[device_identifier]
+    device_class = _device_classes.get(device_identifier)
+
+    if device_class == None:
+        module_name, class_name = DEVICE_MODULES[device_identifier]
+
+        if __package__:
+            module = importlib.import_module('.' + module_name, __package__)
+        else:
+            module = importlib.import_module(module_name)
+
+        device_class = getattr(module, class_name)
+        _device_classes[device_identifier] = device_class
+
+    return device_class
+
+class DeviceClasses(Mapping):
+    def __getitem__(self, device_identifier):
+        return get_device_class(device_identifier)
+
+    def __iter__(self):
+        return iter(DEVICE_MODULES)
+
+    def __len__(self):
+        return len(DEVICE_MODULES)
+
+DEVICE_CLASSES = DeviceClasses()
 
 def get_device_display_name(device_identifier):
-    return get_device_class(device_identifier).DEVICE_DISPLAY_NAME
+    return DEVICE_DISPLAY_NAMES[device_identifier]
 
 def create_device(device_identifier, uid, ipcon):
     return get_device_class(device_identifier)(uid, ipcon)
+
+def __getattr__(name): # module __getattr__ requires Python 3.7
+    device_identifier = DEVICE_CLASS_NAMES.get(name)
+
+    if device_identifier == None:
+        raise AttributeError("module '{{0}}' has no attribute '{{1}}'".format(__name__, name))
+
+    return get_device_class(device_identifier)
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(DEVICE_CLASS_NAMES.keys()))
+
+if sys.hexversion < 0x3070000: # import all device classes now, to make them available as module attributes
+    for device_identifier in DEVICE_MODULES:
+        globals()[DEVICE_MODULES[device_identifier][1]] = get_device_class(device_identifier)
 """
         for filename, device_factory_classes in [('device_factory_all.py', self.device_factory_all_classes),
                                                  ('device_factory.py', self.device_factory_released_classes)]:
-            imports = []
-            classes = []
+            modules = []
+            display_names = []
 
-            for import_name, class_name in sorted(device_factory_classes):
-                imports.append(template_import.format(import_name, class_name))
-                classes.append('    {0}.DEVICE_IDENTIFIER: {0},'.format(class_name))
+            for device_identifier, import_name, class_name, display_name in sorted(device_factory_classes):
+                modules.append("    {0}: ('{1}', '{2}'),".format(device_identifier, import_name, class_name))
+                display_names.append("    {0}: '{1}',".format(device_identifier, display_name))
 
             with open(os.path.join(self.get_bindings_dir(), filename), 'w') as f:
-                f.write(template.format(self.get_header_comment('hash'),
-                                        '\n'.join(imports),
-                                        '\n'.join(classes)))
+                f.write(template.format(header=self.get_header_comment('hash'),
+                                        modules='\n'.join(modules),
+                                        display_names='\n'.join(display_names)))
 
         template = """# -*- coding: utf-8 -*-
 {header}
@@ -754,7 +985,12 @@ def get_device_display_name(device_identifier):
 def generate(root_dir, language):
     common.generate(root_dir, language, PythonBindingsGenerator)
 
+def add_arguments(parser):
+    parser.add_argument('--strip-docstrings', action='store_true', help='generate bindings without docstrings')
+
 if __name__ == '__main__':
-    common.dockerize('python', __file__)
+    args = common.dockerize('python', __file__, add_arguments=add_arguments)
+
+    PythonBindingsGenerator.strip_docstrings = args.strip_docstrings
 
     generate(os.getcwd(), 'en')
@@ -31,7 +31,6 @@ if sys.hexversion < 0x3040000:
     sys.exit(1)
 
 import os
-import shutil
 import importlib.util
 import importlib.machinery
 
@@ -61,29 +60,20 @@ class PythonZipGenerator(python_common.PythonGeneratorTrait, common.ZipGenerator
         self.tmp_dir                    = self.get_zip_dir()
         self.tmp_source_dir             = os.path.join(self.tmp_dir, 'source')
         self.tmp_source_tinkerforge_dir = os.path.join(self.tmp_source_dir, 'tinkerforge')
-        self.tmp_examples_dir           = os.path.join(self.tmp_dir, 'examples')
 
     def prepare(self):
         super().prepare()
 
         os.makedirs(self.tmp_source_dir)
         os.makedirs(self.tmp_source_tinkerforge_dir)
-        os.makedirs(self.tmp_examples_dir)
 
     def generate(self, device):
         if not device.is_released():
             return
 
         # Copy device examples
-        tmp_examples_device = os.path.join(self.tmp_examples_dir,
-                                           device.get_category().under,
-                                           device.get_name().under)
-
-        if not os.path.exists(tmp_examples_device):
-            os.makedirs(tmp_examples_device)
-
         for example in common.find_device_examples(device, r'^example_.*\.py$'):
-            shutil.copy(example[1], tmp_examples_device)
+            self.add_zip_file(example[1], '/'.join(['examples', device.get_category().under, device.get_name().under, example[0]]))
 
     def finish(self):
         root_dir = self.get_root_dir()
@@ -91,16 +81,18 @@ class PythonZipGenerator(python_common.PythonGeneratorTrait, common.ZipGenerator
         # Copy IP Connection examples
         if self.get_config_name().space == 'Tinkerforge':
             for example in common.find_examples(root_dir, r'^example_.*\.py$'):
-                shutil.copy(example[1], self.tmp_examples_dir)
+                self.add_zip_file(example[1], 'examples/' + example[0])
 
-        # Copy bindings and readme
+        # Add bindings and readme
         for filename in self.get_released_files() + ['device_factory.py']:
-            shutil.copy(os.path.join(self.get_bindings_dir(), filename), self.tmp_source_tinkerforge_dir)
-
-        shutil.copy(os.path.join(root_dir, 'ip_connection.py'),             self.tmp_source_tinkerforge_dir)
-        shutil.copy(os.path.join(root_dir, 'changelog.txt'),                self.tmp_dir)
-        shutil.copy(os.path.join(root_dir, 'readme.txt'),                   self.tmp_dir)
-        shutil.copy(os.path.join(root_dir, '..', 'configs', 'license.txt'), self.tmp_dir)
+            self.add_zip_file(os.path.join(self.get_bindings_dir(), filename), 'source/tinkerforge/' + filename)
+
+        self.add_zip_file(os.path.join(root_dir, 'ip_connection.py'),             'source/tinkerforge/ip_connection.py')
+        self.add_zip_file(os.path.join(root_dir, 'async_ip_connection.py'),       'source/tinkerforge/async_ip_connection.py')
+        self.add_zip_file(os.path.join(root_dir, 'ip_connection_pool.py'),        'source/tinkerforge/ip_connection_pool.py')
+        self.add_zip_file(os.path.join(root_dir, 'changelog.txt'),                'changelog.txt')
+        self.add_zip_file(os.path.join(root_dir, 'readme.txt'),                   'readme.txt')
+        self.add_zip_file(os.path.join(root_dir, '..', 'configs', 'license.txt'), 'license.txt')
 
         # Make __init__.py
         with open(os.path.join(self.tmp_source_tinkerforge_dir, '__init__.py'), 'w') as f:
@@ -16,6 +16,9 @@ import hmac
 import hashlib
 import errno
 import threading
+import array
+import collections
+import contextlib
 
 try:
     import queue # Python 3
@@ -215,119 +218,360 @@ else:
         else:
             return ''.join(create_char_list(value, expected_type='string'))
 
+# Mark start and end of the payload codec, so that the saleae bindings can
+# extract it. it can only depend on the struct and sys modules
+# UNPACK_PAYLOAD_CUT_HERE
 # internal
-def pack_payload(data, form):
-    if sys.hexversion < 0x03000000:
-        packed = ''
-    else:
-        packed = b''
+class PayloadCodec(object):
+    KIND_NUMBER = 0
+    KIND_NUMBER_ARRAY = 1
+    KIND_BOOL = 2
+    KIND_BOOL_ARRAY = 3
+    KIND_CHAR = 4
+    KIND_CHAR_ARRAY = 5
+    KIND_STRING = 6
+
+    bool_bits = None # byte value -> tuple of 8 bools, created on first use
+    bool_bytes = None # tuple of 8 bools -> byte value, created on first use
+
+    def __init__(self, form):
+        self.form = form
+        self.items = [] # [(kind, cardinality), ...]
+        fragments = []
+
+        for f in form.split(' '):
+            if len(f) == 0:
+                continue
 
-    for f, d in zip(form.split(' '), data):
-        if '!' in f:
             if len(f) > 1:
-                if int(f.replace('!', '')) != len(d):
-                    raise ValueError('Incorrect bool list length')
-
-                p = [0] * int(math.ceil(len(d) / 8.0))
-
-                for i, b in enumerate(d):
-                    if b:
-                        p[i // 8] |= 1 << (i % 8)
-
-                packed += struct.pack('<{0}B'.format(len(p)), *p)
+                cardinality = int(f[:-1])
             else:
-                packed += struct.pack('<?', d)
-        elif 'c' in f:
-            if sys.hexversion < 0x03000000:
+                cardinality = 1
+
+            if f[-1] == '!':
                 if len(f) > 1:
-                    packed += struct.pack('<' + f, *d)
+                    kind = PayloadCodec.KIND_BOOL_ARRAY
+                    fragments.append('{0}s'.format((cardinality + 7) // 8))
                 else:
-                    packed += struct.pack('<' + f, d)
-            else:
+                    kind = PayloadCodec.KIND_BOOL
+                    fragments.append('?')
+            elif f[-1] == 'c':
                 if len(f) > 1:
-                    packed += struct.pack('<' + f, *list(map(lambda char: bytes([ord(char)]), d)))
+                    kind = PayloadCodec.KIND_CHAR_ARRAY
+                    fragments.append('{0}s'.format(cardinality))
                 else:
-                    packed += struct.pack('<' + f, bytes([ord(d)]))
-        elif 's' in f:
-            if sys.hexversion < 0x03000000:
-                packed += struct.pack('<' + f, d)
+                    kind = PayloadCodec.KIND_CHAR
+                    fragments.append('c')
+            elif f[-1] == 's':
+                kind = PayloadCodec.KIND_STRING
+                fragments.append('{0}s'.format(cardinality))
             else:
-                packed += struct.pack('<' + f, bytes(map(ord, d)))
-        elif len(f) > 1:
-            packed += struct.pack('<' + f, *d)
-        else:
-            packed += struct.pack('<' + f, d)
+                if len(f) > 1:
+                    kind = PayloadCodec.KIND_NUMBER_ARRAY
+                else:
+                    kind = PayloadCodec.KIND_NUMBER
 
-    return packed
+                fragments.append(f)
 
-# Mark start and end of the unpack_payload funtion, so that the
-# saleae bindings can extract it
-# UNPACK_PAYLOAD_CUT_HERE
-# internal
-def unpack_payload(data, form):
-    ret = []
+            self.items.append((kind, cardinality))
 
-    for f in form.split(' '):
-        o = f
+        self.struct = struct.Struct('<' + ''.join(fragments))
+        self.size = self.struct.size
+        self.item_count = len(self.items)
+        self.numbers_only = True # all items are single numbers, no conversion necessary
 
-        if '!' in f:
-            if len(f) > 1:
-                f = '{0}B'.format(int(math.ceil(int(f.replace('!', '')) / 8.0)))
-            else:
-                f = 'B'
+        for kind, _ in self.items:
+            if kind != PayloadCodec.KIND_NUMBER:
+                self.numbers_only = False
 
-        f = '<' + f
-        length = struct.calcsize(f)
-        x = struct.unpack(f, data[:length])
+        if PayloadCodec.bool_bits == None:
+            bool_bits = []
+            bool_bytes = {}
 
-        if '!' in o:
-            y = []
+            for value in range(256):
+                bits = tuple([value & (1 << i) != 0 for i in range(8)])
 
-            if len(o) > 1:
-                for i in range(int(o.replace('!', ''))):
-                    y.append(x[i // 8] & (1 << (i % 8)) != 0)
-            else:
-                y.append(x[0] != 0)
+                bool_bits.append(bits)
+                bool_bytes[bits] = value
+
+            PayloadCodec.bool_bytes = bool_bytes
+            PayloadCodec.bool_bits = bool_bits
+
+    def pack(self, data):
+        if self.numbers_only:
+            return self.struct.pack(*data)
+
+        values = []
 
-            x = tuple(y)
+        for (kind, cardinality), d in zip(self.items, data):
+            if kind == PayloadCodec.KIND_NUMBER or kind == PayloadCodec.KIND_BOOL:
+                values.append(d)
+            elif kind == PayloadCodec.KIND_NUMBER_ARRAY:
+                if len(d) != cardinality:
+                    raise struct.error('pack expected {0} items for packing (got {1})'.format(cardinality, len(d)))
 
-        if 'c' in f:
-            if sys.hexversion < 0x03000000:
-                if len(x) > 1:
-                    ret.append(x)
+                values.extend(d)
+            elif kind == PayloadCodec.KIND_BOOL_ARRAY:
+                if len(d) != cardinality:
+                    raise ValueError('Incorrect bool list length')
+
+                bool_bytes = PayloadCodec.bool_bytes
+                bits = list(map(bool, d)) + [False] * (-cardinality % 8)
+                packed = bytearray([bool_bytes[tuple(bits[i:i + 8])] for i in range(0, len(bits), 8)])
+
+                values.append(bytes(packed))
+            elif kind == PayloadCodec.KIND_CHAR:
+                if sys.hexversion < 0x03000000:
+                    values.append(d)
                 else:
-                    ret.append(x[0])
-            else:
-                if len(x) > 1:
-                    ret.append(tuple(map(lambda item: chr(ord(item)), x)))
+                    values.append(bytes([ord(d)]))
+            elif kind == PayloadCodec.KIND_CHAR_ARRAY:
+                if len(d) != cardinality:
+                    raise struct.error('pack expected {0} items for packing (got {1})'.format(cardinality, len(d)))
+
+                if sys.hexversion < 0x03000000:
+                    values.append(''.join(d))
                 else:
-                    ret.append(chr(ord(x[0])))
-        elif 's' in f:
-            if sys.hexversion < 0x03000000:
-                s = x[0]
-            else:
-                s = ''.join(map(chr, x[0]))
+                    values.append(bytes(map(ord, d)))
+            else: # string
+                if sys.hexversion < 0x03000000:
+                    values.append(d)
+                elif isinstance(d, str):
+                    values.append(d.encode('latin-1'))
+                else:
+                    values.append(bytes(map(ord, d)))
 
-            i = s.find('\x00')
+        return self.struct.pack(*values)
 
-            if i >= 0:
-                s = s[:i]
+    def unpack(self, data, offset=0):
+        values = self.struct.unpack_from(data, offset)
 
-            ret.append(s)
-        elif len(x) > 1:
-            ret.append(x)
-        else:
-            ret.append(x[0])
+        if self.numbers_only:
+            if self.item_count == 1:
+                return values[0]
 
-        data = data[length:]
+            return values
 
-    if len(ret) == 1:
-        return ret[0]
-    else:
-        return ret
+        ret = []
+        i = 0
+
+        for kind, cardinality in self.items:
+            if kind == PayloadCodec.KIND_NUMBER or kind == PayloadCodec.KIND_BOOL:
+                ret.append(values[i])
+                i += 1
+                continue
+
+            if kind == PayloadCodec.KIND_NUMBER_ARRAY:
+                ret.append(values[i:i + cardinality])
+                i += cardinality
+                continue
+
+            value = values[i]
+            i += 1
+
+            if kind == PayloadCodec.KIND_BOOL_ARRAY:
+                bool_bits = PayloadCodec.bool_bits
+
+                ret.append(tuple([bit for byte in bytearray(value) for bit in bool_bits[byte]][:cardinality]))
+            elif kind == PayloadCodec.KIND_CHAR:
+                if sys.hexversion < 0x03000000:
+                    ret.append(value)
+                else:
+                    ret.append(chr(value[0]))
+            elif kind == PayloadCodec.KIND_CHAR_ARRAY:
+                if sys.hexversion < 0x03000000:
+                    ret.append(tuple(value))
+                else:
+                    ret.append(tuple(map(chr, value)))
+            else: # string
+                value = value.split(b'\0', 1)[0]
+
+                if sys.hexversion < 0x03000000:
+                    ret.append(value)
+                else:
+                    ret.append(value.decode('latin-1'))
+
+        if len(ret) == 1:
+            return ret[0]
+
+        return tuple(ret)
+
+payload_codecs = {} # form -> PayloadCodec
+
+# internal
+def get_payload_codec(form):
+    if isinstance(form, PayloadCodec):
+        return form
+
+    codec = payload_codecs.get(form)
+
+    if codec == None:
+        codec = PayloadCodec(form)
+        payload_codecs[form] = codec
+
+    return codec
+
+# internal
+def pack_payload(data, form):
+    return get_payload_codec(form).pack(data)
+
+# internal
+def unpack_payload(data, form):
+    return get_payload_codec(form).unpack(data)
 
 # UNPACK_PAYLOAD_CUT_HERE
 
+# internal
+def create_stream_buffer(size, typecode):
+    # streams of integer or float items are stored in an array, all others in a list
+    if typecode != None:
+        try:
+            return array.array(typecode, [0]) * size
+        except ValueError: # e.g. Python 2 has no 64 bit typecodes
+            pass
+
+    return [None] * size
+
+# internal
+def store_stream_chunk(data, chunk_offset, chunk_data):
+    if isinstance(data, array.array):
+        chunk_data = array.array(data.typecode, chunk_data)
+
+    if chunk_offset + len(chunk_data) > len(data): # stream got longer
+        data.extend(data[:chunk_offset + len(chunk_data) - len(data)])
+
+    data[chunk_offset:chunk_offset + len(chunk_data)] = chunk_data
+
+# internal
+def create_response_expected(base, flags):
+    # response expected flags by function ID, shared by all devices of a class
+    if base == None:
+        response_expected = bytearray(256)
+    else:
+        response_expected = bytearray(base)
+
+    for function_id, flag in flags.items():
+        response_expected[function_id] = flag
+
+    return response_expected
+
+# internal
+def unpack_response(response, function_id, length_ret, form_ret):
+    error_code = get_error_code_from_data(response)
+
+    if error_code == 0:
+        if length_ret == 0:
+            length_ret = 8 # setter with response-expected enabled
+
+        if len(response) != length_ret:
+            msg = 'Expected response of {0} byte for function ID {1}, got {2} byte instead' \
+                  .format(length_ret, function_id, len(response))
+            raise Error(Error.WRONG_RESPONSE_LENGTH, msg)
+    elif error_code == 1:
+        msg = 'Got invalid parameter for function {0}'.format(function_id)
+        raise Error(Error.INVALID_PARAMETER, msg)
+    elif error_code == 2:
+        msg = 'Function {0} is not supported'.format(function_id)
+        raise Error(Error.NOT_SUPPORTED, msg)
+    else:
+        msg = 'Function {0} returned an unknown error'.format(function_id)
+        raise Error(Error.UNKNOWN_ERROR_CODE, msg)
+
+    codec = get_payload_codec(form_ret)
+
+    if codec.item_count > 0:
+        return codec.unpack(response, 8)
+
+# internal
+def dispatch_callback(device, function_id, packet):
+    if -function_id in device.high_level_callbacks:
+        hlcb = device.high_level_callbacks[-function_id] # (roles, options)
+        length, form = device.callback_formats[function_id] # FIXME: currently assuming that low-level callback has more than one element
+
+        if len(packet) != length:
+            return # silently ignoring callback with wrong length
+
+        llvalues = get_payload_codec(form).unpack(packet, 8)
+        has_data = False
+        data = None
+
+        if hlcb[1]['fixed_length'] != None:
+            length = hlcb[1]['fixed_length']
+        else:
+            length = llvalues[hlcb[0].index('stream_length')]
+
+        if not hlcb[1]['single_chunk']:
+            chunk_offset = llvalues[hlcb[0].index('stream_chunk_offset')]
+        else:
+            chunk_offset = 0
+
+        chunk_data = llvalues[hlcb[0].index('stream_chunk_data')]
+
+        if device.high_level_callback_streams == None:
+            device.high_level_callback_streams = {}
+
+        stream = device.high_level_callback_streams.get(-function_id) # [data, next chunk offset]
+
+        if stream == None: # no stream in-progress
+            if chunk_offset == 0: # stream starts
+                chunk_count = max((length + len(chunk_data) - 1) // len(chunk_data), 1)
+                stream = [create_stream_buffer(chunk_count * len(chunk_data), hlcb[1].get('typecode')), 0]
+            else: # ignore tail of current stream, wait for next stream start
+                pass
+        elif chunk_offset != stream[1]: # stream out-of-sync
+            has_data = True
+            data = None
+            stream = None
+
+        if stream != None: # stream in-sync
+            store_stream_chunk(stream[0], chunk_offset, chunk_data)
+            stream[1] += len(chunk_data)
+
+            if stream[1] >= length: # stream complete
+                has_data = True
+                data = stream[0]
+                stream = None
+
+                del data[length:]
+
+        device.high_level_callback_streams[-function_id] = stream
+
+        cb = device.registered_callbacks.get(-function_id)
+
+        if has_data and cb != None:
+            if data != None:
+                data = device.get_stream_result(data)
+
+            result = []
+
+            for role, llvalue in zip(hlcb[0], llvalues):
+                if role == 'stream_chunk_data':
+                    result.append(data)
+                elif role == None:
+                    result.append(llvalue)
+
+            cb(*tuple(result))
+
+    cb = device.registered_callbacks.get(function_id)
+
+    if cb != None:
+        length, form = device.callback_formats.get(function_id, (None, None))
+
+        if length == None:
+            return # silently ignore registered but unknown callback
+
+        if len(packet) != length:
+            return # silently ignoring callback with wrong length
+
+        codec = get_payload_codec(form)
+
+        if codec.item_count == 0:
+            cb()
+        elif codec.item_count == 1:
+            cb(codec.unpack(packet, 8))
+        else:
+            cb(*codec.unpack(packet, 8))
+
 class Error(Exception):
     TIMEOUT = -1
     NOT_ADDED = -6 # obsolete since v2.0
@@ -360,7 +604,56 @@ class Error(Exception):
             self.__cause__ = None
             self.__suppress_context__ = True
 
+class Future(object):
+    # internal
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.exception = None
+
+    def done(self):
+        """
+        Returns *true* if the call has finished, *false* otherwise.
+        """
+
+        return self.event.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Waits for the call to finish. Returns *true* if the call has finished,
+        *false* if the timeout in seconds expired before.
+        """
+
+        return self.event.wait(timeout)
+
+    def result(self, timeout=None):
+        """
+        Waits for the call to finish and returns its result. If the call
+        raised an exception then this exception is raised here as well.
+        """
+
+        if not self.event.wait(timeout):
+            raise Error(Error.TIMEOUT, 'Call did not finish in time')
+
+        if self.exception is not None:
+            raise self.exception
+
+        return self.value
+
+    # internal
+    def set_result(self, value, exception):
+        self.value = value
+        self.exception = exception
+
+        self.event.set()
+
 class Device(object):
+    __slots__ = ['replaced', 'uid', 'uid_string', 'ipcon', 'device_identifier', 'device_display_name',
+                 'device_identifier_lock', 'device_identifier_check', 'wrong_device_display_name',
+                 'api_version', 'registered_callbacks', 'callback_formats', 'high_level_callbacks',
+                 'high_level_callback_streams', 'pending_request_count', 'stream_lock', 'stream_result_type',
+                 'response_expected', '__weakref__']
+
     DEVICE_IDENTIFIER_CHECK_PENDING = 0
     DEVICE_IDENTIFIER_CHECK_MATCH = 1
     DEVICE_IDENTIFIER_CHECK_MISMATCH = 2
@@ -370,6 +663,21 @@ class Device(object):
     RESPONSE_EXPECTED_TRUE = 2 # setter
     RESPONSE_EXPECTED_FALSE = 3 # setter, default
 
+    STREAM_RESULT_TYPE_TUPLE = 0 # default
+    STREAM_RESULT_TYPE_ARRAY = 1
+    STREAM_RESULT_TYPE_NUMPY = 2
+
+    # internal, the tables are shared by all devices of a class. a device only
+    # gets its own copy of a table if it is changed for this device
+    default_response_expected = create_response_expected(None, {
+        251: RESPONSE_EXPECTED_ALWAYS_TRUE, # IPConnection.FUNCTION_ADC_CALIBRATE
+        250: RESPONSE_EXPECTED_ALWAYS_TRUE, # IPConnection.FUNCTION_GET_ADC_CALIBRATION
+        249: RESPONSE_EXPECTED_ALWAYS_TRUE, # IPConnection.FUNCTION_READ_BRICKLET_UID
+        248: RESPONSE_EXPECTED_ALWAYS_TRUE  # IPConnection.FUNCTION_WRITE_BRICKLET_UID
+    })
+    default_callback_formats = {} # function ID -> (length, form)
+    default_high_level_callbacks = {} # -function ID -> (roles, options)
+
     # internal
     def __init__(self, uid, ipcon, device_identifier, device_display_name):
         uid_ = base58decode(uid)
@@ -394,19 +702,13 @@ class Device(object):
         self.wrong_device_display_name = '?' # protected by device_identifier_lock
         self.api_version = (0, 0, 0)
         self.registered_callbacks = {}
-        self.callback_formats = {}
-        self.high_level_callbacks = {}
-        self.expected_response_function_id = None # protected by request_lock
-        self.expected_response_sequence_number = None # protected by request_lock
-        self.response_queue = queue.Queue()
-        self.request_lock = threading.Lock()
+        self.callback_formats = self.default_callback_formats # copied by override_callback_format
+        self.high_level_callbacks = self.default_high_level_callbacks # copied by override_high_level_callback
+        self.high_level_callback_streams = None # created on first high-level callback, -function ID -> [data, next chunk offset]
+        self.pending_request_count = 0 # protected by ipcon.pending_requests_condition
         self.stream_lock = threading.Lock()
-
-        self.response_expected = [Device.RESPONSE_EXPECTED_INVALID_FUNCTION_ID] * 256
-        self.response_expected[IPConnection.FUNCTION_ADC_CALIBRATE] = Device.RESPONSE_EXPECTED_ALWAYS_TRUE
-        self.response_expected[IPConnection.FUNCTION_GET_ADC_CALIBRATION] = Device.RESPONSE_EXPECTED_ALWAYS_TRUE
-        self.response_expected[IPConnection.FUNCTION_READ_BRICKLET_UID] = Device.RESPONSE_EXPECTED_ALWAYS_TRUE
-        self.response_expected[IPConnection.FUNCTION_WRITE_BRICKLET_UID] = Device.RESPONSE_EXPECTED_ALWAYS_TRUE
+        self.stream_result_type = Device.STREAM_RESULT_TYPE_TUPLE
+        self.response_expected = self.default_response_expected # copied by override_response_expected
 
     def get_api_version(self):
         """
@@ -471,9 +773,9 @@ class Device(object):
             raise ValueError('Response Expected flag cannot be changed for function ID {0}'.format(function_id))
 
         if bool(response_expected):
-            self.response_expected[function_id] = Device.RESPONSE_EXPECTED_TRUE
+            self.override_response_expected(function_id, Device.RESPONSE_EXPECTED_TRUE)
         else:
-            self.response_expected[function_id] = Device.RESPONSE_EXPECTED_FALSE
+            self.override_response_expected(function_id, Device.RESPONSE_EXPECTED_FALSE)
 
     def set_response_expected_all(self, response_expected):
         """
@@ -488,7 +790,200 @@ class Device(object):
 
         for i in range(len(self.response_expected)):
             if self.response_expected[i] in [Device.RESPONSE_EXPECTED_TRUE, Device.RESPONSE_EXPECTED_FALSE]:
-                self.response_expected[i] = flag
+                self.override_response_expected(i, flag)
+
+    # internal
+    def override_response_expected(self, function_id, flag):
+        if self.response_expected is self.default_response_expected:
+            self.response_expected = bytearray(self.response_expected)
+
+        self.response_expected[function_id] = flag
+
+    # internal
+    def override_callback_format(self, function_id, callback_format):
+        if self.callback_formats is self.default_callback_formats:
+            self.callback_formats = dict(self.callback_formats)
+
+        self.callback_formats[function_id] = callback_format
+
+    # internal
+    def override_high_level_callback(self, function_id, high_level_callback):
+        if self.high_level_callbacks is self.default_high_level_callbacks:
+            self.high_level_callbacks = dict(self.high_level_callbacks)
+
+        self.high_level_callbacks[function_id] = high_level_callback
+
+    def get_stream_result_type(self):
+        """
+        Returns the type of the stream data returned by the high-level stream
+        getters and passed to the high-level callbacks of this device, as set
+        by set_stream_result_type.
+        """
+
+        return self.stream_result_type
+
+    def set_stream_result_type(self, stream_result_type):
+        """
+        Changes the type of the stream data returned by the high-level stream
+        getters and passed to the high-level callbacks of this device. The
+        data is a tuple by default (STREAM_RESULT_TYPE_TUPLE).
+
+        With STREAM_RESULT_TYPE_ARRAY streams of integer or float items are
+        an array.array that was filled in place, avoiding the copy into a
+        tuple. It supports the buffer protocol, use memoryview to access it
+        without further copies. With STREAM_RESULT_TYPE_NUMPY such streams
+        are a NumPy array sharing the memory of the array.array. This requires
+        NumPy to be installed.
+
+        Streams of bool or char items are always a tuple. In any case the
+        stream data belongs to the caller and is not reused by the bindings.
+        """
+
+        if stream_result_type not in [Device.STREAM_RESULT_TYPE_TUPLE, Device.STREAM_RESULT_TYPE_ARRAY, Device.STREAM_RESULT_TYPE_NUMPY]:
+            raise ValueError('Invalid stream result type {0}'.format(stream_result_type))
+
+        if stream_result_type == Device.STREAM_RESULT_TYPE_NUMPY:
+            try:
+                import numpy
+            except ImportError:
+                raise Error(Error.NOT_SUPPORTED, 'NumPy is not available')
+
+        self.stream_result_type = stream_result_type
+
+    def call_many(self, calls):
+        """
+        Calls several functions at once and returns their results as a list
+        in the same order as the given *calls*. Each item of *calls* is
+        either a function or a tuple of a function and its arguments, for
+        example::
+
+            results = device.call_many([device.get_temperature,
+                                        (device.set_configuration, 2, True)])
+
+        The functions do not have to belong to this device. All calls are
+        executed concurrently, so their requests are in-flight at the same
+        time as far as allowed by set_max_pending_requests of the IP
+        Connection. See IPConnection.call_many for details.
+        """
+
+        return self.ipcon.call_many(calls)
+
+    # internal
+    def read_stream_out(self, function, args, stream_name_under, stream_name_space,
+                        fixed_length, chunk_cardinality, no_data_chunk_offset, typecode):
+        # reads a stream by calling its low-level getter, the stream data is
+        # stored in a preallocated buffer by chunk offset. if the IP Connection
+        # allows more than one pending request per device then the remaining
+        # chunks are requested after the first response, with as many requests
+        # in-flight as allowed. returns the last response and the stream data
+        length_name = stream_name_under + '_length'
+        chunk_offset_name = stream_name_under + '_chunk_offset'
+        chunk_data_name = stream_name_under + '_chunk_data'
+
+        with self.stream_lock:
+            ret = function(*args)
+            chunk_offset = getattr(ret, chunk_offset_name)
+
+            if fixed_length != None:
+                length = fixed_length
+
+                if chunk_offset == no_data_chunk_offset: # maximum chunk offset -> stream has no data
+                    length = 0
+                    chunk_offset = 0
+            else:
+                length = getattr(ret, length_name)
+
+            chunk_count = max((length + chunk_cardinality - 1) // chunk_cardinality, 1)
+
+            data = create_stream_buffer(chunk_count * chunk_cardinality, typecode)
+
+            out_of_sync = chunk_offset != 0
+
+            if not out_of_sync and length > 0:
+                store_stream_chunk(data, 0, getattr(ret, chunk_data_name))
+
+            if not out_of_sync and chunk_count > 1 and self.ipcon.max_pending_device_requests > 1:
+                # the device answers the requests in order. request the next
+                # chunk whenever the oldest in-flight request is done
+                remaining_count = chunk_count - 1
+                window_size = min(self.ipcon.max_pending_device_requests, remaining_count)
+                futures = collections.deque()
+                responses = []
+                errors = []
+
+                for _ in range(window_size):
+                    futures.append(self.ipcon.submit(function, *args))
+
+                remaining_count -= window_size
+
+                # wait for all chunks before raising an error, otherwise the
+                # remaining chunks could end up in the next stream
+                while len(futures) > 0:
+                    try:
+                        responses.append(futures.popleft().result())
+                    except Exception as e:
+                        errors.append(e)
+
+                    if remaining_count > 0:
+                        futures.append(self.ipcon.submit(function, *args))
+                        remaining_count -= 1
+
+                if len(errors) > 0:
+                    raise errors[0]
+
+                received = set()
+
+                for response in responses:
+                    chunk_offset = getattr(response, chunk_offset_name)
+
+                    if chunk_offset == 0 or chunk_offset >= length or chunk_offset % chunk_cardinality != 0 or \
+                       chunk_offset in received or (fixed_length == None and getattr(response, length_name) != length):
+                        out_of_sync = True
+                    else:
+                        received.add(chunk_offset)
+                        store_stream_chunk(data, chunk_offset, getattr(response, chunk_data_name))
+
+                    if chunk_offset >= getattr(ret, chunk_offset_name):
+                        ret = response
+            else:
+                chunk_offset = chunk_cardinality
+
+                while not out_of_sync and chunk_offset < length:
+                    ret = function(*args)
+
+                    if fixed_length == None:
+                        length = getattr(ret, length_name)
+
+                    out_of_sync = getattr(ret, chunk_offset_name) != chunk_offset
+
+                    if not out_of_sync:
+                        store_stream_chunk(data, chunk_offset, getattr(ret, chunk_data_name))
+                        chunk_offset += chunk_cardinality
+
+            if out_of_sync: # discard remaining stream to bring it back in-sync
+                while getattr(ret, chunk_offset_name) + chunk_cardinality < length:
+                    ret = function(*args)
+
+                    if fixed_length == None:
+                        length = getattr(ret, length_name)
+
+                raise Error(Error.STREAM_OUT_OF_SYNC, '{0} stream is out-of-sync'.format(stream_name_space))
+
+        del data[length:]
+
+        return ret, self.get_stream_result(data)
+
+    # internal
+    def get_stream_result(self, data):
+        if isinstance(data, list) or self.stream_result_type == Device.STREAM_RESULT_TYPE_TUPLE:
+            return tuple(data)
+
+        if self.stream_result_type == Device.STREAM_RESULT_TYPE_NUMPY:
+            import numpy
+
+            return numpy.frombuffer(data, dtype=data.typecode)
+
+        return data
 
     # internal
     def check_validity(self):
@@ -503,7 +998,13 @@ class Device(object):
 
         with self.device_identifier_lock:
             if self.device_identifier_check == Device.DEVICE_IDENTIFIER_CHECK_PENDING:
-                device_identifier = self.ipcon.send_request(self, 255, (), '', 33, '8s 8s c 3B 3B H')[5] # <device>.get_identity
+                device_identifier = None
+
+                if self.device_identifier > 0: # the Brick Daemon does not respond to enumerate requests
+                    device_identifier = self.ipcon.get_registered_device_identifier(self.uid)
+
+                if device_identifier == None:
+                    device_identifier = self.ipcon.send_request(self, 255, (), '', 33, '8s 8s c 3B 3B H')[5] # <device>.get_identity
 
                 if device_identifier == self.device_identifier:
                     self.device_identifier_check = Device.DEVICE_IDENTIFIER_CHECK_MATCH
@@ -517,17 +1018,21 @@ class Device(object):
                             .format(self.uid_string, self.wrong_device_display_name, self.device_display_name))
 
 class BrickDaemon(Device):
+    __slots__ = []
+
     FUNCTION_GET_AUTHENTICATION_NONCE = 1
     FUNCTION_AUTHENTICATE = 2
 
+    default_response_expected = create_response_expected(Device.default_response_expected, {
+        FUNCTION_GET_AUTHENTICATION_NONCE: Device.RESPONSE_EXPECTED_ALWAYS_TRUE,
+        FUNCTION_AUTHENTICATE: Device.RESPONSE_EXPECTED_TRUE
+    })
+
     def __init__(self, uid, ipcon):
         Device.__init__(self, uid, ipcon, 0, 'Brick Daemon')
 
         self.api_version = (2, 0, 0)
 
-        self.response_expected[BrickDaemon.FUNCTION_GET_AUTHENTICATION_NONCE] = BrickDaemon.RESPONSE_EXPECTED_ALWAYS_TRUE
-        self.response_expected[BrickDaemon.FUNCTION_AUTHENTICATE] = BrickDaemon.RESPONSE_EXPECTED_TRUE
-
         ipcon.add_device(self)
 
     def get_authentication_nonce(self):
@@ -537,6 +1042,18 @@ class BrickDaemon(Device):
         self.ipcon.send_request(self, BrickDaemon.FUNCTION_AUTHENTICATE, (client_nonce, digest), '4B 20B', 0, '')
 
 class IPConnection(object):
+    __slots__ = ['host', 'port', 'timeout', 'auto_reconnect', 'auto_reconnect_allowed', 'auto_reconnect_pending',
+                 'auto_reconnect_internal', 'connect_failure_callback', 'sequence_number_lock', 'next_sequence_number',
+                 'authentication_lock', 'next_authentication_nonce', 'devices', 'replace_lock',
+                 'max_pending_device_requests', 'max_pending_requests', 'pending_requests', 'pending_requests_condition',
+                 'request_worker_queue', 'request_worker_lock', 'request_worker_count', 'request_worker_idle_count',
+                 'registered_callbacks', 'socket', 'socket_id', 'socket_lock', 'socket_send_lock', 'receive_flag',
+                 'receive_thread', 'callback', 'callback_dispatch_pool', 'callback_dispatch_pool_config',
+                 'disconnect_probe_flag', 'disconnect_probe_queue', 'disconnect_probe_thread', 'identity_registry',
+                 'identity_registry_deadline', 'identity_registry_condition', 'send_coalescing_window',
+                 'send_coalescing_budget', 'send_queue', 'send_queue_deadline', 'send_batch_depth', 'waiter', 'brickd',
+                 '__weakref__']
+
     FUNCTION_ENUMERATE = 254
     FUNCTION_ADC_CALIBRATE = 251
     FUNCTION_GET_ADC_CALIBRATION = 250
@@ -575,6 +1092,16 @@ class IPConnection(object):
 
     DISCONNECT_PROBE_INTERVAL = 5
 
+    REQUEST_WORKER_LIMIT = 16 # used if there is no per connection limit for pending requests
+    REQUEST_WORKER_IDLE_TIMEOUT = 5
+
+    IDENTITY_REGISTRY_WAIT = 0.5 # how long the identity check waits for the enumerate responses after connect
+
+    # used by set_callback_dispatch_pool
+    CALLBACK_OVERFLOW_POLICY_BLOCK = 0
+    CALLBACK_OVERFLOW_POLICY_DROP_OLDEST = 1
+    CALLBACK_OVERFLOW_POLICY_COALESCE_LATEST = 2
+
     class CallbackContext(object):
         def __init__(self):
             self.queue = None
@@ -582,6 +1109,145 @@ class IPConnection(object):
             self.packet_dispatch_allowed = False
             self.lock = None
 
+    class CallbackShard(object):
+        def __init__(self, ipcon, queue_size, overflow_policy, name):
+            self.ipcon = ipcon
+            self.queue_size = queue_size
+            self.overflow_policy = overflow_policy
+            self.condition = threading.Condition()
+            self.queues = collections.OrderedDict() # protected by condition, UID -> deque of (function ID, packet)
+            self.depth = 0 # protected by condition
+            self.drop_count = 0 # protected by condition
+            self.running = True # protected by condition
+            self.thread = threading.Thread(name=name, target=self.loop)
+            self.thread.daemon = True
+            self.thread.start()
+
+        def put(self, uid, function_id, packet, coalescable):
+            with self.condition:
+                items = self.queues.get(uid)
+
+                if items == None:
+                    items = collections.deque()
+                    self.queues[uid] = items
+
+                if self.overflow_policy == IPConnection.CALLBACK_OVERFLOW_POLICY_COALESCE_LATEST and coalescable:
+                    for i, item in enumerate(items):
+                        if item[0] == function_id: # replace queued packet, keep its position
+                            items[i] = (function_id, packet)
+                            self.drop_count += 1
+                            return
+
+                if len(items) >= self.queue_size:
+                    if self.overflow_policy == IPConnection.CALLBACK_OVERFLOW_POLICY_BLOCK:
+                        while self.running and len(items) >= self.queue_size:
+                            self.condition.wait()
+
+                        if uid not in self.queues: # queue was removed while waiting
+                            self.queues[uid] = items
+                    else: # drop oldest, also used for streams if coalescing is not possible
+                        items.popleft()
+                        self.depth -= 1
+                        self.drop_count += 1
+
+                items.append((function_id, packet))
+                self.depth += 1
+                self.condition.notify_all()
+
+        def clear(self):
+            with self.condition:
+                for items in self.queues.values():
+                    items.clear() # also wakes up a blocked put
+
+                self.queues.clear()
+                self.depth = 0
+                self.condition.notify_all()
+
+        def stop(self):
+            with self.condition:
+                self.running = False
+                self.condition.notify_all()
+
+        def get_statistics(self):
+            with self.condition:
+                return self.depth, self.drop_count
+
+        def loop(self):
+            while True:
+                with self.condition:
+                    while self.running and self.depth == 0:
+                        self.condition.wait()
+
+                    if self.depth == 0:
+                        return
+
+                    # take one packet from the first device and move it to the
+                    # end, so a device with a high callback rate cannot starve
+                    # the other devices handled by this shard
+                    uid = next(iter(self.queues))
+                    items = self.queues.pop(uid)
+                    packet = items.popleft()[1]
+                    self.depth -= 1
+
+                    if len(items) > 0:
+                        self.queues[uid] = items
+
+                    self.condition.notify_all()
+
+                callback = self.ipcon.callback
+
+                # don't dispatch callbacks when the receive thread isn't running
+                if callback != None and callback.packet_dispatch_allowed:
+                    self.ipcon.dispatch_packet(packet)
+
+    class PendingRequest(object):
+        def __init__(self):
+            self.event = threading.Event()
+            self.response = None
+
+    class ReceiveBuffer(object):
+        RECEIVE_SIZE = 8192
+
+        def __init__(self):
+            # at most one incomplete packet (< 256 bytes) is left in the buffer
+            # between receives, so this is always enough space for a full receive
+            self.buffer = bytearray(2 * IPConnection.ReceiveBuffer.RECEIVE_SIZE)
+            self.view = memoryview(self.buffer)
+            self.start = 0
+            self.end = 0
+
+        def receive(self, sock):
+            if self.start == self.end:
+                self.start = 0
+                self.end = 0
+            elif len(self.buffer) - self.end < IPConnection.ReceiveBuffer.RECEIVE_SIZE:
+                # move incomplete packet to the front to make room
+                pending = self.end - self.start
+                self.buffer[0:pending] = self.view[self.start:self.end]
+                self.start = 0
+                self.end = pending
+
+            length = sock.recv_into(self.view[self.end:], IPConnection.ReceiveBuffer.RECEIVE_SIZE)
+            self.end += length
+
+            return length
+
+        def get_packet(self):
+            available = self.end - self.start
+
+            if available < 8:
+                return None # wait for complete header
+
+            length = self.buffer[self.start + 4]
+
+            if available < length:
+                return None # wait for complete packet
+
+            packet = self.view[self.start:self.start + length].tobytes()
+            self.start += length
+
+            return packet
+
     def __init__(self):
         """
         Creates an IP Connection object that can be used to enumerate the available
@@ -602,6 +1268,14 @@ class IPConnection(object):
         self.next_authentication_nonce = 0 # protected by authentication_lock
         self.devices = {}
         self.replace_lock = threading.Lock() # used to synchronize replacements in the devices dict
+        self.max_pending_device_requests = 1 # protected by pending_requests_condition
+        self.max_pending_requests = None # protected by pending_requests_condition
+        self.pending_requests = {} # modified while holding pending_requests_condition
+        self.pending_requests_condition = threading.Condition()
+        self.request_worker_queue = queue.Queue()
+        self.request_worker_lock = threading.Lock()
+        self.request_worker_count = 0 # protected by request_worker_lock
+        self.request_worker_idle_count = 0 # protected by request_worker_lock, idle workers minus queued calls
         self.registered_callbacks = {}
         self.socket = None # protected by socket_lock
         self.socket_id = 0 # protected by socket_lock
@@ -610,9 +1284,19 @@ class IPConnection(object):
         self.receive_flag = False
         self.receive_thread = None
         self.callback = None
+        self.callback_dispatch_pool = None # list of CallbackShard
+        self.callback_dispatch_pool_config = (0, 0, IPConnection.CALLBACK_OVERFLOW_POLICY_BLOCK)
         self.disconnect_probe_flag = False
         self.disconnect_probe_queue = None
         self.disconnect_probe_thread = None
+        self.identity_registry = None # protected by identity_registry_condition, UID -> device identifier
+        self.identity_registry_deadline = 0 # protected by identity_registry_condition
+        self.identity_registry_condition = threading.Condition()
+        self.send_coalescing_window = 0 # protected by socket_send_lock
+        self.send_coalescing_budget = 1400 # protected by socket_send_lock
+        self.send_queue = bytearray() # protected by socket_send_lock
+        self.send_queue_deadline = None # protected by socket_send_lock
+        self.send_batch_depth = 0 # protected by socket_send_lock
         self.waiter = threading.Semaphore()
         self.brickd = BrickDaemon('2', self)
 
@@ -657,12 +1341,16 @@ class IPConnection(object):
 
                 self.disconnect_unlocked()
 
-            # end callback thread
+            # end callback thread and callback dispatch pool
             callback = self.callback
             self.callback = None
+            callback_dispatch_pool = self.stop_callback_dispatch_pool_unlocked()
 
         # do this outside of socket_lock to allow calling (dis-)connect from
-        # the callbacks while blocking on the join call here
+        # the callbacks while blocking on the join call here. no device
+        # callback is called after the disconnected callback
+        self.join_callback_dispatch_pool(callback_dispatch_pool)
+
         callback.queue.put((IPConnection.QUEUE_META,
                             (IPConnection.CALLBACK_DISCONNECTED,
                              IPConnection.DISCONNECT_REASON_REQUEST, None)))
@@ -775,6 +1463,329 @@ class IPConnection(object):
 
         return self.timeout
 
+    def set_max_pending_requests(self, per_device, per_connection=None):
+        """
+        Sets the maximum number of requests that can be in-flight at the same
+        time per device and per IP Connection. A request is in-flight from the
+        moment it is sent until its response arrives or its timeout expires.
+        Responses are matched to their requests by UID, function ID and
+        sequence number, so several requests to the same device can be
+        in-flight at the same time. If *per_connection* is *None* then there
+        is no limit per IP Connection.
+
+        This only affects getters and setters for which the response expected
+        flag is enabled. Use call_many or submit to issue several requests from
+        a single thread.
+
+        Default is 1 per device and no limit per IP Connection. In this
+        configuration each device handles one request after the other.
+        """
+
+        per_device = int(per_device)
+
+        if per_device < 1:
+            raise ValueError('Maximum number of pending requests per device has to be at least 1')
+
+        if per_connection is not None:
+            per_connection = int(per_connection)
+
+            if per_connection < 1:
+                raise ValueError('Maximum number of pending requests per connection has to be at least 1')
+
+        with self.pending_requests_condition:
+            self.max_pending_device_requests = per_device
+            self.max_pending_requests = per_connection
+
+            self.pending_requests_condition.notify_all()
+
+    def get_max_pending_requests(self):
+        """
+        Returns the maximum number of pending requests per device and per IP
+        Connection as set by set_max_pending_requests.
+        """
+
+        return self.max_pending_device_requests, self.max_pending_requests
+
+    def set_send_coalescing(self, window, byte_budget=1400):
+        """
+        Enables or disables write coalescing. By default each request is sent
+        with its own send call, which results in one TCP segment per request.
+        If *window* is greater than 0, requests that don't expect a response
+        are queued instead. The queued requests are sent together with a
+        single send call *window* seconds after the first of them was queued,
+        or as soon as *byte_budget* bytes are queued. A request that expects
+        a response is sent immediately, together with all queued requests.
+
+        This reduces the number of send calls and TCP segments for bursts of
+        setters without response, for example LED strip frames, at the cost
+        of up to *window* seconds of additional latency. See also flush and
+        batch.
+
+        Default window is 0, write coalescing is disabled.
+        """
+
+        window = float(window)
+        byte_budget = int(byte_budget)
+
+        if window < 0:
+            raise ValueError('Window cannot be negative')
+
+        if byte_budget < 1:
+            raise ValueError('Byte budget has to be greater than 0')
+
+        with self.socket_send_lock:
+            self.send_coalescing_window = window
+            self.send_coalescing_budget = byte_budget
+
+            flush = window == 0 and self.send_batch_depth == 0 and len(self.send_queue) > 0
+
+        if flush:
+            self.flush()
+
+    def get_send_coalescing(self):
+        """
+        Returns the window and the byte budget as set by set_send_coalescing.
+        """
+
+        return self.send_coalescing_window, self.send_coalescing_budget
+
+    def set_identity_registry(self, identity_registry):
+        """
+        Enables or disables the identity registry. If enabled, the IP
+        Connection broadcasts an enumerate request on every connect and
+        remembers the device identifier of every device that responds.
+
+        Before the first call of a device function the device object checks
+        that its UID belongs to the expected type of device. With the identity
+        registry enabled this check is done with the remembered device
+        identifier, instead of asking every device for its identity one after
+        another. Devices that are not in the registry are still asked. A device
+        that is reported as disconnected is checked again on its next use.
+
+        The enumerate request triggers the enumerate callback for all
+        devices, with enumeration type ENUMERATION_TYPE_AVAILABLE.
+
+        Default value is *False*.
+        """
+
+        with self.socket_lock:
+            if not identity_registry:
+                with self.identity_registry_condition:
+                    self.identity_registry = None
+                    self.identity_registry_condition.notify_all()
+            elif self.identity_registry == None:
+                if self.socket is not None:
+                    self.start_identity_registry_unlocked()
+                else:
+                    with self.identity_registry_condition:
+                        self.identity_registry = {}
+
+    def get_identity_registry(self):
+        """
+        Returns *true* if the identity registry is enabled, *false* otherwise.
+        """
+
+        return self.identity_registry != None
+
+    def set_callback_dispatch_pool(self, worker_count, queue_size=1000,
+                                   overflow_policy=CALLBACK_OVERFLOW_POLICY_BLOCK):
+        """
+        Changes how device callbacks are dispatched. By default all callbacks
+        are called one after another by a single callback thread. If
+        *worker_count* is greater than 0, device callbacks are dispatched by
+        a pool of *worker_count* threads instead. Each device is assigned to
+        one of the threads by its UID, so the callbacks of one device are
+        still called in order. A thread takes turns between its devices, so
+        a device with a high callback rate cannot starve the others. The
+        enumerate, connected and disconnected callbacks are always called by
+        the callback thread.
+
+        Each device can have up to *queue_size* callbacks waiting to be
+        called. If a callback arrives when this limit is reached, the
+        *overflow_policy* decides what happens:
+
+        * CALLBACK_OVERFLOW_POLICY_BLOCK: The receive thread waits until the
+          callback can be queued. This also delays the responses for getter
+          calls, don't call getters from callbacks with this policy if the
+          queue can fill up.
+        * CALLBACK_OVERFLOW_POLICY_DROP_OLDEST: The oldest waiting callback
+          of the device is dropped.
+        * CALLBACK_OVERFLOW_POLICY_COALESCE_LATEST: A waiting callback with
+          the same callback ID is replaced by the new one, independent of the
+          queue size. Chunks of high-level callbacks cannot be coalesced, for
+          those the oldest waiting callback is dropped instead.
+
+        Dropped callbacks are counted, see get_callback_queue_statistics. Set
+        *worker_count* to 0 to return to the single callback thread.
+
+        The threads are started on connect and ended on disconnect, after
+        the device callbacks they are currently calling have returned.
+        """
+
+        worker_count = int(worker_count)
+        queue_size = int(queue_size)
+
+        if worker_count < 0:
+            raise ValueError('Worker count has to be greater or equal to 0')
+
+        if queue_size < 1:
+            raise ValueError('Queue size has to be greater than 0')
+
+        if overflow_policy not in [IPConnection.CALLBACK_OVERFLOW_POLICY_BLOCK,
+                                   IPConnection.CALLBACK_OVERFLOW_POLICY_DROP_OLDEST,
+                                   IPConnection.CALLBACK_OVERFLOW_POLICY_COALESCE_LATEST]:
+            raise ValueError('Invalid overflow policy {0}'.format(overflow_policy))
+
+        with self.socket_lock:
+            old_callback_dispatch_pool = self.callback_dispatch_pool
+            self.callback_dispatch_pool = None
+            self.callback_dispatch_pool_config = (worker_count, queue_size, overflow_policy)
+
+            # the threads only exist together with the callback thread
+            if self.callback != None:
+                self.start_callback_dispatch_pool_unlocked()
+
+        # already queued callbacks are still dispatched by the old threads
+        if old_callback_dispatch_pool != None:
+            for shard in old_callback_dispatch_pool:
+                shard.stop()
+
+    def get_callback_dispatch_pool(self):
+        """
+        Returns the worker count, queue size and overflow policy as set by
+        set_callback_dispatch_pool.
+        """
+
+        return self.callback_dispatch_pool_config
+
+    def get_callback_queue_statistics(self):
+        """
+        Returns a list with one (queue depth, drop count) tuple per callback
+        thread. The queue depth is the number of callbacks currently waiting
+        to be called and the drop count is the number of callbacks that were
+        dropped or coalesced so far. Without a callback dispatch pool, the
+        list has one entry for the single callback thread, that never drops
+        callbacks.
+        """
+
+        callback_dispatch_pool = self.callback_dispatch_pool
+
+        if callback_dispatch_pool != None:
+            return [shard.get_statistics() for shard in callback_dispatch_pool]
+
+        callback = self.callback
+
+        if callback == None:
+            return [(0, 0)]
+
+        return [(callback.queue.qsize(), 0)]
+
+    def submit(self, function, *args):
+        """
+        Schedules *function* to be called with the given arguments and returns
+        a future for its result. The call is executed by a pool of request
+        worker threads, so the calling thread is not blocked while the request
+        is in-flight. The future has a result method that waits for the call
+        to finish and returns its result or raises its exception. The
+        result method takes an optional timeout in seconds.
+        """
+
+        future = Future()
+
+        with self.request_worker_lock:
+            self.request_worker_queue.put((future, function, args))
+
+            if self.max_pending_requests is not None:
+                request_worker_limit = self.max_pending_requests
+            else:
+                request_worker_limit = IPConnection.REQUEST_WORKER_LIMIT
+
+            # the call is handed to an idle worker. if there is none left then
+            # the idle count becomes negative and another worker is started
+            self.request_worker_idle_count -= 1
+
+            if self.request_worker_idle_count < 0 and self.request_worker_count < request_worker_limit:
+                request_worker_thread = threading.Thread(name='Request-Worker',
+                                                         target=self.request_worker_loop)
+                request_worker_thread.daemon = True
+                request_worker_thread.start()
+
+                self.request_worker_count += 1
+                self.request_worker_idle_count += 1
+
+        return future
+
+    def call_many(self, calls):
+        """
+        Calls several functions at once and returns their results as a list
+        in the same order as the given *calls*. Each item of *calls* is
+        either a function or a tuple of a function and its arguments, for
+        example::
+
+            results = ipcon.call_many([temperature.get_temperature,
+                                       humidity.get_humidity,
+                                       (relay.set_state, True, False)])
+
+        All calls are executed concurrently using submit. How many of their
+        requests are in-flight at the same time is controlled by
+        set_max_pending_requests. Polling many different devices this way
+        costs about one round trip instead of one round trip per device.
+
+        If a call raises an exception then this exception is raised after all
+        calls have finished.
+        """
+
+        futures = []
+
+        for call in calls:
+            if isinstance(call, tuple):
+                futures.append(self.submit(*call))
+            else:
+                futures.append(self.submit(call))
+
+        for future in futures:
+            future.wait()
+
+        return [future.result() for future in futures]
+
+    def flush(self):
+        """
+        Sends all requests that are queued because of write coalescing or
+        batch immediately.
+        """
+
+        self.send(b'')
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Returns a context manager that queues all requests without response
+        until the end of the with block and then sends them together, for
+        example::
+
+            with ipcon.batch():
+                for i in range(0, 600, 16):
+                    led_strip.set_led_values(i, channels[i:i + 16])
+
+        This works independent of set_send_coalescing, but the byte budget
+        set by it also applies here. Requests sent by other threads during
+        the with block are queued as well.
+        """
+
+        with self.socket_send_lock:
+            self.send_batch_depth += 1
+
+        try:
+            yield self
+        finally:
+            with self.socket_send_lock:
+                self.send_batch_depth -= 1
+
+                flush = self.send_batch_depth == 0 and len(self.send_queue) > 0
+
+            if flush:
+                self.flush()
+
     def enumerate(self):
         """
         Broadcasts an enumerate request. All devices will respond with an
@@ -816,6 +1827,45 @@ class IPConnection(object):
         else:
             self.registered_callbacks[callback_id] = function
 
+    # internal
+    def start_callback_dispatch_pool_unlocked(self):
+        # NOTE: assumes that socket_lock is locked
+        worker_count, queue_size, overflow_policy = self.callback_dispatch_pool_config
+
+        if worker_count == 0 or self.callback_dispatch_pool != None:
+            return
+
+        callback_dispatch_pool = []
+
+        for i in range(worker_count):
+            callback_dispatch_pool.append(IPConnection.CallbackShard(self, queue_size, overflow_policy,
+                                                                     'Callback-Worker-{0}'.format(i)))
+
+        self.callback_dispatch_pool = callback_dispatch_pool
+
+    # internal
+    def stop_callback_dispatch_pool_unlocked(self):
+        # NOTE: assumes that socket_lock is locked. queued callbacks are
+        #       dropped, returns the stopped threads to be joined
+        callback_dispatch_pool = self.callback_dispatch_pool
+        self.callback_dispatch_pool = None
+
+        if callback_dispatch_pool != None:
+            for shard in callback_dispatch_pool:
+                shard.clear()
+                shard.stop()
+
+        return callback_dispatch_pool
+
+    # internal
+    def join_callback_dispatch_pool(self, callback_dispatch_pool):
+        if callback_dispatch_pool == None:
+            return
+
+        for shard in callback_dispatch_pool:
+            if threading.current_thread() is not shard.thread:
+                shard.thread.join()
+
     # internal
     def connect_unlocked(self, is_auto_reconnect):
         # NOTE: assumes that socket is None and socket_lock is locked
@@ -836,6 +1886,8 @@ class IPConnection(object):
                 self.callback = None
                 raise
 
+        self.start_callback_dispatch_pool_unlocked()
+
         # create and connect socket
         try:
             tmp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -878,6 +1930,7 @@ class IPConnection(object):
                             self.callback.thread.join()
 
                         self.callback = None
+                        self.stop_callback_dispatch_pool_unlocked()
 
             cleanup1()
             raise
@@ -910,6 +1963,7 @@ class IPConnection(object):
                         self.callback.thread.join()
 
                     self.callback = None
+                    self.stop_callback_dispatch_pool_unlocked()
 
             cleanup2()
             raise
@@ -939,6 +1993,7 @@ class IPConnection(object):
                         self.callback.thread.join()
 
                     self.callback = None
+                    self.stop_callback_dispatch_pool_unlocked()
 
             cleanup3()
             raise
@@ -946,6 +2001,9 @@ class IPConnection(object):
         self.auto_reconnect_allowed = False
         self.auto_reconnect_pending = False
 
+        if self.identity_registry != None:
+            self.start_identity_registry_unlocked()
+
         if is_auto_reconnect:
             connect_reason = IPConnection.CONNECT_REASON_AUTO_RECONNECT
         else:
@@ -964,6 +2022,8 @@ class IPConnection(object):
         self.disconnect_probe_thread.join() # FIXME: use a timeout?
         self.disconnect_probe_thread = None
 
+        self.flush_before_disconnect_unlocked()
+
         # stop dispatching packet callbacks before ending the receive
         # thread to avoid timeout exceptions due to callback functions
         # trying to call getters
@@ -976,6 +2036,12 @@ class IPConnection(object):
         else:
             self.callback.packet_dispatch_allowed = False
 
+        callback_dispatch_pool = self.callback_dispatch_pool
+
+        if callback_dispatch_pool != None:
+            for shard in callback_dispatch_pool:
+                shard.clear()
+
         # end receive thread
         self.receive_flag = False
 
@@ -992,6 +2058,73 @@ class IPConnection(object):
         self.socket.close()
         self.socket = None
 
+    # internal
+    def start_identity_registry_unlocked(self):
+        # NOTE: assumes that socket is not None and socket_lock is locked
+        with self.identity_registry_condition:
+            self.identity_registry = {}
+            self.identity_registry_deadline = time.time() + IPConnection.IDENTITY_REGISTRY_WAIT
+
+        request, _, _ = self.create_packet_header(None, 8, IPConnection.FUNCTION_ENUMERATE)
+
+        try:
+            with self.socket_send_lock:
+                while True:
+                    try:
+                        self.socket.send(request)
+                        break
+                    except socket.timeout:
+                        continue
+        except socket.error:
+            pass # the receive thread handles the broken connection
+
+    # internal
+    def update_identity_registry(self, packet):
+        if len(packet) != 34:
+            return # silently ignoring callback with wrong length
+
+        uid = get_uid_from_data(packet)
+        device_identifier, enumeration_type = struct.unpack('<HB', packet[31:34])
+
+        with self.identity_registry_condition:
+            if self.identity_registry == None:
+                return
+
+            if enumeration_type == IPConnection.ENUMERATION_TYPE_DISCONNECTED:
+                self.identity_registry.pop(uid, None)
+            else:
+                self.identity_registry[uid] = device_identifier
+
+            self.identity_registry_condition.notify_all()
+
+        device = self.devices.get(uid)
+
+        if device != None and (enumeration_type == IPConnection.ENUMERATION_TYPE_DISCONNECTED or \
+                               device_identifier != device.device_identifier):
+            # check again on next use. this cannot wait for the device_identifier_lock,
+            # the thread holding it might wait for a response from this thread
+            device.device_identifier_check = Device.DEVICE_IDENTIFIER_CHECK_PENDING
+
+    # internal
+    def get_registered_device_identifier(self, uid):
+        # returns None if the identity registry is disabled or does not know
+        # the UID. shortly after connect this waits for the enumerate responses
+        with self.identity_registry_condition:
+            while self.identity_registry != None:
+                device_identifier = self.identity_registry.get(uid)
+
+                if device_identifier != None:
+                    return device_identifier
+
+                remaining = self.identity_registry_deadline - time.time()
+
+                if remaining <= 0:
+                    break
+
+                self.identity_registry_condition.wait(remaining)
+
+        return None
+
     # internal
     def set_auto_reconnect_internal(self, auto_reconnect, connect_failure_callback):
         self.auto_reconnect_internal = auto_reconnect
@@ -1009,14 +2142,11 @@ class IPConnection(object):
 
     # internal
     def receive_loop(self, socket_id):
-        if sys.hexversion < 0x03000000:
-            pending_data = ''
-        else:
-            pending_data = bytes()
+        receive_buffer = IPConnection.ReceiveBuffer()
 
         while self.receive_flag:
             try:
-                data = self.socket.recv(8192)
+                length = receive_buffer.receive(self.socket)
             except socket.timeout:
                 continue
             except socket.error:
@@ -1028,27 +2158,17 @@ class IPConnection(object):
                     self.handle_disconnect_by_peer(IPConnection.DISCONNECT_REASON_ERROR, socket_id, False)
                 break
 
-            if len(data) == 0:
+            if length == 0:
                 if self.receive_flag:
                     self.handle_disconnect_by_peer(IPConnection.DISCONNECT_REASON_SHUTDOWN, socket_id, False)
                 break
 
-            pending_data += data
-
             while self.receive_flag:
-                if len(pending_data) < 8:
-                    # Wait for complete header
-                    break
-
-                length = get_length_from_data(pending_data)
+                packet = receive_buffer.get_packet()
 
-                if len(pending_data) < length:
-                    # Wait for complete packet
+                if packet == None:
                     break
 
-                packet = pending_data[0:length]
-                pending_data = pending_data[length:]
-
                 self.handle_response(packet)
 
     # internal
@@ -1076,6 +2196,8 @@ class IPConnection(object):
                         self.socket.close()
                         self.socket = None
 
+                        self.discard_send_queue()
+
             # FIXME: wait a moment here, otherwise the next connect
             # attempt will succeed, even if there is no open server
             # socket. the first receive will then fail directly
@@ -1113,7 +2235,6 @@ class IPConnection(object):
         uid = get_uid_from_data(packet)
         length = get_length_from_data(packet)
         function_id = get_function_id_from_data(packet)
-        payload = packet[8:]
 
         if function_id == IPConnection.CALLBACK_ENUMERATE:
             cb = self.registered_callbacks.get(IPConnection.CALLBACK_ENUMERATE)
@@ -1126,7 +2247,7 @@ class IPConnection(object):
 
             uid, connected_uid, position, hardware_version, \
                 firmware_version, device_identifier, enumeration_type = \
-                unpack_payload(payload, '8s 8s c 3B 3B H B')
+                get_payload_codec('8s 8s c 3B 3B H B').unpack(packet, 8)
 
             cb(uid, connected_uid, position, hardware_version,
                firmware_version, device_identifier, enumeration_type)
@@ -1143,82 +2264,7 @@ class IPConnection(object):
         except Error:
             return # silently ignoring callback for invalid device
 
-        if -function_id in device.high_level_callbacks:
-            hlcb = device.high_level_callbacks[-function_id] # [roles, options, data]
-            length, form = device.callback_formats[function_id] # FIXME: currently assuming that low-level callback has more than one element
-
-            if len(packet) != length:
-                return # silently ignoring callback with wrong length
-
-            llvalues = unpack_payload(payload, form)
-            has_data = False
-            data = None
-
-            if hlcb[1]['fixed_length'] != None:
-                length = hlcb[1]['fixed_length']
-            else:
-                length = llvalues[hlcb[0].index('stream_length')]
-
-            if not hlcb[1]['single_chunk']:
-                chunk_offset = llvalues[hlcb[0].index('stream_chunk_offset')]
-            else:
-                chunk_offset = 0
-
-            chunk_data = llvalues[hlcb[0].index('stream_chunk_data')]
-
-            if hlcb[2] == None: # no stream in-progress
-                if chunk_offset == 0: # stream starts
-                    hlcb[2] = chunk_data
-
-                    if len(hlcb[2]) >= length: # stream complete
-                        has_data = True
-                        data = hlcb[2][:length]
-                        hlcb[2] = None
-                else: # ignore tail of current stream, wait for next stream start
-                    pass
-            else: # stream in-progress
-                if chunk_offset != len(hlcb[2]): # stream out-of-sync
-                    has_data = True
-                    data = None
-                    hlcb[2] = None
-                else: # stream in-sync
-                    hlcb[2] += chunk_data
-
-                    if len(hlcb[2]) >= length: # stream complete
-                        has_data = True
-                        data = hlcb[2][:length]
-                        hlcb[2] = None
-
-            cb = device.registered_callbacks.get(-function_id)
-
-            if has_data and cb != None:
-                result = []
-
-                for role, llvalue in zip(hlcb[0], llvalues):
-                    if role == 'stream_chunk_data':
-                        result.append(data)
-                    elif role == None:
-                        result.append(llvalue)
-
-                cb(*tuple(result))
-
-        cb = device.registered_callbacks.get(function_id)
-
-        if cb != None:
-            length, form = device.callback_formats.get(function_id, (None, None))
-
-            if length == None:
-                return # silently ignore registered but unknown callback
-
-            if len(packet) != length:
-                return # silently ignoring callback with wrong length
-
-            if len(form) == 0:
-                cb()
-            elif ' ' not in form:
-                cb(unpack_payload(payload, form))
-            else:
-                cb(*unpack_payload(payload, form))
+        dispatch_callback(device, function_id, packet)
 
     # internal
     def callback_loop(self, callback):
@@ -1238,19 +2284,77 @@ class IPConnection(object):
                     if callback.packet_dispatch_allowed:
                         self.dispatch_packet(data)
 
+    # internal
+    def request_worker_loop(self):
+        while True:
+            try:
+                future, function, args = self.request_worker_queue.get(True, IPConnection.REQUEST_WORKER_IDLE_TIMEOUT)
+            except queue.Empty:
+                with self.request_worker_lock:
+                    # submit puts calls into the queue while holding the
+                    # request_worker_lock, so no call can get lost here
+                    if self.request_worker_queue.empty():
+                        self.request_worker_count -= 1
+                        self.request_worker_idle_count -= 1
+
+                        return
+
+                continue
+
+            # the call was already counted against the idle workers by submit
+
+            try:
+                future.set_result(function(*args), None)
+            except Exception as e:
+                future.set_result(None, e)
+
+            future = None
+            function = None
+            args = None
+
+            with self.request_worker_lock:
+                self.request_worker_idle_count += 1
+
     # internal
     # NOTE: the disconnect probe thread is not allowed to hold the socket_lock at any
     #       time because it is created and joined while the socket_lock is locked
     def disconnect_probe_loop(self, disconnect_probe_queue):
         request, _, _ = self.create_packet_header(None, 8, IPConnection.FUNCTION_DISCONNECT_PROBE)
+        probe_deadline = time.time() + IPConnection.DISCONNECT_PROBE_INTERVAL
 
+        # this thread also sends the requests queued by write coalescing when
+        # their window expired, send puts False into the queue to wake it up
         while True:
+            timeout = probe_deadline - time.time()
+            send_queue_deadline = self.send_queue_deadline
+
+            if send_queue_deadline != None:
+                timeout = min(timeout, send_queue_deadline - time.time())
+
             try:
-                disconnect_probe_queue.get(True, IPConnection.DISCONNECT_PROBE_INTERVAL)
-                break
+                if disconnect_probe_queue.get(True, max(timeout, 0)):
+                    break
+
+                continue
             except queue.Empty:
                 pass
 
+            try:
+                with self.socket_send_lock:
+                    send_queue_deadline = self.send_queue_deadline
+
+                    if send_queue_deadline != None and send_queue_deadline <= time.time():
+                        self.flush_expired_send_queue_unlocked()
+            except socket.error:
+                self.handle_disconnect_by_peer(IPConnection.DISCONNECT_REASON_ERROR,
+                                               self.socket_id, False)
+                break
+
+            if time.time() < probe_deadline:
+                continue
+
+            probe_deadline = time.time() + IPConnection.DISCONNECT_PROBE_INTERVAL
+
             if self.disconnect_probe_flag:
                 try:
                     with self.socket_send_lock:
@@ -1268,78 +2372,135 @@ class IPConnection(object):
                 self.disconnect_probe_flag = True
 
     # internal
-    def send(self, packet):
+    def send(self, packet, coalescable=False):
         with self.socket_lock:
             if self.socket is None:
                 raise Error(Error.NOT_CONNECTED, 'Not connected')
 
             try:
                 with self.socket_send_lock:
-                    while True:
-                        try:
-                            self.socket.send(packet)
-                            break
-                        except socket.timeout:
-                            continue
+                    if coalescable and self.queue_unlocked(packet):
+                        return
+
+                    self.send_unlocked(packet)
             except socket.error:
                 self.handle_disconnect_by_peer(IPConnection.DISCONNECT_REASON_ERROR, None, True)
                 raise Error(Error.NOT_CONNECTED, 'Not connected', suppress_context=True)
 
             self.disconnect_probe_flag = False
 
+    # internal
+    def queue_unlocked(self, packet):
+        # NOTE: assumes that socket_send_lock is locked. returns False if the
+        #       packet has to be sent now, together with the queued packets
+        if self.send_batch_depth == 0 and self.send_coalescing_window == 0:
+            return False
+
+        if len(self.send_queue) + len(packet) > self.send_coalescing_budget:
+            return False
+
+        self.send_queue += packet
+
+        if self.send_queue_deadline == None and self.send_batch_depth == 0:
+            self.send_queue_deadline = time.time() + self.send_coalescing_window
+
+            self.schedule_send_queue_flush()
+
+        return True
+
+    # internal
+    def send_unlocked(self, packet):
+        # NOTE: assumes that socket is not None and socket_send_lock is locked
+        if len(self.send_queue) > 0:
+            self.send_queue += packet
+            packet = bytes(self.send_queue)
+
+            self.discard_send_queue_unlocked()
+
+        view = memoryview(packet)
+
+        while len(view) > 0:
+            try:
+                view = view[self.socket.send(view):]
+            except socket.timeout:
+                continue
+
+    # internal
+    def schedule_send_queue_flush(self):
+        # NOTE: assumes that socket is not None and socket_send_lock is locked
+        self.disconnect_probe_queue.put(False) # wake up to recalculate the timeout
+
+    # internal
+    def flush_expired_send_queue_unlocked(self):
+        # NOTE: assumes that socket_send_lock is locked and that the window of
+        #       the queued requests expired
+        if self.send_queue_deadline == None:
+            return
+
+        if self.send_batch_depth > 0:
+            self.send_queue_deadline = None # the end of the batch sends the queue
+        else:
+            self.send_unlocked(b'')
+
+    # internal
+    def flush_before_disconnect_unlocked(self):
+        # NOTE: assumes that socket is not None and socket_lock is locked
+        try:
+            with self.socket_send_lock:
+                self.send_unlocked(b'')
+        except socket.error:
+            pass # the connection gets closed anyway
+
+    # internal
+    def discard_send_queue(self):
+        with self.socket_send_lock:
+            self.discard_send_queue_unlocked()
+
+    # internal
+    def discard_send_queue_unlocked(self):
+        # NOTE: assumes that socket_send_lock is locked
+        del self.send_queue[:]
+        self.send_queue_deadline = None
+
     # internal
     def send_request(self, device, function_id, data, form, length_ret, form_ret):
-        payload = pack_payload(data, form)
+        payload = get_payload_codec(form).pack(data)
         header, response_expected, sequence_number = self.create_packet_header(device, 8 + len(payload), function_id)
         request = header + payload
 
         if response_expected:
-            with device.request_lock:
-                device.expected_response_function_id = function_id
-                device.expected_response_sequence_number = sequence_number
+            key = (device.uid, function_id, sequence_number)
+            pending_request = IPConnection.PendingRequest()
+
+            with self.pending_requests_condition:
+                # the key can already be in use if the sequence number wrapped
+                # around while an older request for the same function is still
+                # in-flight. wait for it to finish, otherwise its response
+                # could not be told apart from the response for this request
+                while device.pending_request_count >= self.max_pending_device_requests or \
+                      (self.max_pending_requests != None and len(self.pending_requests) >= self.max_pending_requests) or \
+                      key in self.pending_requests:
+                    self.pending_requests_condition.wait()
+
+                device.pending_request_count += 1
+                self.pending_requests[key] = pending_request
 
-                try:
-                    self.send(request)
-
-                    while True:
-                        response = device.response_queue.get(True, self.timeout)
+            try:
+                self.send(request)
 
-                        if function_id == get_function_id_from_data(response) and \
-                           sequence_number == get_sequence_number_from_data(response):
-                            # ignore old responses that arrived after the timeout expired, but before setting
-                            # expected_response_function_id and expected_response_sequence_number back to None
-                            break
-                except queue.Empty:
+                if not pending_request.event.wait(self.timeout):
                     msg = 'Did not receive response for function {0} in time'.format(function_id)
-                    raise Error(Error.TIMEOUT, msg, suppress_context=True)
-                finally:
-                    device.expected_response_function_id = None
-                    device.expected_response_sequence_number = None
-
-            error_code = get_error_code_from_data(response)
-
-            if error_code == 0:
-                if length_ret == 0:
-                    length_ret = 8 # setter with response-expected enabled
-
-                if len(response) != length_ret:
-                    msg = 'Expected response of {0} byte for function ID {1}, got {2} byte instead' \
-                          .format(length_ret, function_id, len(response))
-                    raise Error(Error.WRONG_RESPONSE_LENGTH, msg)
-            elif error_code == 1:
-                msg = 'Got invalid parameter for function {0}'.format(function_id)
-                raise Error(Error.INVALID_PARAMETER, msg)
-            elif error_code == 2:
-                msg = 'Function {0} is not supported'.format(function_id)
-                raise Error(Error.NOT_SUPPORTED, msg)
-            else:
-                msg = 'Function {0} returned an unknown error'.format(function_id)
-                raise Error(Error.UNKNOWN_ERROR_CODE, msg)
+                    raise Error(Error.TIMEOUT, msg)
+            finally:
+                with self.pending_requests_condition:
+                    del self.pending_requests[key]
+                    device.pending_request_count -= 1
 
-            if len(form_ret) > 0:
-                return unpack_payload(response[8:], form_ret)
+                    self.pending_requests_condition.notify_all()
+
+            return unpack_response(pending_request.response, function_id, length_ret, form_ret)
         else:
-            self.send(request)
+            self.send(request, True)
 
     # internal
     def get_next_sequence_number(self):
@@ -1356,6 +2517,9 @@ class IPConnection(object):
         sequence_number = get_sequence_number_from_data(packet)
 
         if sequence_number == 0 and function_id == IPConnection.CALLBACK_ENUMERATE:
+            if self.identity_registry != None:
+                self.update_identity_registry(packet)
+
             if IPConnection.CALLBACK_ENUMERATE in self.registered_callbacks:
                 self.callback.queue.put((IPConnection.QUEUE_PACKET, packet))
 
@@ -1370,13 +2534,24 @@ class IPConnection(object):
         if sequence_number == 0:
             if function_id in device.registered_callbacks or \
                -function_id in device.high_level_callbacks:
-                self.callback.queue.put((IPConnection.QUEUE_PACKET, packet))
+                callback_dispatch_pool = self.callback_dispatch_pool
+
+                if callback_dispatch_pool != None:
+                    shard = callback_dispatch_pool[uid % len(callback_dispatch_pool)]
+                    shard.put(uid, function_id, packet, -function_id not in device.high_level_callbacks)
+                else:
+                    callback = self.callback
+
+                    if callback != None: # disconnect might have ended the callback thread already
+                        callback.queue.put((IPConnection.QUEUE_PACKET, packet))
 
             return
 
-        if device.expected_response_function_id == function_id and \
-           device.expected_response_sequence_number == sequence_number:
-            device.response_queue.put(packet)
+        pending_request = self.pending_requests.get((uid, function_id, sequence_number))
+
+        if pending_request != None:
+            pending_request.response = packet
+            pending_request.event.set()
             return
 
         # Response seems to be OK, but can't be handled
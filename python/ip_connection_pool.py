@@ -0,0 +1,623 @@
+# -*- coding: utf-8 -*-
+#
+# Redistribution and use in source and binary forms of this file,
+# with or without modification, are permitted. See the Creative
+# Commons Zero (CC0 1.0) License for more details.
+
+# IP Connection pool for many Brick Daemons, requires Python 3.5 or newer
+
+import collections
+import errno
+import heapq
+import itertools
+import queue
+import selectors
+import socket
+import threading
+import time
+import traceback
+
+try:
+    from .ip_connection import IPConnection, Error
+except ImportError:
+    from ip_connection import IPConnection, Error
+
+# internal
+class PooledConnection(object):
+    __slots__ = ['ipcon', 'socket', 'socket_id', 'receive_buffer']
+
+    def __init__(self, ipcon, sock, socket_id):
+        self.ipcon = ipcon
+        self.socket = sock
+        self.socket_id = socket_id # None while connecting
+
+        if socket_id != None:
+            self.receive_buffer = IPConnection.ReceiveBuffer()
+        else:
+            self.receive_buffer = None
+
+# internal
+class PooledCallbackQueue(object):
+    # stands in for the queue of the callback thread of an IPConnection and
+    # forwards everything to the callback thread of the pool
+    __slots__ = ['pool', 'ipcon', 'callback']
+
+    def __init__(self, pool, ipcon, callback):
+        self.pool = pool
+        self.ipcon = ipcon
+        self.callback = callback
+
+    def put(self, item):
+        self.pool.callback_queue.put((self.ipcon, self.callback, item))
+
+    def qsize(self):
+        return self.pool.callback_queue.qsize()
+
+class PooledIPConnection(IPConnection):
+    """
+    IP Connection that belongs to an IPConnectionPool, as returned by
+    IPConnectionPool.create_ip_connection and IPConnectionPool.connect.
+
+    It can be used everywhere an IPConnection can be used, for example as
+    *ipcon* argument for the constructors of Bricks and Bricklets. But it
+    has no receive, callback and disconnect probe thread of its own, the
+    threads of the pool do this work for all its IP Connections.
+    """
+
+    __slots__ = ['pool', 'address', 'reconnect_delay']
+
+    def __init__(self, pool):
+        IPConnection.__init__(self)
+
+        self.pool = pool
+        self.address = None # peer address of the last connect, auto-reconnect uses it to avoid name lookups
+        self.reconnect_delay = IPConnectionPool.RECONNECT_DELAY_MIN
+
+    def disconnect(self):
+        """
+        Disconnects the TCP/IP connection from the Brick Daemon or the
+        WIFI/Ethernet Extension.
+        """
+
+        with self.socket_lock:
+            self.auto_reconnect_allowed = False
+
+            if self.auto_reconnect_pending:
+                # abort potentially pending auto reconnect
+                self.auto_reconnect_pending = False
+            else:
+                if self.socket is None:
+                    raise Error(Error.NOT_CONNECTED, 'Not connected')
+
+                self.disconnect_unlocked()
+
+            callback = self.callback
+            self.callback = None
+            callback_dispatch_pool = self.stop_callback_dispatch_pool_unlocked()
+
+        # no device callback is called after the disconnected callback
+        self.join_callback_dispatch_pool(callback_dispatch_pool)
+
+        # the callback thread is shared with the other IP Connections of the
+        # pool, so wait for it to get through the queued callbacks of this
+        # IP Connection instead of ending it
+        done = threading.Event()
+
+        callback.queue.put((IPConnection.QUEUE_META,
+                            (IPConnection.CALLBACK_DISCONNECTED,
+                             IPConnection.DISCONNECT_REASON_REQUEST, None)))
+        callback.queue.put((IPConnection.QUEUE_EXIT, done))
+
+        if threading.current_thread() is not callback.thread:
+            done.wait()
+
+    # internal
+    def connect_unlocked(self, is_auto_reconnect):
+        # NOTE: assumes that socket is None and socket_lock is locked
+        tmp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+        try:
+            tmp.settimeout(5)
+            tmp.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            tmp.connect((self.host, self.port))
+        except:
+            tmp.close()
+            raise
+
+        self.address = tmp.getpeername()
+
+        self.connected_unlocked(tmp, is_auto_reconnect)
+
+    # internal
+    def connected_unlocked(self, sock, is_auto_reconnect):
+        # NOTE: assumes that socket is None and socket_lock is locked
+
+        # receives only happen if the I/O thread of the pool knows that data
+        # is available. sends from the I/O thread use the timeout to not get
+        # stuck on one stalled connection
+        sock.settimeout(IPConnectionPool.SOCKET_TIMEOUT)
+
+        if self.callback is None:
+            self.callback = self.pool.create_callback_context(self)
+
+        self.start_callback_dispatch_pool_unlocked()
+
+        self.socket = sock
+        self.socket_id += 1
+        self.disconnect_probe_flag = True
+        self.reconnect_delay = IPConnectionPool.RECONNECT_DELAY_MIN
+        self.callback.packet_dispatch_allowed = True
+        self.receive_flag = True
+
+        self.pool.add_connection(PooledConnection(self, sock, self.socket_id))
+
+        self.auto_reconnect_allowed = False
+        self.auto_reconnect_pending = False
+
+        if self.identity_registry != None:
+            self.start_identity_registry_unlocked()
+
+        if is_auto_reconnect:
+            connect_reason = IPConnection.CONNECT_REASON_AUTO_RECONNECT
+        else:
+            connect_reason = IPConnection.CONNECT_REASON_REQUEST
+
+        self.callback.queue.put((IPConnection.QUEUE_META,
+                                 (IPConnection.CALLBACK_CONNECTED,
+                                  connect_reason, None)))
+
+    # internal
+    def disconnect_unlocked(self):
+        # NOTE: assumes that socket is not None and socket_lock is locked
+        self.flush_before_disconnect_unlocked()
+
+        self.callback.packet_dispatch_allowed = False
+
+        callback_dispatch_pool = self.callback_dispatch_pool
+
+        if callback_dispatch_pool != None:
+            for shard in callback_dispatch_pool:
+                shard.clear()
+
+        self.receive_flag = False
+
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+        self.pool.release_socket(self.socket)
+        self.socket = None
+
+    # internal
+    def schedule_send_queue_flush(self):
+        # NOTE: assumes that socket is not None and socket_send_lock is locked
+        self.pool.schedule(self.send_coalescing_window, self.pool.flush_send_queue, self, self.socket_id)
+
+    # internal
+    def dispatch_meta(self, function_id, parameter, socket_id):
+        if function_id != IPConnection.CALLBACK_DISCONNECTED:
+            IPConnection.dispatch_meta(self, function_id, parameter, socket_id)
+            return
+
+        if parameter != IPConnection.DISCONNECT_REASON_REQUEST:
+            with self.socket_lock:
+                # don't close the socket if it got disconnected or
+                # reconnected in the meantime
+                if self.socket is not None and self.socket_id == socket_id:
+                    self.receive_flag = False
+                    self.pool.release_socket(self.socket)
+                    self.socket = None
+
+                    self.discard_send_queue()
+
+        cb = self.registered_callbacks.get(IPConnection.CALLBACK_DISCONNECTED)
+
+        try:
+            if cb != None:
+                cb(parameter)
+        finally:
+            # don't block the shared callback thread until the reconnect
+            # succeeded, the timer of the pool retries with increasing delay
+            if parameter != IPConnection.DISCONNECT_REASON_REQUEST and \
+               self.auto_reconnect and self.auto_reconnect_allowed:
+                self.auto_reconnect_pending = True
+                self.pool.schedule(self.reconnect_delay, self.pool.start_reconnect, self)
+
+class IPConnectionPool(object):
+    """
+    Connects to many Brick Daemons or WIFI/Ethernet Extensions with a fixed
+    number of threads. Each IPConnection has its own receive, callback and
+    disconnect probe thread. The IP Connections of a pool share one I/O
+    thread that receives from all connections, sends the disconnect probes
+    and does the auto-reconnects, and one callback thread that calls the
+    callbacks of all connections. The number of threads does not grow with
+    the number of connections.
+
+    Use create_ip_connection or connect to get an IP Connection for one host::
+
+        pool = IPConnectionPool()
+        ipcon = pool.connect('192.168.0.10', 4223)
+        temperature = BrickletTemperatureV2('XYZ', ipcon)
+
+    Because all connections share the callback thread, a callback that
+    blocks for a long time delays the callbacks of all other connections.
+    """
+
+    RECONNECT_DELAY_MIN = 0.1
+    RECONNECT_DELAY_MAX = 10
+    SOCKET_TIMEOUT = 0.1
+
+    def __init__(self):
+        """
+        Creates an IP Connection pool and starts its I/O and callback thread.
+        """
+
+        self.selector = selectors.DefaultSelector() # only used by the I/O thread
+        self.wakeup_receive, self.wakeup_send = socket.socketpair()
+        self.commands = collections.deque() # executed by the I/O thread
+        self.timers = [] # protected by timer_lock, heap of (deadline, sequence, function, args)
+        self.timer_lock = threading.Lock()
+        self.timer_sequence = itertools.count()
+        self.callback_queue = queue.Queue()
+        self.ip_connections = [] # protected by ip_connections_lock
+        self.ip_connections_lock = threading.Lock()
+        self.running = True
+
+        self.wakeup_receive.setblocking(False)
+        self.wakeup_send.setblocking(False)
+        self.selector.register(self.wakeup_receive, selectors.EVENT_READ)
+
+        self.io_thread = threading.Thread(name='Pool-IO', target=self.io_loop)
+        self.io_thread.daemon = True
+        self.io_thread.start()
+
+        self.callback_thread = threading.Thread(name='Pool-Callback-Processor', target=self.callback_loop)
+        self.callback_thread.daemon = True
+        self.callback_thread.start()
+
+        self.schedule(IPConnection.DISCONNECT_PROBE_INTERVAL, self.probe_connections)
+
+    def create_ip_connection(self):
+        """
+        Creates a new IP Connection that belongs to this pool. It is not
+        connected yet, call its connect method to connect it to a Brick
+        Daemon or a WIFI/Ethernet Extension.
+        """
+
+        ipcon = PooledIPConnection(self)
+
+        with self.ip_connections_lock:
+            self.ip_connections.append(ipcon)
+
+        return ipcon
+
+    def connect(self, host, port):
+        """
+        Creates a new IP Connection that belongs to this pool and connects it
+        to the given *host* and *port*. Blocks until the connection is
+        established, see IPConnection.connect.
+        """
+
+        ipcon = self.create_ip_connection()
+
+        ipcon.connect(host, port)
+
+        return ipcon
+
+    def get_ip_connections(self):
+        """
+        Returns a list of all IP Connections that belong to this pool.
+        """
+
+        with self.ip_connections_lock:
+            return list(self.ip_connections)
+
+    def close(self):
+        """
+        Disconnects all IP Connections of this pool and ends its threads.
+        The pool cannot be used afterwards.
+        """
+
+        for ipcon in self.get_ip_connections():
+            try:
+                ipcon.disconnect()
+            except Error:
+                pass
+
+        self.running = False
+        self.wakeup()
+        self.callback_queue.put(None)
+
+        for thread in [self.io_thread, self.callback_thread]:
+            if threading.current_thread() is not thread:
+                thread.join()
+
+    # internal
+    def create_callback_context(self, ipcon):
+        callback = IPConnection.CallbackContext()
+        callback.queue = PooledCallbackQueue(self, ipcon, callback)
+        callback.thread = self.callback_thread
+        callback.packet_dispatch_allowed = False
+        callback.lock = threading.Lock()
+
+        return callback
+
+    # internal
+    def wakeup(self):
+        try:
+            self.wakeup_send.send(b'\x00')
+        except socket.error:
+            pass # buffer is full, so the I/O thread wakes up anyway
+
+    # internal
+    def call_soon(self, function, *args):
+        self.commands.append((function, args))
+        self.wakeup()
+
+    # internal
+    def schedule(self, delay, function, *args):
+        sequence = next(self.timer_sequence)
+
+        with self.timer_lock:
+            heapq.heappush(self.timers, (time.monotonic() + delay, sequence, function, args))
+            earliest = self.timers[0][1] == sequence
+
+        if earliest and threading.current_thread() is not self.io_thread:
+            self.wakeup()
+
+    # internal
+    def add_connection(self, connection):
+        self.call_soon(self.selector.register, connection.socket, selectors.EVENT_READ, connection)
+
+    # internal
+    def release_socket(self, sock):
+        # the socket is closed by the I/O thread, otherwise its file
+        # descriptor could be reused while still known to the selector
+        self.call_soon(self.close_socket, sock)
+
+    # internal
+    def close_socket(self, sock):
+        self.unregister_socket(sock)
+        sock.close()
+
+    # internal
+    def unregister_socket(self, sock):
+        try:
+            self.selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass # not registered anymore
+
+    # internal
+    def io_loop(self):
+        try:
+            while True:
+                while len(self.commands) > 0:
+                    function, args = self.commands.popleft()
+
+                    self.call_reporting_exceptions(function, *args)
+
+                timeout = self.run_timers()
+
+                if not self.running:
+                    break
+
+                for key, mask in self.selector.select(timeout):
+                    if key.fileobj is self.wakeup_receive:
+                        self.drain_wakeup()
+                    elif key.data.socket_id == None:
+                        self.call_reporting_exceptions(self.finish_reconnect, key.data)
+                    else:
+                        self.call_reporting_exceptions(self.receive, key.data)
+        finally:
+            for key in list(self.selector.get_map().values()):
+                key.fileobj.close()
+
+            self.selector.close()
+            self.wakeup_send.close()
+
+    # internal
+    def drain_wakeup(self):
+        try:
+            while len(self.wakeup_receive.recv(4096)) > 0:
+                pass
+        except socket.error:
+            pass
+
+    # internal
+    def run_timers(self):
+        # calls the expired timers and returns the time until the next one
+        now = time.monotonic()
+
+        while True:
+            with self.timer_lock:
+                if len(self.timers) == 0:
+                    return None
+
+                deadline = self.timers[0][0]
+
+                if deadline > now:
+                    return deadline - now
+
+                _, _, function, args = heapq.heappop(self.timers)
+
+            self.call_reporting_exceptions(function, *args)
+
+    # internal
+    def call_reporting_exceptions(self, function, *args):
+        # the threads of the pool work for all its IP Connections, an
+        # exception caused by one of them must not end them for all others
+        try:
+            function(*args)
+        except Exception:
+            traceback.print_exc()
+
+    # internal
+    def is_current(self, connection):
+        ipcon = connection.ipcon
+
+        return ipcon.receive_flag and ipcon.socket_id == connection.socket_id
+
+    # internal
+    def handle_broken_connection(self, connection, disconnect_reason):
+        # stop watching the socket, it is closed by dispatch_meta or by the
+        # disconnect function, whichever comes first
+        self.unregister_socket(connection.socket)
+
+        if self.is_current(connection):
+            connection.ipcon.handle_disconnect_by_peer(disconnect_reason, connection.socket_id, False)
+
+    # internal
+    def receive(self, connection):
+        try:
+            length = connection.receive_buffer.receive(connection.socket)
+        except socket.timeout:
+            return
+        except socket.error as e:
+            if e.errno in [errno.EINTR, errno.EAGAIN, errno.EWOULDBLOCK]:
+                return
+
+            self.handle_broken_connection(connection, IPConnection.DISCONNECT_REASON_ERROR)
+            return
+
+        if length == 0:
+            self.handle_broken_connection(connection, IPConnection.DISCONNECT_REASON_SHUTDOWN)
+            return
+
+        while self.is_current(connection):
+            packet = connection.receive_buffer.get_packet()
+
+            if packet == None:
+                break
+
+            connection.ipcon.handle_response(packet)
+
+    # internal
+    def probe_connections(self):
+        self.schedule(IPConnection.DISCONNECT_PROBE_INTERVAL, self.probe_connections)
+
+        for key in list(self.selector.get_map().values()):
+            connection = key.data
+
+            if connection == None or connection.socket_id == None or not self.is_current(connection):
+                continue
+
+            self.call_reporting_exceptions(self.probe_connection, connection)
+
+    # internal
+    def probe_connection(self, connection):
+        ipcon = connection.ipcon
+
+        if not ipcon.disconnect_probe_flag:
+            ipcon.disconnect_probe_flag = True # there was traffic in the last interval
+            return
+
+        # a send in progress shows whether the connection is alive, too
+        if not ipcon.socket_send_lock.acquire(False):
+            return
+
+        try:
+            request, _, _ = ipcon.create_packet_header(None, 8, IPConnection.FUNCTION_DISCONNECT_PROBE)
+
+            connection.socket.send(request)
+        except socket.timeout:
+            pass # the receive side notices if the connection is dead
+        except socket.error:
+            self.handle_broken_connection(connection, IPConnection.DISCONNECT_REASON_ERROR)
+        finally:
+            ipcon.socket_send_lock.release()
+
+    # internal
+    def flush_send_queue(self, ipcon, socket_id):
+        if not ipcon.receive_flag or ipcon.socket_id != socket_id:
+            return
+
+        # the I/O thread must not wait for a send in progress
+        if not ipcon.socket_send_lock.acquire(False):
+            self.schedule(IPConnectionPool.SOCKET_TIMEOUT, self.flush_send_queue, ipcon, socket_id)
+            return
+
+        try:
+            ipcon.flush_expired_send_queue_unlocked()
+        except socket.error:
+            ipcon.handle_disconnect_by_peer(IPConnection.DISCONNECT_REASON_ERROR, socket_id, False)
+        finally:
+            ipcon.socket_send_lock.release()
+
+    # internal
+    def retry_reconnect(self, ipcon):
+        ipcon.reconnect_delay = min(ipcon.reconnect_delay * 2, IPConnectionPool.RECONNECT_DELAY_MAX)
+
+        self.schedule(ipcon.reconnect_delay, self.start_reconnect, ipcon)
+
+    # internal
+    def start_reconnect(self, ipcon):
+        # the I/O thread must not wait for the socket_lock, connect holds it
+        # while blocking for up to 5 seconds
+        if not ipcon.socket_lock.acquire(False):
+            self.schedule(ipcon.reconnect_delay, self.start_reconnect, ipcon)
+            return
+
+        try:
+            if not ipcon.auto_reconnect_allowed or ipcon.socket is not None:
+                ipcon.auto_reconnect_pending = False
+                return
+
+            tmp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            tmp.setblocking(False)
+            tmp.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            try:
+                error = tmp.connect_ex(ipcon.address)
+            except socket.error as e:
+                error = e.errno
+
+            if error in [0, errno.EINPROGRESS, errno.EWOULDBLOCK]:
+                self.selector.register(tmp, selectors.EVENT_WRITE, PooledConnection(ipcon, tmp, None))
+            else:
+                tmp.close()
+                self.retry_reconnect(ipcon)
+        finally:
+            ipcon.socket_lock.release()
+
+    # internal
+    def finish_reconnect(self, connection):
+        ipcon = connection.ipcon
+        tmp = connection.socket
+
+        self.selector.unregister(tmp)
+
+        if tmp.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0 or not ipcon.socket_lock.acquire(False):
+            tmp.close()
+            self.retry_reconnect(ipcon)
+            return
+
+        try:
+            if ipcon.auto_reconnect_allowed and ipcon.socket is None:
+                ipcon.connected_unlocked(tmp, True)
+                return
+
+            ipcon.auto_reconnect_pending = False
+            tmp.close()
+        finally:
+            ipcon.socket_lock.release()
+
+    # internal
+    def callback_loop(self):
+        while True:
+            item = self.callback_queue.get()
+
+            if item == None:
+                break
+
+            ipcon, callback, (kind, data) = item
+
+            if kind == IPConnection.QUEUE_EXIT:
+                if data != None:
+                    data.set()
+            elif kind == IPConnection.QUEUE_META:
+                self.call_reporting_exceptions(ipcon.dispatch_meta, *data)
+            elif kind == IPConnection.QUEUE_PACKET:
+                # don't dispatch callbacks when the connection is closed
+                if callback.packet_dispatch_allowed:
+                    self.call_reporting_exceptions(ipcon.dispatch_packet, data)
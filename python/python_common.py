@@ -73,6 +73,21 @@ class PythonElement(common.Element):
         'string': 's'
     }
 
+    python_array_typecodes = {
+        'int8':   "'b'",
+        'uint8':  "'B'",
+        'int16':  "'h'",
+        'uint16': "'H'",
+        'int32':  "'i'",
+        'uint32': "'I'",
+        'int64':  "'q'",
+        'uint64': "'Q'",
+        'float':  "'f'",
+        'bool':   'None',
+        'char':   'None',
+        'string': 'None'
+    }
+
     python_default_item_values = {
         'int8':   '0',
         'uint8':  '0',
@@ -150,6 +165,9 @@ class PythonElement(common.Element):
 
         return f
 
+    def get_python_array_typecode(self):
+        return PythonElement.python_array_typecodes[self.get_type()]
+
     def get_python_default_item_value(self):
         value = PythonElement.python_default_item_values[self.get_type()]
 
@@ -2,7 +2,11 @@
 # -*- coding: utf-8 -*-
 
 import sys
-from ip_connection import create_char, create_char_list, create_string, pack_payload, unpack_payload
+import struct
+import threading
+import time
+from collections import namedtuple
+from ip_connection import IPConnection, Device, Error, create_char, create_char_list, create_string, create_response_expected, pack_payload, unpack_payload, get_payload_codec
 
 def b(value):
     if sys.hexversion < 0x03000000:
@@ -148,6 +152,10 @@ assert(pack_payload(('abc',), '5s') == b('abc\0\0'))
 assert(pack_payload(('abc\xff',), '5s') == b('abc\xff\0'))
 assert(pack_payload(('a',), 'c') == b('a'))
 assert(pack_payload((['a', 'b', 'c'],), '3c') == b('abc'))
+assert(pack_payload((True,), '!') == b('\x01'))
+assert(pack_payload(([True, False, True],), '3!') == b('\x05'))
+assert(pack_payload(([False] * 8 + [True],), '9!') == b('\x00\x01'))
+assert(pack_payload((1, [2, 3], 4), 'B 2H B') == b('\x01\x02\x00\x03\x00\x04'))
 
 #
 # unpack_payload
@@ -159,3 +167,810 @@ assert(unpack_payload(b('abc\xff\0'), '5s') == 'abc\xff')
 assert(unpack_payload(b('a'), 'c') == 'a')
 assert(unpack_payload(b('abc'), '3c') == ('a', 'b', 'c'))
 assert(unpack_payload(b('a\xff\0'), '3c') == ('a', '\xff', '\0'))
+assert(unpack_payload(b('\x01'), '!') == True)
+assert(unpack_payload(b('\x05'), '3!') == (True, False, True))
+assert(unpack_payload(b('\x00\x01'), '9!') == (False,) * 8 + (True,))
+assert(unpack_payload(b('\x01\x02\x00\x03\x00\x04'), 'B 2H B') == (1, (2, 3), 4))
+assert(unpack_payload(b('\x01\x02\x00'), 'B H') == (1, 2))
+assert(get_payload_codec('B H').unpack(b('\xff\xff\x01\x02\x00'), 2) == (1, 2))
+
+#
+# receive buffer
+#
+
+class FakeSocket(object):
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def recv_into(self, buffer, size):
+        if len(self.chunks) == 0:
+            return 0
+
+        chunk = self.chunks.pop(0)
+        buffer[:len(chunk)] = chunk
+
+        return len(chunk)
+
+packet1 = b('\x01\x00\x00\x00\x0a\x01\x10\x00\x2a\x00')
+packet2 = b('\x02\x00\x00\x00\x08\x02\x20\x00')
+stream = packet1 + packet2 + packet1
+sock = FakeSocket([stream[:3], stream[3:12], stream[12:]])
+receive_buffer = IPConnection.ReceiveBuffer()
+packets = []
+
+while receive_buffer.receive(sock) > 0:
+    while True:
+        packet = receive_buffer.get_packet()
+
+        if packet == None:
+            break
+
+        packets.append(packet)
+
+assert(packets == [packet1, packet2, packet1])
+
+sock = FakeSocket([packet1 * 800 + packet2[:5], packet2[5:] + packet1 * 800])
+receive_buffer = IPConnection.ReceiveBuffer()
+packets = []
+
+while receive_buffer.receive(sock) > 0:
+    while True:
+        packet = receive_buffer.get_packet()
+
+        if packet == None:
+            break
+
+        packets.append(packet)
+
+assert(packets == [packet1] * 800 + [packet2] + [packet1] * 800)
+
+#
+# stream out
+#
+
+StreamLowLevel = namedtuple('StreamLowLevel', ['stream_length', 'stream_chunk_offset', 'stream_chunk_data'])
+
+class FakeStream(object):
+    def __init__(self, data, chunk_cardinality, first_chunk_offset=0):
+        self.data = data
+        self.chunk_cardinality = chunk_cardinality
+        self.chunk_offset = first_chunk_offset
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def read_low_level(self):
+        with self.lock:
+            chunk_offset = self.chunk_offset
+            chunk_data = self.data[chunk_offset:chunk_offset + self.chunk_cardinality]
+            chunk_data += (0,) * (self.chunk_cardinality - len(chunk_data))
+            self.chunk_offset += self.chunk_cardinality
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.in_flight, self.max_in_flight)
+
+            if self.chunk_offset >= len(self.data):
+                self.chunk_offset = 0
+
+        time.sleep(0.005) # round trip
+
+        with self.lock:
+            self.in_flight -= 1
+
+        return StreamLowLevel(len(self.data), chunk_offset, chunk_data)
+
+for max_pending_device_requests in [1, 4]:
+    ipcon = IPConnection()
+    ipcon.set_max_pending_requests(max_pending_device_requests)
+    device = Device('XYZ', ipcon, -1, 'Fake Device')
+
+    fake = FakeStream(tuple(range(1000)), 62)
+    ret, data = device.read_stream_out(fake.read_low_level, (), 'stream', 'Stream', 1000, 62, (1 << 16) - 1, 'H')
+    assert(data == tuple(range(1000)))
+    assert(fake.calls == 17)
+    assert(fake.max_in_flight <= max_pending_device_requests) # sliding window of requests
+    assert(ret.stream_chunk_offset == 992)
+
+    fake = FakeStream(tuple(range(130)), 60)
+    ret, data = device.read_stream_out(fake.read_low_level, (), 'stream', 'Stream', None, 60, None, None)
+    assert(data == tuple(range(130)))
+
+    fake = FakeStream((), 60)
+    ret, data = device.read_stream_out(fake.read_low_level, (), 'stream', 'Stream', None, 60, None, 'B')
+    assert(data == ())
+
+    device.set_stream_result_type(Device.STREAM_RESULT_TYPE_ARRAY)
+
+    fake = FakeStream(tuple(range(200)), 30)
+    ret, data = device.read_stream_out(fake.read_low_level, (), 'stream', 'Stream', 200, 30, (1 << 16) - 1, 'h')
+    assert(data.typecode == 'h')
+    assert(data.tolist() == list(range(200)))
+
+    device.set_stream_result_type(Device.STREAM_RESULT_TYPE_TUPLE)
+
+    fake = FakeStream(tuple(range(200)), 30, first_chunk_offset=60)
+
+    try:
+        device.read_stream_out(fake.read_low_level, (), 'stream', 'Stream', 200, 30, (1 << 16) - 1, 'h')
+        assert(False)
+    except Error as e:
+        assert(e.value == Error.STREAM_OUT_OF_SYNC)
+
+    assert(fake.chunk_offset == 0) # remaining stream was discarded
+
+#
+# stream out callback
+#
+
+
+ipcon = IPConnection()
+device = Device('XYZ', ipcon, -1, 'Fake Device')
+device.override_callback_format(12, (74, 'H 32H'))
+device.override_high_level_callback(-12, (('stream_chunk_offset', 'stream_chunk_data'), {'fixed_length': 100, 'single_chunk': False, 'typecode': 'H'}))
+ipcon.devices[device.uid] = device
+frames = []
+device.registered_callbacks[-12] = frames.append
+
+def image_packet(chunk_offset):
+    chunk_data = [(chunk_offset + i) % 100 for i in range(32)]
+
+    return struct.pack('<IBBBBH32H', device.uid, 74, 12, 0, 0, chunk_offset, *chunk_data)
+
+for chunk_offset in [64, 96, 0, 32, 64, 96, 0, 32, 96, 0, 32, 64, 96]:
+    ipcon.dispatch_packet(image_packet(chunk_offset))
+
+assert(frames == [tuple(range(100)), None, tuple(range(100))])
+
+device.set_stream_result_type(Device.STREAM_RESULT_TYPE_ARRAY)
+frames = []
+device.registered_callbacks[-12] = frames.append
+
+for chunk_offset in [0, 32, 64, 96, 0, 32, 64, 96]:
+    ipcon.dispatch_packet(image_packet(chunk_offset))
+
+assert(len(frames) == 2 and frames[0] is not frames[1])
+assert(frames[0].typecode == 'H' and frames[0].tolist() == list(range(100)))
+
+#
+# shared tables
+#
+
+ipcon = IPConnection()
+device1 = Device('XYZ', ipcon, -1, 'Fake Device')
+device2 = Device('XYZA', ipcon, -1, 'Fake Device')
+
+assert(device1.response_expected is device2.response_expected)
+assert(device1.callback_formats is device2.callback_formats)
+
+device1.override_response_expected(1, Device.RESPONSE_EXPECTED_FALSE)
+device1.set_response_expected(1, True)
+device1.override_callback_format(10, (10, 'H'))
+
+assert(device1.get_response_expected(1))
+assert(device2.response_expected[1] == Device.RESPONSE_EXPECTED_INVALID_FUNCTION_ID)
+assert(device2.callback_formats == {} and Device.default_callback_formats == {})
+
+try:
+    device1.some_attribute = 1
+    assert(False)
+except AttributeError:
+    pass
+
+#
+# identity registry
+#
+
+def enumerate_packet(device, device_identifier, enumeration_type):
+    return struct.pack('<IBBBB8s8sc3B3BHB', device.uid, 34, IPConnection.CALLBACK_ENUMERATE, 0, 0,
+                       b(device.uid_string), b('0'), b('a'), 1, 0, 0, 2, 0, 0, device_identifier, enumeration_type)
+
+class FakeMaster(Device):
+    default_response_expected = create_response_expected(Device.default_response_expected, {
+        255: Device.RESPONSE_EXPECTED_ALWAYS_TRUE # get_identity
+    })
+
+ipcon = IPConnection()
+ipcon.set_identity_registry(True)
+device = FakeMaster('XYZ', ipcon, 13, 'Fake Master')
+ipcon.devices[device.uid] = device
+
+assert(ipcon.get_identity_registry())
+
+ipcon.handle_response(enumerate_packet(device, 13, IPConnection.ENUMERATION_TYPE_AVAILABLE))
+device.check_validity() # no request, the IP Connection is not connected
+
+ipcon.handle_response(enumerate_packet(device, 14, IPConnection.ENUMERATION_TYPE_CONNECTED))
+
+try:
+    device.check_validity()
+    assert(False)
+except Error as e:
+    assert(e.value == Error.WRONG_DEVICE_TYPE)
+
+ipcon.handle_response(enumerate_packet(device, 13, IPConnection.ENUMERATION_TYPE_DISCONNECTED))
+
+try:
+    device.check_validity() # not in the identity registry anymore, needs a request
+    assert(False)
+except Error as e:
+    assert(e.value == Error.NOT_CONNECTED)
+
+ipcon.set_identity_registry(False)
+assert(not ipcon.get_identity_registry())
+
+#
+# callback dispatch pool
+#
+
+
+ipcon = IPConnection()
+ipcon.callback = IPConnection.CallbackContext()
+ipcon.callback.packet_dispatch_allowed = True
+fast = Device('XYZ', ipcon, -1, 'Fake Accelerometer')
+fast.override_callback_format(10, (10, 'H'))
+slow = Device('XYZA', ipcon, -1, 'Fake Button')
+slow.override_callback_format(20, (9, 'B'))
+ipcon.devices[fast.uid] = fast
+ipcon.devices[slow.uid] = slow
+calls = []
+release = threading.Event()
+
+def fast_callback(value):
+    release.wait()
+    calls.append(('fast', value))
+
+fast.registered_callbacks[10] = fast_callback
+slow.registered_callbacks[20] = lambda value: calls.append(('slow', value))
+
+def callback_packet(device, function_id, form, value):
+    length = 8 + struct.calcsize('<' + form)
+
+    return struct.pack('<IBBBB' + form, device.uid, length, function_id, 0, 0, value)
+
+ipcon.set_callback_dispatch_pool(1, 5, IPConnection.CALLBACK_OVERFLOW_POLICY_DROP_OLDEST)
+assert(ipcon.get_callback_dispatch_pool() == (1, 5, IPConnection.CALLBACK_OVERFLOW_POLICY_DROP_OLDEST))
+ipcon.handle_response(callback_packet(fast, 10, 'H', 0))
+time.sleep(0.05) # let the first callback start
+
+for i in range(1, 10):
+    ipcon.handle_response(callback_packet(fast, 10, 'H', i))
+
+ipcon.handle_response(callback_packet(slow, 20, 'B', 1))
+time.sleep(0.05)
+assert(ipcon.get_callback_queue_statistics() == [(6, 4)]) # first callback is in progress
+release.set()
+
+while len(calls) < 7:
+    time.sleep(0.01)
+
+# button callback is not starved, accelerometer callbacks stay in order
+assert(calls == [('fast', 0), ('fast', 5), ('slow', 1), ('fast', 6), ('fast', 7), ('fast', 8), ('fast', 9)])
+
+release.clear()
+calls = []
+ipcon.set_callback_dispatch_pool(2, 5, IPConnection.CALLBACK_OVERFLOW_POLICY_COALESCE_LATEST)
+ipcon.handle_response(callback_packet(fast, 10, 'H', 0))
+time.sleep(0.05) # let the first callback start
+
+for i in range(1, 10):
+    ipcon.handle_response(callback_packet(fast, 10, 'H', i))
+
+release.set()
+
+while len(calls) < 2:
+    time.sleep(0.01)
+
+time.sleep(0.05)
+assert(calls == [('fast', 0), ('fast', 9)])
+assert(sum([drop_count for depth, drop_count in ipcon.get_callback_queue_statistics()]) == 8)
+
+ipcon.set_callback_dispatch_pool(0)
+
+# no device callback is called after disconnect returned
+import socket
+
+server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+server.bind(('127.0.0.1', 0))
+server.listen(1)
+server.settimeout(5)
+
+ipcon = IPConnection()
+ipcon.set_callback_dispatch_pool(2)
+slow = Device('XYZ', ipcon, -1, 'Fake Slow Device')
+slow.override_callback_format(10, (10, 'H'))
+ipcon.devices[slow.uid] = slow
+events = []
+started = threading.Event()
+
+def slow_callback(value):
+    started.set()
+    time.sleep(0.2)
+    events.append(('callback', value))
+
+slow.registered_callbacks[10] = slow_callback
+ipcon.register_callback(IPConnection.CALLBACK_DISCONNECTED, lambda reason: events.append(('disconnected', reason)))
+
+assert(ipcon.callback_dispatch_pool == None) # the threads are started on connect
+
+ipcon.connect('127.0.0.1', server.getsockname()[1])
+peer = server.accept()[0]
+shards = ipcon.callback_dispatch_pool
+
+assert(len(shards) == 2)
+
+for i in range(3):
+    peer.sendall(callback_packet(slow, 10, 'H', i))
+
+assert(started.wait(5))
+ipcon.disconnect()
+
+# the running callback returned before the disconnected callback, the queued ones were dropped
+assert(events == [('callback', 0), ('disconnected', IPConnection.DISCONNECT_REASON_REQUEST)])
+assert(not any([shard.thread.is_alive() for shard in shards]))
+assert(ipcon.callback_dispatch_pool == None)
+
+time.sleep(0.3)
+assert(len(events) == 2)
+peer.close()
+
+ipcon.connect('127.0.0.1', server.getsockname()[1])
+peer = server.accept()[0]
+
+assert(len(ipcon.callback_dispatch_pool) == 2 and ipcon.callback_dispatch_pool[0] is not shards[0])
+
+del events[:]
+peer.sendall(callback_packet(slow, 10, 'H', 5))
+deadline = time.time() + 5
+
+while len(events) == 0:
+    assert(time.time() < deadline)
+    time.sleep(0.01)
+
+assert(events == [('callback', 5)])
+ipcon.disconnect()
+
+peer.close()
+server.close()
+
+#
+# connection pool
+#
+
+if sys.hexversion >= 0x03050000: # the pool requires Python 3.5
+    import socket
+    from ip_connection_pool import IPConnectionPool
+
+    def wait_for(condition):
+        deadline = time.time() + 5
+
+        while not condition():
+            assert(time.time() < deadline)
+            time.sleep(0.01)
+
+    def record(events, i, kind):
+        return lambda *args: events.append((i, kind) + args[:1])
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(8)
+    server.settimeout(5)
+
+    pool = IPConnectionPool()
+    thread_count = threading.active_count()
+    events = []
+    ipcons = [pool.create_ip_connection() for i in range(3)]
+
+    for i, ipcon in enumerate(ipcons):
+        ipcon.set_auto_reconnect(i == 2)
+        ipcon.register_callback(IPConnection.CALLBACK_ENUMERATE, record(events, i, 'enumerate'))
+        ipcon.register_callback(IPConnection.CALLBACK_CONNECTED, record(events, i, 'connected'))
+        ipcon.register_callback(IPConnection.CALLBACK_DISCONNECTED, record(events, i, 'disconnected'))
+        ipcon.connect('127.0.0.1', server.getsockname()[1])
+
+    peers = [server.accept()[0] for ipcon in ipcons]
+
+    assert(threading.active_count() == thread_count) # no threads per connection
+    assert(pool.get_ip_connections() == ipcons)
+
+    for peer in peers:
+        peer.sendall(enumerate_packet(device, 13, IPConnection.ENUMERATION_TYPE_AVAILABLE))
+
+    wait_for(lambda: len(events) == 6)
+    assert(sorted(events) == [(i, kind, value) for i in range(3)
+                              for kind, value in [('connected', IPConnection.CONNECT_REASON_REQUEST), ('enumerate', 'XYZ')]])
+
+    del events[:]
+    peers[1].close()
+    peers[2].close()
+    reconnected_peer = server.accept()[0] # auto-reconnect of the third IP Connection
+
+    wait_for(lambda: len(events) == 3)
+    assert(sorted(events) == [(1, 'disconnected', IPConnection.DISCONNECT_REASON_SHUTDOWN),
+                              (2, 'connected', IPConnection.CONNECT_REASON_AUTO_RECONNECT),
+                              (2, 'disconnected', IPConnection.DISCONNECT_REASON_SHUTDOWN)])
+    assert([ipcon.get_connection_state() for ipcon in ipcons] == [IPConnection.CONNECTION_STATE_CONNECTED,
+                                                                   IPConnection.CONNECTION_STATE_DISCONNECTED,
+                                                                   IPConnection.CONNECTION_STATE_CONNECTED])
+
+    pool.close()
+
+    assert(not pool.io_thread.is_alive() and not pool.callback_thread.is_alive())
+    assert([ipcon.get_connection_state() for ipcon in ipcons] == [IPConnection.CONNECTION_STATE_DISCONNECTED] * 3)
+
+    for peer in [peers[0], reconnected_peer, server]:
+        peer.close()
+
+    # an exception in a callback of one IP Connection doesn't affect the others
+    import io
+
+    def raise_error(*args):
+        raise RuntimeError('callback failed')
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(8)
+    server.settimeout(5)
+
+    pool = IPConnectionPool()
+    events = []
+    failing = pool.create_ip_connection()
+    working = pool.create_ip_connection()
+    stderr = sys.stderr
+    sys.stderr = io.StringIO()
+
+    try:
+        failing.register_callback(IPConnection.CALLBACK_CONNECTED, raise_error)
+        failing.connect('127.0.0.1', server.getsockname()[1])
+        working.register_callback(IPConnection.CALLBACK_CONNECTED, record(events, 1, 'connected'))
+        working.register_callback(IPConnection.CALLBACK_ENUMERATE, record(events, 1, 'enumerate'))
+        working.connect('127.0.0.1', server.getsockname()[1])
+        peers = [server.accept()[0] for i in range(2)]
+
+        peers[1].sendall(enumerate_packet(device, 13, IPConnection.ENUMERATION_TYPE_AVAILABLE))
+        wait_for(lambda: len(events) == 2)
+
+        assert(events == [(1, 'connected', IPConnection.CONNECT_REASON_REQUEST), (1, 'enumerate', 'XYZ')])
+        assert('RuntimeError: callback failed' in sys.stderr.getvalue())
+
+        working.disconnect()
+        failing.disconnect()
+        pool.close()
+    finally:
+        sys.stderr = stderr
+
+    for peer in peers + [server]:
+        peer.close()
+
+#
+# write coalescing
+#
+
+try:
+    import queue # Python 3
+except ImportError:
+    import Queue as queue # Python 2
+
+class RecordingSocket(object):
+    def __init__(self):
+        self.sends = []
+
+    def send(self, data):
+        self.sends.append(memoryview(data).tobytes())
+
+        return len(data)
+
+class FakeLEDStrip(Device):
+    default_response_expected = create_response_expected(Device.default_response_expected, {
+        1: Device.RESPONSE_EXPECTED_FALSE # set_value
+    })
+
+ipcon = IPConnection()
+ipcon.socket = RecordingSocket()
+device = FakeLEDStrip('XYZ', ipcon, -1, 'Fake LED Strip')
+
+def set_value(value):
+    ipcon.send_request(device, 1, (value,), 'H', 0, '') # 10 bytes
+
+for i in range(3):
+    set_value(i)
+
+assert(len(ipcon.socket.sends) == 3) # disabled by default
+assert(ipcon.get_send_coalescing() == (0, 1400))
+
+ipcon.socket = RecordingSocket()
+
+with ipcon.batch():
+    with ipcon.batch():
+        for i in range(3):
+            set_value(i)
+
+    assert(len(ipcon.socket.sends) == 0)
+
+assert(len(ipcon.socket.sends) == 1 and len(ipcon.socket.sends[0]) == 30)
+
+ipcon.socket = RecordingSocket()
+ipcon.set_send_coalescing(0, 20)
+
+with ipcon.batch():
+    for i in range(5):
+        set_value(i)
+
+    assert([len(data) for data in ipcon.socket.sends] == [30]) # byte budget exceeded
+
+    ipcon.flush()
+
+    assert([len(data) for data in ipcon.socket.sends] == [30, 20])
+
+assert([len(data) for data in ipcon.socket.sends] == [30, 20])
+
+ipcon.socket = RecordingSocket()
+ipcon.set_send_coalescing(0.05)
+ipcon.disconnect_probe_queue = queue.Queue()
+probe_thread = threading.Thread(target=ipcon.disconnect_probe_loop, args=(ipcon.disconnect_probe_queue,))
+probe_thread.daemon = True
+probe_thread.start()
+
+for i in range(3):
+    set_value(i)
+
+assert(len(ipcon.socket.sends) == 0)
+time.sleep(0.2)
+assert(len(ipcon.socket.sends) == 1 and len(ipcon.socket.sends[0]) == 30) # window expired
+
+ipcon.disconnect_probe_queue.put(True)
+probe_thread.join()
+
+#
+# submit and call_many
+#
+
+ipcon = IPConnection()
+
+future = ipcon.submit(lambda a, b: a + b, 1, 2)
+assert(future.wait(5) and future.done())
+assert(future.result() == 3)
+
+future = ipcon.submit(lambda: 1 / 0)
+
+try:
+    future.result(5)
+    assert(False)
+except ZeroDivisionError:
+    pass
+
+release = threading.Event()
+future = ipcon.submit(release.wait)
+
+try:
+    future.result(0.01)
+    assert(False)
+except Error as e:
+    assert(e.value == Error.TIMEOUT)
+
+assert(not future.done())
+release.set()
+assert(future.result(5))
+
+def sleep_and_return(value):
+    time.sleep(0.2)
+
+    return value
+
+ipcon = IPConnection()
+
+assert(ipcon.call_many([(sleep_and_return, 1)]) == [1])
+
+# the idle worker from the first call doesn't take over all following calls
+start = time.time()
+assert(ipcon.call_many([(sleep_and_return, i) for i in range(10)]) == list(range(10)))
+assert(time.time() - start < 1)
+
+start = time.time()
+assert(ipcon.call_many([(sleep_and_return, i) for i in range(10)]) == list(range(10)))
+assert(time.time() - start < 1)
+
+try:
+    ipcon.call_many([(sleep_and_return, 1), lambda: 1 / 0])
+    assert(False)
+except ZeroDivisionError:
+    pass
+
+#
+# max pending requests
+#
+
+try:
+    ipcon.set_max_pending_requests(0)
+    assert(False)
+except ValueError:
+    pass
+
+try:
+    ipcon.set_max_pending_requests(1, 0)
+    assert(False)
+except ValueError:
+    pass
+
+assert(ipcon.get_max_pending_requests() == (1, None))
+
+ipcon = IPConnection()
+ipcon.set_max_pending_requests(4, 2)
+assert(ipcon.get_max_pending_requests() == (4, 2))
+
+start = time.time()
+ipcon.call_many([(sleep_and_return, i) for i in range(4)]) # at most 2 request workers
+assert(time.time() - start > 0.35)
+
+def get_identity(ipcon, device):
+    return ipcon.send_request(device, 255, (), '', 33, '8s 8s c 3B 3B H')
+
+def answer(ipcon, request):
+    uid, _, function_id, sequence_number_and_options = struct.unpack('<IBBB', request[:7])
+
+    ipcon.handle_response(struct.pack('<IBBBB8s8sc3B3BH', uid, 33, function_id, sequence_number_and_options, 0,
+                                      b('XYZ'), b('0'), b('a'), 1, 0, 0, 2, 0, 0, 13))
+
+for per_device, expected_sends in [(1, 1), (2, 2)]:
+    ipcon = IPConnection()
+    ipcon.socket = RecordingSocket()
+    ipcon.set_max_pending_requests(per_device)
+    device = FakeMaster('XYZ', ipcon, 13, 'Fake Master')
+    ipcon.devices[device.uid] = device
+
+    futures = [ipcon.submit(get_identity, ipcon, device) for i in range(2)]
+    time.sleep(0.1)
+    assert(len(ipcon.socket.sends) == expected_sends)
+
+    answer(ipcon, ipcon.socket.sends[0])
+    wait_deadline = time.time() + 5
+
+    while len(ipcon.socket.sends) < 2:
+        assert(time.time() < wait_deadline)
+        time.sleep(0.01)
+
+    answer(ipcon, ipcon.socket.sends[1])
+
+    for future in futures:
+        assert(future.result(5)[5] == 13)
+
+#
+# asyncio IP Connection
+#
+
+if sys.hexversion >= 0x03050000: # the asyncio variant requires Python 3.5
+    import asyncio
+    from async_ip_connection import AsyncIPConnection, AsyncDevice
+
+    FUNCTION_GET_DOUBLE = 1
+    CALLBACK_VALUE = 10
+
+    # answers get_double with the doubled argument and enumerate with one device
+    class FakeBrickd(asyncio.Protocol):
+        def connection_made(self, transport):
+            self.transport = transport
+            self.data = b''
+            self.requests = []
+            fake_brickds.append(self)
+
+        def data_received(self, data):
+            self.data += data
+
+            while len(self.data) >= 8 and len(self.data) >= self.data[4]:
+                request = self.data[:self.data[4]]
+                self.data = self.data[self.data[4]:]
+                uid, length, function_id, sequence_number_and_options = struct.unpack('<IBBB', request[:7])
+
+                self.requests.append(function_id)
+
+                if function_id == IPConnection.FUNCTION_ENUMERATE:
+                    self.transport.write(enumerate_packet(device, 13, IPConnection.ENUMERATION_TYPE_AVAILABLE))
+                elif function_id == FUNCTION_GET_DOUBLE:
+                    value = struct.unpack('<h', request[8:10])[0]
+
+                    self.transport.write(struct.pack('<IBBBBh', uid, 10, function_id, sequence_number_and_options, 0, value * 2))
+
+    class FakeAsyncDevice(AsyncDevice):
+        default_response_expected = create_response_expected(Device.default_response_expected, {
+            FUNCTION_GET_DOUBLE: Device.RESPONSE_EXPECTED_ALWAYS_TRUE
+        })
+
+        def __init__(self, uid, ipcon):
+            AsyncDevice.__init__(self, uid, ipcon, -1, 'Fake Async Device')
+
+            self.override_callback_format(CALLBACK_VALUE, (10, 'H'))
+            ipcon.add_device(self)
+
+        def get_double(self, value):
+            return self.ipcon.send_request(self, FUNCTION_GET_DOUBLE, (value,), 'h', 10, 'h')
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    def run(coroutine):
+        return loop.run_until_complete(asyncio.wait_for(coroutine, 5))
+
+    fake_brickds = []
+    server = loop.run_until_complete(loop.create_server(FakeBrickd, '127.0.0.1', 0))
+    events = []
+
+    ipcon = AsyncIPConnection()
+    ipcon.register_callback(IPConnection.CALLBACK_CONNECTED, lambda reason: events.append(('connected', reason)))
+    ipcon.register_callback(IPConnection.CALLBACK_DISCONNECTED, lambda reason: events.append(('disconnected', reason)))
+    device_a = FakeAsyncDevice('XYZ', ipcon)
+    device_b = FakeAsyncDevice('XYZA', ipcon)
+
+    run(ipcon.connect('127.0.0.1', server.sockets[0].getsockname()[1]))
+    run(asyncio.sleep(0.05))
+
+    assert(ipcon.get_connection_state() == IPConnection.CONNECTION_STATE_CONNECTED)
+    assert(events == [('connected', IPConnection.CONNECT_REASON_REQUEST)])
+    assert(len(fake_brickds) == 1)
+
+    try:
+        run(ipcon.connect('127.0.0.1', server.sockets[0].getsockname()[1]))
+        assert(False)
+    except Error as e:
+        assert(e.value == Error.ALREADY_CONNECTED)
+
+    # getter round trip
+    assert(run(device_a.get_double(21)) == 42)
+    assert(run(device_b.get_double(-5)) == -10)
+
+    # call_many, requests to different devices are in-flight at the same time
+    assert(run(device_a.call_many([(device_a.get_double, 1), (device_b.get_double, 2), (device_a.get_double, 3)])) == [2, 4, 6])
+
+    # callbacks
+    enumerations = ipcon.callbacks(IPConnection.CALLBACK_ENUMERATE)
+    values = device_a.callbacks(CALLBACK_VALUE, max_queue_size=2)
+
+    run(ipcon.enumerate())
+    assert(run(enumerations.__anext__())[0] == 'XYZ')
+
+    for value in range(3):
+        fake_brickds[0].transport.write(callback_packet(device_a, CALLBACK_VALUE, 'H', value))
+
+    run(asyncio.sleep(0.05))
+
+    assert(run(values.__anext__()) == (1,)) # the oldest value was dropped
+    assert(run(values.__anext__()) == (2,))
+    assert(values.drop_count == 1)
+
+    values.close()
+    enumerations.close()
+
+    try:
+        run(values.__anext__())
+        assert(False)
+    except StopAsyncIteration:
+        pass
+
+    assert(CALLBACK_VALUE not in device_a.registered_callbacks)
+
+    # send waits for the write buffer to drain while brickd is not reading
+    fake_brickds[0].data_received = lambda data: None
+    fake_brickds[0].transport.pause_reading()
+
+    sending = loop.create_task(ipcon.send(b'\x00' * 32 * 1024 * 1024))
+    run(asyncio.sleep(0.1))
+
+    assert(not sending.done())
+
+    fake_brickds[0].transport.resume_reading()
+    run(sending)
+
+    run(ipcon.disconnect())
+    run(asyncio.sleep(0.05))
+
+    assert(ipcon.get_connection_state() == IPConnection.CONNECTION_STATE_DISCONNECTED)
+    assert(events[-1] == ('disconnected', IPConnection.DISCONNECT_REASON_REQUEST))
+
+    try:
+        run(device_a.get_double(1))
+        assert(False)
+    except Error as e:
+        assert(e.value == Error.NOT_CONNECTED)
+
+    server.close()
+    run(server.wait_closed())
+    loop.close()
@@ -57,6 +57,12 @@ class PythonTester(common.Tester):
 
         self.python = python
 
+    def handle_source(self, path, extra):
+        if self.python == 'python' and os.path.basename(path).startswith('async_'):
+            return # the asyncio variants require Python 3.5
+
+        common.Tester.handle_source(self, path, extra)
+
     def test(self, cookie, path, extra):
         args = [self.python,
                 '-c',
@@ -70,6 +76,12 @@ class PylintTester(common.Tester):
 
         self.python = python
 
+    def handle_source(self, path, extra):
+        if self.python == 'python' and os.path.basename(path).startswith('async_'):
+            return # the asyncio variants require Python 3.5
+
+        common.Tester.handle_source(self, path, extra)
+
     def test(self, cookie, path, extra):
         if self.python == 'python3':
             with open(path, 'r') as f:
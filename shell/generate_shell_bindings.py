@@ -68,34 +68,25 @@ class ShellBindingsPacket(shell_common.ShellPacket):
 class ShellBindingsDevice(shell_common.ShellDevice):
     def get_shell_class(self):
         template = """
-class {0}(Device):"""
+class {0}(Device):
+	__slots__ = []
+"""
 
         return template.format(self.get_shell_class_name())
 
-    def get_shell_init_method(self):
-        template = """
-	def __init__(self, uid, ipcon):
-		Device.__init__(self, uid, ipcon, {1}, DEVICE_DISPLAY_NAMES[{1}])
-
-{0}
-"""
+    def get_shell_response_expected(self):
         response_expected = []
         mapping = {'always_true': 1, 'true': 2, 'false': 3}
 
         for packet in self.get_packets('function'):
-            response_expected.append('re[{0}] = {1}'.format(packet.get_function_id(),
-                                                            mapping[packet.get_response_expected()]))
+            response_expected.append('{0}: {1}'.format(packet.get_function_id(),
+                                                       mapping[packet.get_response_expected()]))
 
-        if len(response_expected) > 0:
-            return template.format('\t\tre = self.response_expected\n\t\t' + '; '.join(response_expected),
-                                   self.get_device_identifier())
-        else:
-            return template.format('',
-                                   self.get_device_identifier())
+        return '\tdefault_response_expected = create_response_expected(Device.default_response_expected, {{{0}}})\n'.format(', '.join(response_expected))
 
     def get_shell_callback_formats(self):
         callbacks = []
-        template = "cf[{0}] = ({1}, '{2}')"
+        template = "{0}: ({1}, '{2}')"
 
         for packet in self.get_packets('callback'):
             callbacks.append(template.format(packet.get_function_id(),
@@ -103,13 +94,13 @@ class {0}(Device):"""
                                              packet.get_shell_format_list('out')))
 
         if len(callbacks) > 0:
-            return '\t\tcf = self.callback_formats\n\t\t' + '; '.join(callbacks) + '\n'
+            return '\tdefault_callback_formats = {{{0}}}\n'.format(', '.join(callbacks))
         else:
-            return '\n'
+            return ''
 
     def get_shell_high_level_callbacks(self):
         high_level_callbacks = []
-        template = "hlc[{0}] = [{3}, {{'fixed_length': {1}, 'single_chunk': {2}}}, None]"
+        template = "{0}: ({3}, {{'fixed_length': {1}, 'single_chunk': {2}}})"
 
         for packet in self.get_packets('callback'):
             stream = packet.get_high_level('stream_*')
@@ -126,9 +117,18 @@ class {0}(Device):"""
                                                             repr(tuple(roles))))
 
         if len(high_level_callbacks) > 0:
-            return '\t\thlc = self.high_level_callbacks\n\t\t' + '; '.join(high_level_callbacks) + '\n'
+            return '\tdefault_high_level_callbacks = {{{0}}}\n'.format(', '.join(high_level_callbacks))
         else:
-            return '\n'
+            return ''
+
+    def get_shell_init_method(self):
+        template = """
+	def __init__(self, uid, ipcon):
+		Device.__init__(self, uid, ipcon, {0}, DEVICE_DISPLAY_NAMES[{0}])
+
+"""
+
+        return template.format(self.get_device_identifier())
 
     def get_shell_add_device(self):
         return '\t\tipcon.add_device(self)\n'
@@ -541,9 +541,10 @@ def dispatch_{0}_{1}(ctx, argv):
 
     def get_shell_source(self):
         source  = self.get_shell_class()
-        source += self.get_shell_init_method()
+        source += self.get_shell_response_expected()
         source += self.get_shell_callback_formats()
         source += self.get_shell_high_level_callbacks()
+        source += self.get_shell_init_method()
         source += self.get_shell_add_device()
         source += self.get_shell_call_header()
         source += self.get_shell_call_functions()
@@ -555,6 +556,8 @@ def dispatch_{0}_{1}(ctx, argv):
         return source
 
 class ShellBindingsGenerator(shell_common.ShellGeneratorTrait, common.BindingsGenerator):
+    incremental_extra_inputs = ['../python/ip_connection.py']
+
     def get_device_class(self):
         return ShellBindingsDevice
 
@@ -8,6 +8,8 @@ if sys.hexversion < 0x3040000:
     sys.exit(1)
 
 import os
+import traceback
+import multiprocessing
 import importlib.util
 import importlib.machinery
 
@@ -54,16 +56,68 @@ def modify_items(kind, active_items, all_items, action, item):
 
     return active_items
 
+def run_binding(binding):
+    output, success, exc = common.run_captured(test_binding, binding)
+
+    if exc != None:
+        success = False
+
+        if not isinstance(exc, SystemExit): # Tester exits on unexpected errors
+            output += ''.join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+
+    return binding, output, success
+
+def test_binding(binding):
+    try:
+        module = importlib.import_module('generators.{0}.test_{0}_bindings'.format(binding))
+    except ImportError: # FIXME: Python 3.6 has ModuleNotFoundError, which would be better to use here, but Debian Stretch has only Python 3.5
+        print('\033[01;36m### tests missing\033[0m')
+        return True
+
+    success = module.test(os.path.join(generators_dir, binding))
+
+    if not isinstance(success, bool):
+        print('error: test_{0}_bindings.py returns wrong type from its test() function'.format(binding))
+
+    return success
+
+def run_bindings(bindings, jobs):
+    pool = multiprocessing.Pool(jobs, initializer=common.init_worker, initargs=(common.get_worker_options(),))
+
+    try:
+        for binding in bindings:
+            print('\033[01;32m>>> running tests for {0} bindings\033[0m'.format(binding))
+
+        # print the output of every binding as a whole, in the order the bindings finish
+        for binding, output, success in pool.imap_unordered(run_binding, bindings):
+            prefix = '[{0}] '.format(binding)
+
+            for line in output.splitlines():
+                print(prefix + line)
+
+            if not success:
+                print('\033[01;31m>>> tests for {0} bindings failed\033[0m'.format(binding))
+
+                return 1
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return 0
+
 # FIXME: test custom bindings too
 
 def main(args):
+    common.tester_processes = args.processes
+    common.enable_tester_cache = args.cache
+
     all_bindings = []
 
     for binding in os.listdir(generators_dir):
-        if not os.path.isdir(binding) or os.path.exist(os.path.join(generators_dir, binding, 'skip_test_all')):
+        if not os.path.isdir(binding) or os.path.exists(os.path.join(generators_dir, binding, 'skip_test_all')):
             continue
 
-        if binding not in ['.git', '.m2', '.vscode', '__pycache__', 'configs', 'docker']:
+        if binding not in ['.cache', '.git', '.m2', '.vscode', '__pycache__', 'configs', 'docker']:
             all_bindings.append(binding)
 
     all_bindings = sorted(all_bindings)
@@ -80,29 +134,30 @@ def main(args):
             if active_bindings == None:
                 return 1
 
+    if args.jobs > 1:
+        if run_bindings([binding for binding in all_bindings if binding in active_bindings], args.jobs) != 0:
+            return 1
+
+        print('\033[01;35m>>> done\033[0m')
+
+        return 0
+
     for binding in all_bindings:
         if binding not in active_bindings:
             continue
 
         print('\033[01;32m>>> running tests for {0} bindings\033[0m'.format(binding))
 
-        try:
-            module = importlib.import_module('generators.{0}.test_{0}_bindings'.format(binding))
-        except ImportError: # FIXME: Python 3.6 has ModuleNotFoundError, which would be better to use here, but Debian Stretch has only Python 3.5
-            print('\033[01;36m### tests missing\033[0m')
-        else:
-            success = module.test(os.path.join(generators_dir, binding))
-
-            if not isinstance(success, bool):
-                print('error: test_{0}_bindings.py returns wrong type from its test() function'.format(binding))
-
-            if not success:
-                sys.exit(1)
+        if not test_binding(binding):
+            sys.exit(1)
 
     print('\033[01;35m>>> done\033[0m')
 
 if __name__ == '__main__':
     def add_arguments(parser):
         parser.add_argument('-b', '--bindings', nargs=1, help='comma separated list of bindings, each prefixed by +/-')
+        parser.add_argument('-j', '--jobs', type=int, default=1, help='number of bindings to test in parallel [default: 1]')
+        parser.add_argument('-p', '--processes', type=int, help='number of tests to run in parallel per binding [default: number of CPUs]')
+        parser.add_argument('--no-cache', action='store_false', help='rerun tests whose inputs did not change since their last success', dest='cache')
 
     sys.exit(main(common.dockerize('', __file__, add_arguments=add_arguments)))
@@ -55,6 +55,8 @@ from generators import common
 from generators.tvpl import tvpl_common
 
 class TVPLZipGenerator(tvpl_common.TVPLGeneratorTrait, common.ZipGenerator):
+    incremental_extra_inputs = ['../javascript']
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -57,6 +57,8 @@ from generators import common
 from generators.vbnet import vbnet_common
 
 class VBNETZipGenerator(vbnet_common.VBNETGeneratorTrait, common.ZipGenerator):
+    incremental_extra_inputs = ['../csharp/IPConnection.cs', '../csharp/AssemblyInfo.cs.template']
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -34,6 +34,7 @@ import os
 import re
 import tempfile
 import shutil
+import zipfile
 import argparse
 import shlex
 import importlib.util
@@ -108,15 +109,25 @@ def main():
             zip_old_path = os.path.join(path, 'zip_old')
 
             if not os.path.isdir(zip_path):
-                print('skipping {0}, no zip directory'.format(d))
+                print('skipping {0}, no zip directory'.format(b))
+                continue
+
+            # the zip directory only contains the files that are not added
+            # to the zip file directly from their source, use the zip file
+            version = common.get_changelog_version(path)
+            zip_file_path = os.path.join(path, 'tinkerforge_{0}_bindings_{1}_{2}_{3}.zip'.format(b, *version))
+
+            if not os.path.isfile(zip_file_path):
+                print('skipping {0}, no zip file'.format(b))
                 continue
 
-            print('preparing ' + d)
+            print('preparing ' + b)
 
             if os.path.isdir(zip_old_path):
                 shutil.rmtree(zip_old_path)
 
-            shutil.copytree(zip_path, zip_old_path)
+            with zipfile.ZipFile(zip_file_path, 'r') as f:
+                f.extractall(zip_old_path)
     else:
         c_like_header1 = re.compile(r'^@@ -1,8 \+1,8 @@\n' + \
         ' /\* \*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\*\n' + \